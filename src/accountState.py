@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+
+import time
+import threading
+
+from bitbankHttp import BitbankError
+from myUtil import MyLogger
+
+
+class AccountState:
+    """ 資産（get_asset）の取得結果をキャッシュするクラス
+    ・資産は自分の注文が約定した場合（invalidate）かttl_sec経過後にだけ取得し直す
+    ・円換算はキャッシュした資産と現在値（ティッカー）から手元で計算する
+    売買１回あたりのPrivate APIの資産取得を１回以下にする。
+    """
+
+    def __init__(self, get_asset, get_last, ttl_sec=60.0, clock=time.time):
+        """ コンストラクタ
+        get_asset: get_asset() で資産（Private APIの戻り値）を返す関数
+        get_last: get_last(pair) で現在値を返す関数
+        ttl_sec: 約定が無くても資産を取得し直す秒数
+        """
+        self.get_asset = get_asset
+        self.get_last = get_last
+        self.ttl_sec = ttl_sec
+        self.clock = clock
+        self.stats = {"hits": 0, "refreshes": 0, "invalidations": 0}
+        self._assets = None
+        self._fetched_at = 0.0
+        self._lock = threading.Lock()
+        self.myLogger = MyLogger("AccountState")
+
+    def get_assets(self):
+        """ 資産のlistを返却する（古い場合のみ取得する） """
+        with self._lock:
+            if (self._assets is not None and
+                    self.clock() - self._fetched_at < self.ttl_sec):
+                self.stats["hits"] = self.stats["hits"] + 1
+                return self._assets
+            self.stats["refreshes"] = self.stats["refreshes"] + 1
+            self._assets = self.get_asset()["assets"]
+            self._fetched_at = self.clock()
+            return self._assets
+
+    def get_onhand_amount(self, asset):
+        """ 資産の保有量を返却する（保有していない場合は0） """
+        for data in self.get_assets():
+            if data["asset"] == asset:
+                return float(data["onhand_amount"])
+        return 0.0
+
+    def get_total_assets(self):
+        """ 総資産（円）を返却する
+        円以外の資産は <資産>_jpy の現在値で換算する
+        """
+        total = 0.0
+        for data in self.get_assets():
+            amount = float(data["onhand_amount"])
+            if data["asset"] == "jpy":
+                total = total + amount
+            elif amount > 0.0:
+                try:
+                    last = self.get_last(data["asset"] + "_jpy")
+                except BitbankError:
+                    self.myLogger.warning(
+                        "円換算できない資産：{0}".format(data["asset"]))
+                    continue
+                total = total + amount * last
+        return total
+
+    def invalidate(self):
+        """ 次回の参照時に資産を取得し直す """
+        with self._lock:
+            self.stats["invalidations"] = self.stats["invalidations"] + 1
+            self._assets = None
+
+    def on_order_completed(self, order):
+        """ 注文完了時の処理（OrderTrackerから呼び出す）
+        約定した数量がある場合だけ資産が変わるため取得し直す
+        """
+        if float(order.get("executed_amount", "0")) > 0.0:
+            self.invalidate()
+
+    def get_stats(self):
+        """ キャッシュの利用回数、取得回数、無効化回数を返却する """
+        with self._lock:
+            return dict(self.stats)
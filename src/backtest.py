@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+
+import time
+
+import numpy as np
+import pandas as pd
+
+from strategyParams import StrategyParams
+from indicatorSeries import rolling_rci, rolling_rsi
+
+
+def calc_indicators(closes, params):
+    """ 全期間の指標を一度に計算する（pandasのewm/rolling） """
+    close = pd.Series(np.asarray(closes, dtype=float))
+
+    # MACD（AutoTrader.is_buy_order 条件1, 2）
+    ema_short = close.ewm(span=params.macd_short).mean()
+    ema_long = close.ewm(span=params.macd_long).mean()
+    macd = ema_short - ema_long
+    signal = macd.ewm(span=params.macd_signal).mean()
+    diff = macd - signal
+    pre_diff = diff.shift(1)
+    golden = ((pre_diff <= -0.001) & (diff > -0.001)).values
+
+    # EMSクロスdiffの絶対値の総和（条件3）
+    ema_diff_short = close.ewm(span=params.ema_diff_short).mean()
+    ema_diff_long = close.ewm(span=params.ema_diff_long).mean()
+    ema_diff = ema_diff_short - ema_diff_long
+    ema_abs_sum = ema_diff.abs().rolling(params.ema_diff_window,
+                                         min_periods=1).sum()
+
+    # RSI（単純移動平均）
+    rsi = rolling_rsi(close.values, params.rsi_n, "sma")
+
+    return {"macd": macd.values,
+            "signal": signal.values,
+            "golden": golden,
+            "ema_abs_sum": ema_abs_sum.values,
+            "rsi": rsi,
+            "rci": rolling_rci(close.values, params.rci_n)}
+
+
+class BacktestResult:
+    """ バックテストの結果 """
+
+    def __init__(self, trades, equity, elapsed):
+        """ コンストラクタ """
+        self.trades = trades    # 売買履歴（DataFrame）
+        self.equity = equity    # 売却ごとの累積損益（円）
+        self.elapsed = elapsed  # 実行時間（秒）
+
+    @property
+    def pnl(self):
+        """ 損益の合計（円） """
+        return float(self.equity[-1]) if len(self.equity) > 0 else 0.0
+
+    @property
+    def max_drawdown(self):
+        """ 最大ドローダウン（円、累積損益の高値からの最大下落幅） """
+        if len(self.equity) == 0:
+            return 0.0
+        equity = np.concatenate(([0.0], self.equity))
+        return float((np.maximum.accumulate(equity) - equity).max())
+
+    @property
+    def sharpe(self):
+        """ 1取引あたりのシャープレシオ（リターンの平均 / 標準偏差） """
+        if len(self.trades) < 2:
+            return 0.0
+        returns = self.trades["profit"] / self.trades["buy_price"]
+        std = returns.std()
+        if not std > 0:
+            return 0.0
+        return float(returns.mean() / std)
+
+    @property
+    def win_rate(self):
+        """ 勝率 """
+        if len(self.trades) == 0:
+            return 0.0
+        return float((self.trades["profit"] > 0).mean())
+
+    def summary(self):
+        """ 結果の要約 """
+        return {"trades": len(self.trades),
+                "pnl": self.pnl,
+                "max_drawdown": self.max_drawdown,
+                "sharpe": self.sharpe,
+                "win_rate": self.win_rate,
+                "elapsed": self.elapsed}
+
+
+class Backtester:
+    """ 過去のロウソク足でAutoTraderの売買条件を検証するクラス
+    ・買い：is_buy_order と同じ条件（MACDゴールデンクロス かつ MACDが負 かつ
+            EMSクロスdiffの絶対値の総和が閾値より大きい）で成行買い
+    ・売り：is_waittig_sell_order が偽になった時点で成行売り
+            （use_stop_loss=Trueの場合は is_stop_loss が真の場合も売る）
+    約定価格は判定したロウソクの終値とする。
+    """
+
+    def __init__(self, params=None, amount=1.0, fee_rate=0.0,
+                 use_stop_loss=False):
+        """ コンストラクタ """
+        if params is None:
+            params = StrategyParams()
+        self.params = params
+        self.amount = amount
+        self.fee_rate = fee_rate
+        self.use_stop_loss = use_stop_loss
+
+    def run(self, times, closes, indicators=None):
+        """ times（UnixTime ミリ秒）とclosesでバックテストする """
+        start = time.time()
+        p = self.params
+        closes = np.asarray(closes, dtype=float)
+        if indicators is None:
+            indicators = calc_indicators(closes, p)
+
+        condition_1 = indicators["golden"]
+        condition_2 = indicators["macd"] < 0
+        condition_3 = indicators["ema_abs_sum"] > p.ema_diff_threshold
+        buy_signal = condition_1 & condition_2 & condition_3
+        buy_points = np.flatnonzero(buy_signal)
+        rci_ok = (indicators["rci"] < p.rci_threshold).tolist()  # 条件４
+        rsi_over = (indicators["rsi"] > p.rsi_threshold).tolist()
+        last_list = closes.tolist()
+
+        stop_loss_range = p.sell_order_range * p.stop_loss_threshold
+        stop_loss_range_n = stop_loss_range * p.stop_loss_n
+        trades = []
+        pre_last = 0.0  # 前回処理時の現在価格（Order.pre_last）
+        i = 0
+        count = len(last_list)
+        while True:
+            # 次の買いシグナルまで進める
+            k = np.searchsorted(buy_points, i)
+            if k >= len(buy_points):
+                break
+            i_buy = int(buy_points[k])
+            buy_price = last_list[i_buy]
+            bene_p = buy_price + p.benefit
+            stop_loss_price = buy_price - stop_loss_range
+            stop_loss_price_n = buy_price - stop_loss_range_n
+
+            i_sell = None
+            reason = None
+            for i in range(i_buy + 1, count):
+                last = last_list[i]
+                condition1 = (bene_p > last)
+                condition2 = (pre_last < last + p.benefit * 0.5)
+                condition3 = (last > stop_loss_price)
+                condition4 = rci_ok[i]
+                pre_last = last
+                waiting = condition1 and condition2 and condition3
+                if not (waiting and condition4):
+                    i_sell, reason = i, "sell"
+                    break
+                if self.use_stop_loss:
+                    stop_loss_1 = (stop_loss_price > last)
+                    stop_loss_2 = rsi_over[i] and (stop_loss_price_n > last)
+                    if stop_loss_1 or stop_loss_2:
+                        i_sell, reason = i, "stop_loss"
+                        break
+            if i_sell is None:
+                break  # 期間の最後まで売れなかった
+
+            sell_price = last_list[i_sell]
+            fee = (buy_price + sell_price) * self.fee_rate
+            profit = (sell_price - buy_price - fee) * self.amount
+            trades.append((times[i_buy], buy_price, times[i_sell], sell_price,
+                           profit, reason))
+            i = i_sell + 1
+
+        df_trades = pd.DataFrame(trades, columns=["buy_time", "buy_price",
+                                                  "sell_time", "sell_price",
+                                                  "profit", "reason"])
+        equity = df_trades["profit"].cumsum().values
+        return BacktestResult(df_trades, equity, time.time() - start)
+
+    def run_records(self, records):
+        """ CANDLE_DTYPEの配列（candleStore）でバックテストする """
+        return self.run(records["time"], records["close"])
+
+
+# main
+if __name__ == '__main__':
+    import sys
+    from technicalAnalysis import MyTechnicalAnalysisUtil
+
+    s_yyyymmdd, e_yyyymmdd = sys.argv[1], sys.argv[2]
+    records = MyTechnicalAnalysisUtil().get_candle_records(
+        "1min", s_yyyymmdd, e_yyyymmdd)
+    result = Backtester().run_records(records)
+    print(result.trades)
+    print(result.summary())
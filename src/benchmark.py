@@ -0,0 +1,249 @@
+# -*- coding: utf-8 -*-
+
+import os
+import gc
+import json
+import time
+import logging
+import itertools
+import tracemalloc
+from datetime import datetime, timedelta
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from candleStore import CandleStore
+from technicalAnalysis import CandleCache, MyTechnicalAnalysisUtil
+from bitbankAutoOrder import AutoTrader, Order
+
+# 計測するデータ量（1minのロウソク本数）
+SIZES = OrderedDict([("1day", 1440),
+                     ("1week", 1440 * 7),
+                     ("1month", 1440 * 30),
+                     ("1year", 1440 * 365)])
+
+
+def get_tickers_path(fixture_dir, pair):
+    """ 記録したティッカーのパス """
+    return os.path.join(fixture_dir, "{0}_tickers.json".format(pair))
+
+
+def make_synthetic_fixture(fixture_dir, pair="xrp_jpy", days=365, seed=0,
+                           start="20180101"):
+    """ ランダムウォークのロウソク（1min）とティッカーのフィクスチャを作成する
+    （記録したデータが無い環境で計測する場合）
+    """
+    rs = np.random.RandomState(seed)
+    store = CandleStore(fixture_dir)
+    day = datetime.strptime(start, "%Y%m%d")
+    close = 60.0
+    for i in range(days):
+        start_ms = int((day - datetime(1970, 1, 1)).total_seconds()) * 1000
+        closes = np.round(close + np.cumsum(rs.randn(1440) * 0.05), 3)
+        close = closes[-1]
+        opens = np.concatenate([[closes[0]], closes[:-1]])
+        ohlcv = [[o, max(o, c) + 0.01, min(o, c) - 0.01, c, 1000.0,
+                  start_ms + j * 60000]
+                 for j, (o, c) in enumerate(zip(opens, closes))]
+        store.append(pair, "1min", day.strftime("%Y%m%d"), ohlcv)
+        day = day + timedelta(days=1)
+
+    tickers = [{"last": str(c), "sell": str(c + 0.001),
+                "buy": str(c - 0.001)}
+               for c in np.round(close + np.cumsum(rs.randn(1000) * 0.05), 3)]
+    with open(get_tickers_path(fixture_dir, pair), "w") as f:
+        json.dump(tickers, f)
+
+
+def record_fixture(fixture_dir, s_yyyymmdd, e_yyyymmdd, pair="xrp_jpy",
+                   ticker_count=100, interval_sec=0.5):
+    """ bitbankからロウソク（1min）とティッカーを取得してフィクスチャに記録する """
+    mtau = MyTechnicalAnalysisUtil(candle_store=CandleStore(fixture_dir))
+    mtau.get_candle_records("1min", s_yyyymmdd, e_yyyymmdd, pair)
+    tickers = []
+    for i in range(ticker_count):
+        tickers.append(mtau.pubApi.get_ticker(pair))
+        time.sleep(interval_sec)
+    with open(get_tickers_path(fixture_dir, pair), "w") as f:
+        json.dump(tickers, f)
+
+
+def load_fixture(fixture_dir, pair="xrp_jpy"):
+    """ フィクスチャを読み込み、(ロウソク CANDLE_DTYPEの配列, ティッカーのlist)を返却する """
+    records = CandleStore(fixture_dir).load(pair, "1min")
+    with open(get_tickers_path(fixture_dir, pair)) as f:
+        tickers = json.load(f)
+    return np.array(records), tickers
+
+
+class FixtureBitbank:
+    """ 記録したティッカーを順に返すBitbankの代わり（AutoTraderに渡す） """
+
+    def __init__(self, tickers):
+        """ コンストラクタ """
+        self._tickers = itertools.cycle(tickers)
+
+    def get_ticker_value(self, pair):
+        """ 現在の価格を取得 """
+        value = next(self._tickers)
+        return float(value["last"]), float(value["sell"]), float(value["buy"])
+
+
+class Benchmark:
+    """ 記録したロウソクとティッカーで指標と売買判定の処理速度を計測するクラス
+    データ量（SIZES）ごとに最新size本を「今日」のロウソクとして返し、
+    ネットワークを使わずに計測する。
+    """
+
+    def __init__(self, records, tickers, pair="xrp_jpy", sizes=None,
+                 min_time=0.2, repeat=3):
+        """ コンストラクタ
+        min_time: 1回の計測で処理を繰り返す最短の秒数
+        repeat: 計測回数（最も速い回を結果とする）
+        """
+        self.records = records
+        self.tickers = tickers
+        self.pair = pair
+        self.sizes = SIZES if sizes is None else sizes
+        self.min_time = min_time
+        self.repeat = repeat
+
+    def make_ohlcv(self, size):
+        """ 最新size本のロウソクをbitbankのohlcvの形式で返却する """
+        records = self.records[-size:]
+        return [[str(r["open"]), str(r["hight"]), str(r["low"]),
+                 str(r["close"]), str(r["amount"]), int(r["time"])]
+                for r in records]
+
+    def make_operations(self, size):
+        """ 計測する処理のdict（key:処理名 value:引数なしの関数）を返却する """
+        ohlcv = self.make_ohlcv(size)
+
+        def fetcher(pair, candle_type, yyyymmdd):
+            today = datetime.utcnow().strftime("%Y%m%d")
+            return ohlcv if yyyymmdd == today else []
+
+        # キャッシュは期限切れにしない（常にフィクスチャのロウソクを使う）
+        mtau = MyTechnicalAnalysisUtil(CandleCache(fetcher, float("inf")))
+        order = Order()
+        order.buy_result = {"price": ohlcv[-1][3]}
+        trader = AutoTrader(order, pair=self.pair,
+                            bitbank=FixtureBitbank(self.tickers), mtau=mtau)
+
+        def get_rsi():
+            # 同じロウソクのRSIは再利用されるため、毎回計算し直して計測する
+            with mtau._rsi_lock:
+                mtau._rsi_series.clear()
+            return mtau.get_rsi("1min", self.pair)
+
+        return OrderedDict([
+            ("get_ema", lambda: mtau.get_ema("1min", 9, 26)),
+            ("get_macd", lambda: mtau.get_macd("1min")),
+            ("get_macd_cross_status",
+             lambda: mtau.get_macd_cross_status("1min")),
+            ("get_rsi", get_rsi),
+            ("get_rci", lambda: mtau.get_rci("1min", self.pair)),
+            ("is_buy_order", lambda: trader.is_buy_order()),
+            ("is_waittig_sell_order",
+             lambda: trader.is_waittig_sell_order(order))])
+
+    def measure(self, func):
+        """ 処理を計測し、(1秒あたりの処理回数, 1回のメモリ割り当てのピーク(byte))を返却する """
+        func()  # 初回のみの処理（キャッシュ・指標の初期化）を除く
+        best = 0.0
+        for i in range(self.repeat):
+            count = 0
+            start = time.perf_counter()
+            elapsed = 0.0
+            while elapsed < self.min_time or count < 3:
+                func()
+                count = count + 1
+                elapsed = time.perf_counter() - start
+            best = max(best, count / elapsed)
+
+        # 割り当ての計測は遅くなるため、速度とは別に1回だけ行う
+        gc.collect()
+        tracemalloc.start()
+        try:
+            func()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        return best, peak
+
+    def run(self):
+        """ 全てのデータ量・処理を計測し、結果のDataFrameを返却する
+        列: operation, size, candles, ops_per_sec, alloc_kib
+        """
+        rows = []
+        # 判定のDEBUGログは計測中は出力しない（メッセージの作成は計測に含む）
+        logging.disable(logging.DEBUG)
+        try:
+            for size_name, size in self.sizes.items():
+                candles = min(size, len(self.records))
+                operations = self.make_operations(candles)
+                for name, func in operations.items():
+                    ops, peak = self.measure(func)
+                    rows.append({"operation": name,
+                                 "size": size_name,
+                                 "candles": candles,
+                                 "ops_per_sec": ops,
+                                 "alloc_kib": peak / 1024.0})
+        finally:
+            logging.disable(logging.NOTSET)
+        return pd.DataFrame(rows, columns=["operation", "size", "candles",
+                                           "ops_per_sec", "alloc_kib"])
+
+
+def save_baseline(results, path):
+    """ 計測結果を基準値としてJSONに保存する """
+    results.to_json(path, orient="records")
+
+
+def load_baseline(path):
+    """ 保存した基準値を読み込む """
+    return pd.read_json(path, orient="records")
+
+
+def compare(results, baseline, threshold=0.2):
+    """ 基準値より threshold（割合）を超えて遅くなった、または割り当てが増えた
+    処理のDataFrameを返却する（空の場合は劣化なし）
+    """
+    merged = results.merge(baseline, on=["operation", "size"],
+                           suffixes=("", "_baseline"))
+    slower = merged["ops_per_sec"] < \
+        merged["ops_per_sec_baseline"] * (1.0 - threshold)
+    larger = merged["alloc_kib"] > \
+        merged["alloc_kib_baseline"] * (1.0 + threshold)
+    return merged[slower | larger]
+
+
+if __name__ == '__main__':
+    import sys
+
+    # python benchmark.py フィクスチャのディレクトリ [基準値のJSON]
+    # フィクスチャが無い場合はランダムウォークで作成する
+    # 基準値のJSONが無い場合は今回の結果を基準値として保存する
+    fixture_dir = sys.argv[1]
+    baseline_path = sys.argv[2] if len(sys.argv) > 2 else None
+    threshold = float(os.getenv("BENCHMARK_THRESHOLD", "0.2"))
+
+    if not os.path.exists(get_tickers_path(fixture_dir, "xrp_jpy")):
+        make_synthetic_fixture(fixture_dir)
+    records, tickers = load_fixture(fixture_dir)
+    results = Benchmark(records, tickers).run()
+    pd.set_option("display.width", 120)
+    print(results)
+
+    if baseline_path is None:
+        sys.exit(0)
+    if not os.path.exists(baseline_path):
+        save_baseline(results, baseline_path)
+        print("saved: {0}".format(baseline_path))
+        sys.exit(0)
+    regressions = compare(results, load_baseline(baseline_path), threshold)
+    if len(regressions) > 0:
+        print("regression (threshold {0:.0%}):".format(threshold))
+        print(regressions)
+        sys.exit(1)
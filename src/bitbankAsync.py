@@ -0,0 +1,306 @@
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import time
+import asyncio
+from datetime import datetime, timedelta
+from urllib.parse import urlencode
+
+import aiohttp
+
+from myUtil import MyLogger
+from bitbankHttp import (BitbankError, make_auth_headers,
+                         get_public_end_point, get_private_end_point)
+from streamingIndicator import IndicatorEngine
+from bitbankAutoOrder import AutoTrader, MarketSnapshot, Order
+
+
+class AsyncBitbank:
+    """ asyncio（aiohttp）版のBitbank """
+
+    def __init__(self, session=None):
+        """ コンストラクタ """
+        self.api_key = os.getenv("BITBANK_API_KEY")
+        self.api_secret = os.getenv("BITBANK_API_SECRET")
+        self.check_env()
+        self.PUBLIC_END_POINT = get_public_end_point()
+        self.PRIVATE_END_POINT = get_private_end_point()
+        self.REQUEST_TIMEOUT_SEC = 3.0  # 1リクエストの期限
+        self.session = session
+        self.myLogger = MyLogger("AsyncBitbank")
+
+    def check_env(self):
+        """ 環境変数のチェック """
+        if (self.api_key is None) or (self.api_secret is None):
+            emsg = '''
+            Please set BITBANK_API_KEY or BITBANK_API_SECRET in Environment !!
+            ex) exoprt BITBANK_API_KEY=XXXXXXXXXXXXXXXXXX
+            '''
+            raise EnvironmentError(emsg)
+
+    def get_session(self):
+        """ HTTPセッションを取得する（keep-aliveで使い回す） """
+        if self.session is None or self.session.closed:
+            timeout = aiohttp.ClientTimeout(total=self.REQUEST_TIMEOUT_SEC)
+            self.session = aiohttp.ClientSession(timeout=timeout)
+        return self.session
+
+    async def close(self):
+        """ HTTPセッションを閉じる """
+        if self.session is not None and not self.session.closed:
+            await self.session.close()
+
+    async def _request(self, method, url, headers=None, data=None):
+        session = self.get_session()
+        async with session.request(method, url, headers=headers,
+                                   data=data) as response:
+            result = await response.json(content_type=None)
+        if result.get("success") != 1:
+            raise BitbankError(result.get("data", {}).get("code"))
+        return result["data"]
+
+    async def _get_public(self, path):
+        return await self._request("GET", self.PUBLIC_END_POINT + path)
+
+    async def _get_private(self, path, query=None):
+        if query:
+            path = path + "?" + urlencode(query)
+        headers = make_auth_headers(self.api_key, self.api_secret,
+                                    "/v1" + path)
+        return await self._request("GET", self.PRIVATE_END_POINT + path,
+                                   headers=headers)
+
+    async def _post_private(self, path, body):
+        data = json.dumps(body)
+        headers = make_auth_headers(self.api_key, self.api_secret, data)
+        return await self._request("POST", self.PRIVATE_END_POINT + path,
+                                   headers=headers, data=data)
+
+    async def get_ticker(self, pair):
+        """ ティッカーを取得 """
+        return await self._get_public("/{0}/ticker".format(pair))
+
+    async def get_xrp_jpy_value(self):
+        """ 現在のXRP価格を取得 """
+        value = await self.get_ticker("xrp_jpy")
+
+        last = float(value['last'])  # 現在値
+        sell = float(value['sell'])  # 現在の売り注文の最安値
+        buy = float(value['buy'])    # 現在の買い注文の最高値
+
+        return last, sell, buy
+
+    async def get_candlestick(self, pair, candle_type, yyyymmdd):
+        """ ロウソク足を取得 """
+        return await self._get_public("/{0}/candlestick/{1}/{2}".format(
+            pair, candle_type, yyyymmdd))
+
+    async def get_asset(self):
+        """ 資産を取得 """
+        return await self._get_private("/user/assets")
+
+    async def get_order(self, pair, order_id):
+        """ 注文情報を取得 """
+        return await self._get_private("/user/spot/order",
+                                       {"pair": pair, "order_id": order_id})
+
+    async def get_active_orders(self, pair="xrp_jpy"):
+        """ 現在のアクティブ注文情報を取得 """
+        return await self._get_private("/user/spot/active_orders",
+                                       {"pair": pair})
+
+    async def order(self, pair, price, amount, side, order_type):
+        """ 注文 """
+        return await self._post_private("/user/spot/order",
+                                        {"pair": pair,
+                                         "price": price,
+                                         "amount": amount,
+                                         "side": side,
+                                         "type": order_type})
+
+    async def cancel_order(self, pair, order_id):
+        """ 注文キャンセル """
+        return await self._post_private("/user/spot/cancel_order",
+                                        {"pair": pair, "order_id": order_id})
+
+
+class AsyncAutoTrader:
+    """ asyncio版の自動売買
+    ティッカー取得、指標の更新、注文状態の確認、LINE通知をそれぞれ並行タスクで実行し、
+    売買の判定はティッカーが更新されるたびにAutoTraderの判定メソッドで行う。
+    """
+
+    def __init__(self, order, trader=None, bitbank=None):
+        """ コンストラクタ """
+        self.order = order
+        if trader is None:
+            trader = AutoTrader(order)
+        self.trader = trader  # 売買の判定・通知はAutoTraderを使う
+        if bitbank is None:
+            bitbank = AsyncBitbank()
+        self.bitbank = bitbank
+        self.POLLING_SEC_TICKER = 0.1
+        self.POLLING_SEC_ORDER = 0.1
+        self.REFRESH_SEC_INDICATOR = 5.0
+        self.DEADLINE_SEC = 3.0  # 各リクエストの期限
+
+        self.engine = IndicatorEngine(*trader.params.get_indicator_spans())
+        self.ticker = None          # (last, sell, buy)
+        self.ticker_latency = 0.0   # 最新ティッカー取得の所要秒数
+        # イベントループに紐づくため run() の中で作成する
+        self.ticker_updated = None
+        self.indicator_ready = None
+        self.notify_queue = None
+        self.myLogger = MyLogger("AsyncAutoTrader")
+
+    async def call(self, coro):
+        """ 期限付きでAPIを呼び出す """
+        return await asyncio.wait_for(coro, timeout=self.DEADLINE_SEC)
+
+    async def poll_ticker(self):
+        """ ティッカーを取得し続けるタスク """
+        while True:
+            start = time.time()
+            try:
+                self.ticker = await self.call(self.bitbank.get_xrp_jpy_value())
+                self.ticker_latency = time.time() - start
+                self.ticker_updated.set()
+            except (asyncio.TimeoutError, aiohttp.ClientError,
+                    BitbankError) as e:
+                self.myLogger.warning("ティッカー取得失敗 {0}".format(e))
+            await asyncio.sleep(self.POLLING_SEC_TICKER)
+
+    async def refresh_indicators(self, candle_type="1min", pair="xrp_jpy"):
+        """ ロウソク足を取得して指標を更新し続けるタスク """
+        while True:
+            now_utc = datetime.utcfromtimestamp(time.time())
+            keys = [now_utc.strftime('%Y%m%d')]
+            if self.engine.last_time is None:
+                yesterday = now_utc - timedelta(days=1)
+                keys.insert(0, yesterday.strftime('%Y%m%d'))
+            try:
+                results = await asyncio.gather(*[
+                    self.call(self.bitbank.get_candlestick(pair, candle_type,
+                                                           key))
+                    for key in keys])
+                for candlestick in results:
+                    ohlcv = candlestick["candlestick"][0]["ohlcv"]
+                    self.engine.update_ohlcv(ohlcv)
+                self.indicator_ready.set()
+            except (asyncio.TimeoutError, aiohttp.ClientError,
+                    BitbankError) as e:
+                self.myLogger.warning("ロウソク足取得失敗 {0}".format(e))
+            await asyncio.sleep(self.REFRESH_SEC_INDICATOR)
+
+    async def deliver_notifications(self):
+        """ 通知キューを処理するタスク（LINE通知は別スレッドで実行） """
+        loop = asyncio.get_event_loop()
+        while True:
+            func, args = await self.notify_queue.get()
+            try:
+                await loop.run_in_executor(None, func, *args)
+            except Exception as e:
+                self.myLogger.warning("通知失敗 {0}".format(e))
+            finally:
+                self.notify_queue.task_done()
+
+    def get_market_snapshot(self):
+        """ 最新のティッカーと指標からMarketSnapshotを作成する（通信しない） """
+        last, sell, buy = self.ticker
+        return MarketSnapshot(last, sell, buy, self.engine, time.time(),
+                              self.ticker_latency)
+
+    async def wait_tick(self):
+        """ 次のティッカー更新を待ち、MarketSnapshotを返却する """
+        await self.ticker_updated.wait()
+        self.ticker_updated.clear()
+        return self.get_market_snapshot()
+
+    async def wait_fully_filled(self, order_value):
+        """ 注文が約定するまで注文状態を確認する """
+        while True:
+            try:
+                order_result = await self.call(self.bitbank.get_order(
+                    order_value["pair"], order_value["order_id"]))
+                if self.ticker is None:
+                    await self.ticker_updated.wait()
+                if self.trader.is_fully_filled(order_result,
+                                               self.get_market_snapshot()):
+                    return order_result
+            except (asyncio.TimeoutError, aiohttp.ClientError,
+                    BitbankError) as e:
+                self.myLogger.warning("注文状態の取得失敗 {0}".format(e))
+            await asyncio.sleep(self.POLLING_SEC_ORDER)
+
+    async def place_order(self, order_info):
+        """ 注文する """
+        return await self.call(self.bitbank.order(
+            order_info["pair"],         # ペア
+            order_info["price"],        # 価格
+            order_info["amount"],       # 注文枚数
+            order_info["orderSide"],    # 注文サイド
+            order_info["orderType"]))   # 注文タイプ
+
+    async def buy_order(self):
+        """ 買い注文処理 """
+        await self.indicator_ready.wait()
+        while True:
+            if self.trader.is_buy_order(await self.wait_tick()):  # 買い注文判定
+                break
+
+        buy_value = await self.place_order(self.trader.get_buy_order_info())
+        buy_order_result = await self.wait_fully_filled(buy_value)
+        self.order.buy_result = buy_order_result
+        self.notify_queue.put_nowait((self.trader.notify_buy, (self.order,)))
+        return buy_order_result
+
+    async def sell_order(self):
+        """ 売り注文処理 """
+        await self.indicator_ready.wait()
+        while True:
+            if not self.trader.is_waittig_sell_order(self.order,
+                                                     await self.wait_tick()):
+                break
+
+        sell_value = await self.place_order(self.trader.get_sell_order_info())
+        sell_order_result = await self.wait_fully_filled(sell_value)
+        self.order.sell_result = sell_order_result
+        self.notify_queue.put_nowait((self.trader.notify_sell, (self.order,)))
+        return sell_order_result
+
+    async def run(self, loop_count):
+        """ 買い→売りをloop_count回繰り返す """
+        self.ticker_updated = asyncio.Event()
+        self.indicator_ready = asyncio.Event()
+        self.notify_queue = asyncio.Queue()
+        tasks = [asyncio.ensure_future(self.poll_ticker()),
+                 asyncio.ensure_future(self.refresh_indicators()),
+                 asyncio.ensure_future(self.deliver_notifications())]
+        count = 0
+        try:
+            for i in range(loop_count):
+                count = count + 1
+                self.myLogger.info("=== 処理開始[NO.{0}] ===".format(count))
+                await self.buy_order()   # 買い注文処理
+                await self.sell_order()  # 売り注文処理
+            await self.notify_queue.join()
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await self.bitbank.close()
+        return count
+
+
+# main
+if __name__ == '__main__':
+    at = AsyncAutoTrader(Order())
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        count = loop.run_until_complete(at.run(at.trader.LOOP_COUNT_MAIN))
+    finally:
+        loop.close()
+    at.trader.line.notify_line_stamp(
+        "自動売買が終了！処理回数：{0}回".format(count), "2", "516")
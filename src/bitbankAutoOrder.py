@@ -1,24 +1,101 @@
 # -*- coding: utf-8 -*-
 
 import os
+import sys
 import time
+import signal
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
+
+from myUtil import MyLogger, MyUtil, get_line_notify_queue
+from bitbankHttp import BitbankPublic, BitbankPrivate
+from requestScheduler import get_request_scheduler
+from orderTracker import OrderTracker
+from accountState import AccountState
+from paperTrading import PaperPrivateApi
+from latencyMonitor import timed, get_latency_monitor
+from metricsServer import get_metrics, start_metrics_server
+from httpSession import get_http_session
+from technicalAnalysis import MacdCross, MyTechnicalAnalysisUtil
+from strategyParams import StrategyParams
 
-import pandas as pd
-import python_bitbankcc
 
-from myUtil import MyLogger, MyUtil, Line
-from technicalAnalysis import MacdCross, MyTechnicalAnalysisUtil
+class TickerBoard:
+    """ 全ペアのティッカーをまとめて取得し、複数ペア・複数スレッドで共有するクラス
+    ttl_sec以内の取得結果は使い回す。取得は同時に1つだけ行い、
+    その間の他スレッドは取得結果を待つ（ペア数が増えてもリクエストは増えない）。
+    """
+
+    def __init__(self, pubApi, ttl_sec=0.1, clock=time.time):
+        """ コンストラクタ """
+        self.pubApi = pubApi
+        self.ttl_sec = ttl_sec
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self._tickers = {}  # key:pair value:(取得時刻, ticker)
+        self._lock = threading.Lock()
+
+    def get_ticker(self, pair):
+        """ ペアのティッカーを返却する（古い場合のみ取得する） """
+        with self._lock:
+            entry = self._tickers.get(pair)
+            if entry is not None and self.clock() - entry[0] < self.ttl_sec:
+                self.hits = self.hits + 1
+                return entry[1]
+            self.misses = self.misses + 1
+            self.refresh(pair)
+            return self._tickers[pair][1]
+
+    def refresh(self, pair):
+        """ ティッカーを取得する（一括取得APIがあれば全ペア分をまとめて取得） """
+        now = self.clock()
+        get_tickers = getattr(self.pubApi, "get_tickers", None)
+        if get_tickers is not None:
+            for ticker in get_tickers():
+                self._tickers[ticker["pair"]] = (now, ticker)
+            if pair in self._tickers and self._tickers[pair][0] == now:
+                return
+        self._tickers[pair] = (now, self.pubApi.get_ticker(pair))
 
 
 class Bitbank:
-    def __init__(self):
-        """ コンストラクタ """
+    def __init__(self, market_data=None, scheduler=None, paper=None):
+        """ コンストラクタ
+        market_data: 配信データ（MarketDataSource）を使う場合に指定する
+        scheduler: リクエストの流量制限（省略時はプロセス内で共有のもの）
+        paper: Trueの場合は注文を送らずに約定を模擬する（ペーパートレード）
+               省略時は環境変数 PAPER_TRADING=1 の場合にTrue
+        """
+        if paper is None:
+            paper = os.getenv("PAPER_TRADING") == "1"
+        self.paper = paper
         self.api_key = os.getenv("BITBANK_API_KEY")
         self.api_secret = os.getenv("BITBANK_API_SECRET")
-        self.check_env()
-        self.pubApi = python_bitbankcc.public()
-        self.prvApi = python_bitbankcc.private(self.api_key, self.api_secret)
+        if scheduler is None:
+            scheduler = get_request_scheduler()
+        self.scheduler = scheduler
+        self.pubApi = scheduler.wrap_public(BitbankPublic())
+        if paper:
+            # 価格は実際のティッカー、資産と注文は手元で模擬する（APIキー不要）
+            self.prvApi = PaperPrivateApi.from_env(self.get_ticker_value)
+        else:
+            self.check_env()
+            self.prvApi = scheduler.wrap_private(
+                BitbankPrivate(self.api_key, self.api_secret))
         self.myLogger = MyLogger("Bitbank")
+        self.market_data = market_data
+        self.MARKET_DATA_MAX_AGE_SEC = 5.0  # これより古い配信データは使わない
+        self.TICKER_TTL_SEC = 0.1  # ティッカーを使い回す秒数
+        self.ticker_board = TickerBoard(self.pubApi, self.TICKER_TTL_SEC)
+        self.ACCOUNT_TTL_SEC = 60.0  # 約定が無くても資産を取得し直す秒数
+        self.account = AccountState(
+            lambda: self.prvApi.get_asset(),
+            lambda pair: self.get_ticker_value(pair)[0], self.ACCOUNT_TTL_SEC)
+        # 発注済み注文の約定確認（全ペアで共有 約定したら資産を取得し直す）
+        self.order_tracker = OrderTracker(
+            self.prvApi, lambda pair: self.get_ticker_value(pair)[0],
+            on_complete=self.account.on_order_completed)
 
     def check_env(self):
         """ 環境変数のチェック """
@@ -29,36 +106,44 @@ class Bitbank:
             '''
             raise EnvironmentError(emsg)
 
+    @timed("Bitbank.get_balances")
     def get_balances(self):
         """ 現在のXRP資産の取得 """
-        balances = self.prvApi.get_asset()
-        for data in balances['assets']:
+        for data in self.account.get_assets():
             if (data['asset'] == 'jpy') or (data['asset'] == 'xrp'):
                 self.myLogger.info('●通貨：' + data['asset'])
                 self.myLogger.info('保有量：' + data['onhand_amount'])
 
+    @timed("Bitbank.get_total_assets")
     def get_total_assets(self):
-        """ 現在の総資産（円）の取得 """
-        balances = self.prvApi.get_asset()
-        total = 0.0
-        for data in balances['assets']:
-            if data['asset'] == 'jpy':
-                total = total + float(data['onhand_amount'])
-            elif data['asset'] == 'xrp':
-                xrp_last, _, _ = self.get_xrp_jpy_value()
-                xrp_assets = float(data['onhand_amount']) * float(xrp_last)
-                total = total + xrp_assets
-        return total
+        """ 現在の総資産（円）の取得
+        資産はキャッシュ（約定時かACCOUNT_TTL_SEC経過後に取得し直す）を使い、
+        円以外の資産は <資産>_jpy の現在値で換算する
+        """
+        return self.account.get_total_assets()
 
     def get_xrp_jpy_value(self):
         """ 現在のXRP価格を取得 """
+        return self.get_ticker_value('xrp_jpy')
+
+    @timed("Bitbank.get_ticker_value")
+    def get_ticker_value(self, pair):
+        """ 現在の価格を取得
+        配信データ（market_data）に新しいティッカーがあればリクエストせずに使う
+        """
+        if self.market_data is not None:
+            value = self.market_data.get_ticker(
+                pair, self.MARKET_DATA_MAX_AGE_SEC)
+            if value is not None:
+                return (float(value['last']), float(value['sell']),
+                        float(value['buy']))
+
         try:
-            value = self.pubApi.get_ticker(
-                'xrp_jpy'  # ペア
-            )
+            value = self.ticker_board.get_ticker(pair)
         except BaseException as be:
-            self.myLogger.exception("r現在のXRP価格取得失敗。リトライ", be)
-            self.get_xrp_jpy_value()
+            self.myLogger.exception("現在の価格取得失敗。リトライ({0})".format(pair), be)
+            get_metrics().inc("retries", {"site": "get_ticker_value"})
+            value = self.ticker_board.get_ticker(pair)
 
         last = float(value['last'])  # 現在値
         sell = float(value['sell'])  # 現在の売り注文の最安値
@@ -66,25 +151,82 @@ class Bitbank:
 
         return last, sell, buy
 
-    def get_active_orders(self):
+    @timed("Bitbank.get_active_orders")
+    def get_active_orders(self, pair='xrp_jpy'):
         """ 現在のアクティブ注文情報を取得 """
-        return self.prvApi.get_active_orders('xrp_jpy')
+        return self.prvApi.get_active_orders(pair)
+
+    @timed("Bitbank.get_remaining_orders")
+    def get_remaining_orders(self, pair='xrp_jpy', timeout=60):
+        """ アクティブ注文が完了するまで最大timeout秒待ち、残った注文のlistを返却する """
+        active_orders = self.get_active_orders(pair)["orders"]
+        if active_orders == []:
+            return []
+        futures = {self.order_tracker.track(order): order
+                   for order in active_orders}
+        _, not_done = wait(futures, timeout)
+        # 残った注文はこれ以上確認しない
+        for future in not_done:
+            self.order_tracker.untrack(futures[future])
+        return [futures[future] for future in not_done]
+
+    @timed("Bitbank.order")
+    def order(self, pair, price, amount, side, order_type):
+        """ 注文する（ペーパートレードでは約定を模擬する） """
+        return self.prvApi.order(pair, price, amount, side, order_type)
+
+    def wait_order(self, order_value):
+        """ 注文が約定か取消されるまで待ち、注文結果を返却する """
+        with get_latency_monitor().span("Bitbank.wait_order"):
+            return self.order_tracker.wait(order_value)
+
+
+class MarketSnapshot:
+    """ 1回のポーリング（tick）で使う市場情報
+    tick毎に1回だけ作成し、全ての判定で同じ値を参照する。
+    """
+
+    def __init__(self, last, sell, buy, engine, timestamp, latency):
+        """ コンストラクタ """
+        self.last = last  # 現在値
+        self.sell = sell  # 現在の売り注文の最安値
+        self.buy = buy    # 現在の買い注文の最高値
+
+        # 1min の指標（作成時点の値をコピーしておく）
+        self.macd = engine.macd
+        self.macd_diffs = engine.macd_diffs
+        self.ema_diff_abs_sum = engine.ema_diff_abs_sum
+        self.rsi = engine.rsi
+        self.rci = engine.rci
+
+        self.timestamp = timestamp  # 作成時刻（UnixTime）
+        self.latency = latency      # 作成にかかった秒数
 
 
 class AutoTrader:
     """ 自動売買
     """
 
-    def __init__(self, order):
-        """ コンストラクタ """
+    def __init__(self, order, market_data=None, params=None, pair="xrp_jpy",
+                 amount="1", bitbank=None, mtau=None):
+        """ コンストラクタ
+        market_data: 配信データ（MarketDataSource）を使う場合に指定する
+        params: 売買条件のパラメータ（StrategyParams 省略時は既定値）
+        pair, amount: 売買するペアと注文枚数
+        bitbank, mtau: 複数ペアで共有する場合に指定する
+        """
         self.order = order
+        self.pair = pair
         self.LOOP_COUNT_MAIN = 10
-        self.AMOUNT = "1"
+        self.AMOUNT = amount
 
-        self.BENEFIT = 0.097  # 利益
+        if params is None:
+            params = StrategyParams()
+        self.params = params
+        self.BENEFIT = params.benefit  # 利益
         self.BUY_ORDER_RANGE = 0.0
-        self.BUY_CANCEL_THRESHOLD = 0.5  # 再買い注文するための閾値
-        self.SELL_ORDER_RANGE = 0.07
+        self.BUY_CANCEL_THRESHOLD = params.buy_cancel_threshold  # 再買い注文するための閾値
+        self.SELL_ORDER_RANGE = params.sell_order_range
         self.POLLING_SEC_MAIN = 15
         self.POLLING_SEC_BUY = 0.1
         self.POLLING_SEC_SELL = 0.1
@@ -92,13 +234,27 @@ class AutoTrader:
         self.myLogger = MyLogger(__name__)
 
         self.mu = MyUtil()
-        self.mtau = MyTechnicalAnalysisUtil()
-        self.line = Line()
-        self.bitbank = Bitbank()
+        if mtau is None:
+            mtau = MyTechnicalAnalysisUtil(market_data=market_data)
+        self.mtau = mtau
+        self.line = get_line_notify_queue()
+        if bitbank is None:
+            bitbank = Bitbank(market_data)
+        self.bitbank = bitbank
+
+    @timed("AutoTrader.get_market_snapshot")
+    def get_market_snapshot(self):
+        """ 現在の市場情報（ティッカー1回＋キャッシュ済みロウソクの指標）を取得 """
+        get_metrics().tick()
+        start = time.time()
+        last, sell, buy = self.bitbank.get_ticker_value(self.pair)
+        engine = self.mtau.get_indicator_engine("1min", self.pair, self.params)
+        now = time.time()
+        return MarketSnapshot(last, sell, buy, engine, now, now - start)
 
     def get_order_price(self, order):
         """ 価格または平均価格から価格を取得する """
-        self.myLogger.debug("注文の価格を取得する {0}".format(order))
+        self.myLogger.debug("注文の価格を取得する %s", order)
         if order.get("price") is not None:
             p = order["price"]
         elif order.get("average_price") is not None:
@@ -109,9 +265,12 @@ class AutoTrader:
         f_price = float(p)
         return f_price
 
-    def is_fully_filled(self, orderResult):
+    @timed("AutoTrader.is_fully_filled")
+    def is_fully_filled(self, orderResult, snapshot=None):
         """ 注文の約定を判定 """
-        last, _, _ = self.bitbank.get_xrp_jpy_value()
+        if snapshot is None:
+            snapshot = self.get_market_snapshot()
+        last = snapshot.last
 
         side = orderResult["side"]
         f_price = self.get_order_price(orderResult)
@@ -149,7 +308,7 @@ class AutoTrader:
 
     def get_buy_order_info(self):
         """ 買い注文(成行)のリクエスト情報を取得 """
-        buy_order_info = {"pair": "xrp_jpy",      # ペア
+        buy_order_info = {"pair": self.pair,      # ペア
                           "amount": self.AMOUNT,  # 注文枚数
                           # "price": buyPrice,    # 注文価格
                           "price": 0.0,             # 注文価格
@@ -160,7 +319,7 @@ class AutoTrader:
 
     def get_sell_order_info(self):
         """ 売り注文のリクエスト情報を取得 """
-        sell_order_info = {"pair": "xrp_jpy",      # ペア
+        sell_order_info = {"pair": self.pair,      # ペア
                            "amount": self.AMOUNT,  # 注文枚数
                            "price": 0.0,           # 注文価格
                            "orderSide": "sell",    # buy or sell
@@ -168,24 +327,27 @@ class AutoTrader:
                            }
         return sell_order_info
 
-    def is_stop_loss(self, sell_order_result):
+    @timed("AutoTrader.is_stop_loss")
+    def is_stop_loss(self, sell_order_result, snapshot=None):
         """ 売り注文(損切注文)の判定 下記、条件の場合は損切をする（True）
                 条件(condition)：
             1. 含み損が損切価格より大きい　または
             2. RSIが閾値(RSI_THRESHOLD)より大きい　かつ　含み損が損切価格の(n*100)％より大きい
         """
 
+        if snapshot is None:
+            snapshot = self.get_market_snapshot()
+
         # 条件1
-        last, _, _ = self.bitbank.get_xrp_jpy_value()
-        f_last = float(last)  # 現在値
+        f_last = float(snapshot.last)  # 現在値
         stop_loss_price = self.get_stop_loss_price(sell_order_result)
         condition_1 = (stop_loss_price > f_last)
 
         # 条件2
-        RSI_THRESHOLD = 60
-        f_rsi = float(self.mtau.get_rsi("1min"))
+        RSI_THRESHOLD = self.params.rsi_threshold
+        f_rsi = float(snapshot.rsi)
         over_rsi = (f_rsi > RSI_THRESHOLD)
-        n = 0.30
+        n = self.params.stop_loss_n
         f_stop_loss_price_n = float(
             self.get_stop_loss_price_n(sell_order_result, n))
         over_stop_loss_n = (f_stop_loss_price_n > f_last)
@@ -204,17 +366,18 @@ class AutoTrader:
         """ 損切価格の取得 """
         f_sell_order_price = self.get_order_price(sell_order_result)  # 売り指定価格
 
-        THRESHOLD = 10  # 閾値
+        THRESHOLD = self.params.stop_loss_threshold  # 閾値
         return f_sell_order_price - (self.SELL_ORDER_RANGE * THRESHOLD)
 
     def get_stop_loss_price_n(self, sell_order_result, n):
         """ 損切価格(閾値にnをかける)の取得 """
         f_sell_order_price = self.get_order_price(sell_order_result)  # 売り指定価格
 
-        THRESHOLD = 10 * n  # 閾値
+        THRESHOLD = self.params.stop_loss_threshold * n  # 閾値
         return f_sell_order_price - (self.SELL_ORDER_RANGE * THRESHOLD)
 
-    def is_buy_order(self):
+    @timed("AutoTrader.is_buy_order")
+    def is_buy_order(self, snapshot=None):
         """ 買い注文の判定
         条件(condition)：
             1. 1min MACDクロスがゴールデンクロスの場合　かつ
@@ -222,48 +385,47 @@ class AutoTrader:
             3. EMSクロスdiffの絶対値の総和がEMS_DIFF_THRESHOLD以上
         """
 
-        last, _, _ = self.bitbank.get_xrp_jpy_value()
-        f_last = float(last)  # 現在値
+        if snapshot is None:
+            snapshot = self.get_market_snapshot()
+        f_last = float(snapshot.last)  # 現在値
 
         # 条件1
-        macd_status = self.mtau.get_macd_cross_status("1min")
+        macd_status = self.mtau.judge_macd_cross(*snapshot.macd_diffs)
         condition_1 = (macd_status == MacdCross.GOLDEN)
 
         # 条件2
-        df_macd_1 = self.mtau.get_macd("1min")
-        macd_1 = df_macd_1.iloc[-1]["macd"]
+        macd_1 = snapshot.macd
         condition_2 = macd_1 < 0
 
-        # 条件3
-        n_short = 9
-        n_long = 26
-        EMS_DIFF_THRESHOLD = 0.1
-        df_ema = self.mtau.get_ema("1min", n_short, n_long)
-        df_ema_diff = pd.DataFrame(
-            df_ema["ema_short"] - df_ema["ema_long"], columns=["diff"])
-        df_ema_diff_short = df_ema_diff.tail(n_short)
-        ema_abs_sum = df_ema_diff_short.abs().sum(axis=0).values[0]
+        # 条件3（EMA 短期9 長期26 の差を直近9本分）
+        EMS_DIFF_THRESHOLD = self.params.ema_diff_threshold
+        ema_abs_sum = snapshot.ema_diff_abs_sum
         condition_3 = (ema_abs_sum > EMS_DIFF_THRESHOLD)
 
-        msg_cond = ("買待 last:{0:.3f} {1} "
-                    "EMS_SUM：{2:.3f}({3:.3f}) "
-                    "C1[{4}]C2[{5}]C3[{6}] "
-                    "macd_1:{7:.3f}")
-        self.myLogger.debug(msg_cond.format(f_last, macd_status,
-                                            ema_abs_sum, EMS_DIFF_THRESHOLD,
-                                            condition_1,
-                                            condition_2,
-                                            condition_3,
-                                            macd_1))
+        # 判定は毎回のポーリングで行うため、メッセージはDEBUGを出力する場合だけ組み立てる
+        msg_cond = ("買待 last:%.3f %s "
+                    "EMS_SUM：%.3f(%.3f) "
+                    "C1[%s]C2[%s]C3[%s] "
+                    "macd_1:%.3f tick:%.1fms")
+        self.myLogger.debug(msg_cond, f_last, macd_status,
+                            ema_abs_sum, EMS_DIFF_THRESHOLD,
+                            condition_1,
+                            condition_2,
+                            condition_3,
+                            macd_1,
+                            snapshot.latency * 1000)
 
         if condition_1 and condition_2 and condition_3:
             return True
 
         return False
 
-    def is_buy_order_cancel(self, order_result):
+    @timed("AutoTrader.is_buy_order_cancel")
+    def is_buy_order_cancel(self, order_result, snapshot=None):
         """ 買い注文のキャンセル判定 """
-        last, _, _ = self.bitbank.get_xrp_jpy_value()
+        if snapshot is None:
+            snapshot = self.get_market_snapshot()
+        last = snapshot.last
         f_last = float(last)  # 現在値
 
         f_order_price = self.get_order_price(order_result)
@@ -271,9 +433,8 @@ class AutoTrader:
         f_cancel_price = float(self.get_buy_cancel_price(order_result))
 
         if f_last > f_cancel_price:
-            msg_rebuy = ("last:{0:.3f} 買い注文価格:{1:.3f} 再注文価格:{2:.3f}"
-                         .format(f_last, f_order_price, f_cancel_price))
-            self.myLogger.debug(msg_rebuy)
+            self.myLogger.debug("last:%.3f 買い注文価格:%.3f 再注文価格:%.3f",
+                                f_last, f_order_price, f_cancel_price)
             return True
         else:
             return False
@@ -288,49 +449,53 @@ class AutoTrader:
     def buy_order(self):
         """ 買い注文処理 """
 
-        # 買うタイミングを待つ
-        while True:
-            time.sleep(self.POLLING_SEC_BUY)
-
-            if self.is_buy_order():  # 買い注文判定
-                break
-
-        # 買い注文処理
-        buy_order_info = self.get_buy_order_info()
-        buy_value = self.bitbank.prvApi.order(
-            buy_order_info["pair"],         # ペア
-            buy_order_info["price"],        # 価格
-            buy_order_info["amount"],       # 注文枚数
-            buy_order_info["orderSide"],    # 注文サイド 買(buy)
-            buy_order_info["orderType"]     # 注文タイプ 成行(market))
-        )
-
-        # 買い注文約定待ち
         while True:
-            time.sleep(self.POLLING_SEC_BUY)
-
-            # 買い注文結果を取得
-            buy_order_result = self.bitbank.prvApi.get_order(
-                buy_value["pair"],     # ペア
-                buy_value["order_id"]  # 注文タイプ 成行(market)
+            # 買うタイミングを待つ
+            while True:
+                time.sleep(self.POLLING_SEC_BUY)
+
+                snapshot = self.get_market_snapshot()
+                if self.is_buy_order(snapshot):  # 買い注文判定
+                    break
+
+            # 買い注文処理
+            decided_at = time.time()  # 買い判定の時刻（約定までの時間の起点）
+            buy_order_info = self.get_buy_order_info()
+            buy_value = self.bitbank.order(
+                buy_order_info["pair"],         # ペア
+                buy_order_info["price"],        # 価格
+                buy_order_info["amount"],       # 注文枚数
+                buy_order_info["orderSide"],    # 注文サイド 買(buy)
+                buy_order_info["orderType"]     # 注文タイプ 成行(market))
             )
+
+            # 買い注文約定待ち（約定か取消までOrderTrackerが確認する）
+            buy_order_result = self.bitbank.wait_order(buy_value)
             self.order.buy_result = buy_order_result
 
             # 買い注文の約定判定
-            if self.is_fully_filled(buy_order_result):
+            if self.is_fully_filled(buy_order_result,
+                                    self.get_market_snapshot()):
+                self.order.buy_fill_latency = self.get_fill_latency(
+                    buy_order_result, decided_at)
                 self.notify_buy(self.order)
                 break
+            self.myLogger.warning("買い注文が取消されました ID：{0}".format(
+                buy_order_result["order_id"]))
 
         return buy_order_result  # 買い注文終了(売り注文へ)
 
-    def is_waittig_sell_order(self, order):
+    @timed("AutoTrader.is_waittig_sell_order")
+    def is_waittig_sell_order(self, order, snapshot=None):
         """ 売り注文（成行）できない（待ち状態）か判定する
         条件１：買い注文時の価格＋BENEFITが現在価格より小さい（まだ売れない） かつ
         条件２：買い注文時の価格より前回のタイミングより 利益価格の50 % 増えている（まだ売れない）　かつ
         条件３：現在価格より損切価格（stop loss price）が小さい（まだ売れない） かつ
         条件４：RCIが 90 % より小さい場合はまだ売れない
         """
-        last, _, _ = self.bitbank.get_xrp_jpy_value()
+        if snapshot is None:
+            snapshot = self.get_market_snapshot()
+        last = snapshot.last
 
         # 条件１
         buy_price = self.get_order_price(order.buy_result)
@@ -345,83 +510,200 @@ class AutoTrader:
         condition3 = last > stop_loss_price
 
         # 条件４
-        rci = self.mtau.get_rci("1min")
-        condition4 = rci < 90
-
-        cond_msg = ("売判定 C1[{0}]({1:.3f}→{2:.3f}円) "
-                    "C2[{3}] C3[{4}] C4[{5}](rci:{6:.3f}%) "
-                    "pre:{7:.3f} last:{8:.3f} ")
-        self.myLogger.debug(cond_msg.format(
-            condition1, buy_price, bene_p,
-            condition2, condition3, condition4,
-            rci, order.pre_last, last))
+        rci = snapshot.rci
+        condition4 = rci < self.params.rci_threshold
+
+        cond_msg = ("売判定 C1[%s](%.3f→%.3f円) "
+                    "C2[%s] C3[%s] C4[%s](rci:%.3f%%) "
+                    "pre:%.3f last:%.3f tick:%.1fms")
+        self.myLogger.debug(cond_msg,
+                            condition1, buy_price, bene_p,
+                            condition2, condition3, condition4,
+                            rci, order.pre_last, last,
+                            snapshot.latency * 1000)
 
         order.pre_last = last
 
         return condition1 and condition2 and condition3 and condition4
 
+    def get_fill_latency(self, order_result, decided_at):
+        """ 売買の判定から約定までの秒数を返却する
+        約定時刻（executed_at）が無い場合は約定を確認した時刻までの秒数
+        """
+        executed_at = order_result.get("executed_at")
+        if executed_at is None:
+            latency = time.time() - decided_at
+        else:
+            latency = int(executed_at) / 1000.0 - decided_at
+        if order_result.get("status") == "FULLY_FILLED":
+            # 注文の約定までの時間はメトリクスにも出力する
+            get_latency_monitor().record(
+                "order.fill." + order_result["side"], latency)
+        self.myLogger.info("{0} 判定から約定まで {1:.3f}秒{2}".format(
+            order_result["side"], latency, self.get_mode_label()))
+        return latency
+
+    def get_mode_label(self):
+        """ ペーパートレードの場合に通知・ログに付けるラベル """
+        return "【ペーパー】" if getattr(self.bitbank, "paper", False) else ""
+
     def notify_buy(self, order):
         buy_price = self.get_order_price(order.buy_result)
         buy_order_id = order.buy_result["order_id"]
 
-        self.line.notify_line(("買い価格 {0:.3f}円 ID：{1}")
-                              .format(buy_price, buy_order_id))
+        self.line.notify_line(("{0}買い価格 {1:.3f}円 ID：{2} 約定まで{3:.3f}秒")
+                              .format(self.get_mode_label(), buy_price,
+                                      buy_order_id, order.buy_fill_latency))
 
     def notify_sell(self, order):
         buy_price = self.get_order_price(order.buy_result)
         sell_price = self.get_order_price(order.sell_result)
         sell_order_id = order.sell_result["order_id"]
         benefit = sell_price - buy_price
-        total = self.bitbank.get_total_assets()
+
+        def make_message(title):
+            # 総資産の取得は通知の送信スレッドで行う（売買ループを待たせない）
+            def message():
+                total = self.bitbank.get_total_assets()
+                return ("{0}{1}{2:.3f}円 総資産 {3}円 売価格 {4:.3f}円 ID：{5} "
+                        "約定まで{6:.3f}秒"
+                        .format(self.get_mode_label(), title, benefit, total,
+                                sell_price, sell_order_id,
+                                order.sell_fill_latency))
+            return message
 
         if benefit > 0:
             # 利益
-            self.line.notify_line_stamp(("【利益】{0:.3f}円 総資産 {1}円 "
-                                         "売価格 {2:.3f}円 ID：{3}")
-                                        .format(benefit,
-                                                total,
-                                                sell_price,
-                                                sell_order_id), "1", "10")
+            self.line.notify_line_stamp(make_message("【利益】"), "1", "10")
         else:
             # 損切
-            self.line.notify_line_stamp(("【損切】{0:.3f}円 総資産 {1}円 "
-                                         "売価格 {2:.3f}円 ID：{3}")
-                                        .format(benefit,
-                                                total,
-                                                sell_price,
-                                                sell_order_id), "1", "104")
+            self.line.notify_line_stamp(make_message("【損切】"), "1", "104")
 
     def sell_order(self):
         """ 売り注文処理 """
 
         while True:
-            time.sleep(self.POLLING_SEC_SELL)
-            if self.is_waittig_sell_order(self.order):
-                continue
-            else:
-                break
-
-        sell_order_info = self.get_sell_order_info()
-        sell_order_value = self.bitbank.prvApi.order(
-            sell_order_info["pair"],       # ペア
-            sell_order_info["price"],      # 価格
-            sell_order_info["amount"],     # 注文枚数
-            sell_order_info["orderSide"],  # 注文サイド
-            sell_order_info["orderType"]   # 注文タイプ
-        )
-
-        while True:
-            time.sleep(self.POLLING_SEC_SELL)
-
-            sell_order_result = self.bitbank.prvApi.get_order(
-                sell_order_value["pair"],     # ペア
-                sell_order_value["order_id"]  # 注文タイプ 指値 or 成行
+            while True:
+                time.sleep(self.POLLING_SEC_SELL)
+                if self.is_waittig_sell_order(self.order,
+                                              self.get_market_snapshot()):
+                    continue
+                else:
+                    break
+
+            decided_at = time.time()  # 売り判定の時刻（約定までの時間の起点）
+            sell_order_info = self.get_sell_order_info()
+            sell_order_value = self.bitbank.order(
+                sell_order_info["pair"],       # ペア
+                sell_order_info["price"],      # 価格
+                sell_order_info["amount"],     # 注文枚数
+                sell_order_info["orderSide"],  # 注文サイド
+                sell_order_info["orderType"]   # 注文タイプ
             )
 
-            if self.is_fully_filled(sell_order_result):
+            # 売り注文約定待ち（約定か取消までOrderTrackerが確認する）
+            sell_order_result = self.bitbank.wait_order(sell_order_value)
+
+            if self.is_fully_filled(sell_order_result,
+                                    self.get_market_snapshot()):
                 self.order.sell_result = sell_order_result
+                self.order.sell_fill_latency = self.get_fill_latency(
+                    sell_order_result, decided_at)
                 self.notify_sell(self.order)
                 break
+            self.myLogger.warning("売り注文が取消されました ID：{0}".format(
+                sell_order_result["order_id"]))
+
+
+class MultiPairTrader:
+    """ 複数ペアを1プロセスで並行に自動売買するクラス
+    ペアごとにOrderとAutoTraderを持ち、Bitbank（ティッカー）と
+    MyTechnicalAnalysisUtil（ロウソク足キャッシュ）は全ペアで共有する。
+    """
+
+    def __init__(self, pair_amounts, market_data=None, params=None):
+        """ コンストラクタ
+        pair_amounts: {ペア: 注文枚数} 例) {"xrp_jpy": "1", "btc_jpy": "0.0001"}
+        """
+        self.LOOP_COUNT_MAIN = 10
+        self.bitbank = Bitbank(market_data)
+        self.mtau = MyTechnicalAnalysisUtil(market_data=market_data)
+        self.line = get_line_notify_queue()
+        self.traders = {}
+        for pair, amount in pair_amounts.items():
+            self.traders[pair] = AutoTrader(Order(), market_data, params,
+                                            pair, amount,
+                                            self.bitbank, self.mtau)
+        self.counts = {pair: 0 for pair in self.traders}  # ペアごとの処理回数
+        self.errors = {}  # key:ペア value:発生した例外
+        self.stop_event = threading.Event()
+        self.myLogger = MyLogger("MultiPairTrader")
+
+    def run_pair(self, pair, loop_count):
+        """ 1ペア分の買い→売りをloop_count回繰り返す
+        他のペアで例外が発生した場合は次の買いの前に停止する。
+        """
+        trader = self.traders[pair]
+        for i in range(loop_count):
+            if self.stop_event.is_set():
+                break
+            self.counts[pair] = self.counts[pair] + 1
+            self.myLogger.info("=== 処理開始[{0} NO.{1}] ===".format(
+                pair, self.counts[pair]))
+            trader.buy_order()   # 買い注文処理
+            trader.sell_order()  # 売り注文処理
+
+            active_orders = self.bitbank.get_remaining_orders(pair)
+            if active_orders != []:
+                msg = "[{0}] 売買数が合いません！！！ 注文数：{1}".format(
+                    pair, len(active_orders))
+                self.line.notify_line_stamp(msg, "1", "422")
+                self.myLogger.debug(msg)
+                for j, act_order in enumerate(active_orders):
+                    self.myLogger.debug(
+                        "現在のオーダー一覧 :{0}:{1}".format(j, act_order))
+                break  # このペアのループブレイク
+        return self.counts[pair]
+
+    def run(self, loop_count):
+        """ 全ペアを並行に処理する 戻り値: {ペア: 処理回数}
+        例外が発生したペアは終了を待たずに通知し（self.errorsに記録）、
+        他のペアには停止を指示する。
+        """
+        self.stop_event.clear()
+        self.errors = {}
+        executor = ThreadPoolExecutor(max_workers=len(self.traders))
+        try:
+            futures = {executor.submit(self.run_pair, pair, loop_count): pair
+                       for pair in self.traders}
+            for future in as_completed(futures):
+                exception = future.exception()
+                if exception is None:
+                    continue
+                pair = futures[future]
+                self.errors[pair] = exception
+                self.stop_event.set()
+                msg = "[{0}] システムエラーが発生しました！ 詳細：{1}".format(
+                    pair, exception)
+                self.myLogger.error(msg)
+                self.line.notify_line_stamp(msg, "1", "17")
+        finally:
+            self.stop_event.set()
+            executor.shutdown(wait=False)
+        return dict(self.counts)
+
+
+def register_metrics(bitbank, mtau, line, registry=None):
+    """ 流量制限・キャッシュ・約定確認・LINE通知の統計をメトリクスに登録する """
+    if registry is None:
+        registry = get_metrics()
+    registry.add_stats("scheduler", bitbank.scheduler.get_stats, "endpoint")
+    registry.add_stats("candle_cache", mtau.get_candle_cache_stats)
+    registry.add_stats("order_tracker", bitbank.order_tracker.get_stats)
+    registry.add_stats("account", bitbank.account.get_stats)
+    registry.add_stats("http", get_http_session().get_stats)
+    registry.add_stats("line", line.get_stats)
+    return registry
 
 
 class Order:
@@ -432,15 +714,57 @@ class Order:
         self.pre_last = 0.0           # 前回処理時の現在価格
         self.buy_result = None        # buy約定結果情報
         self.sell_result = None       # sell約定結果情報
+        self.buy_fill_latency = 0.0   # buy判定から約定までの秒数
+        self.sell_fill_latency = 0.0  # sell判定から約定までの秒数
         self.stop_loss_price = 0.0    # 損切価格
 
 
 # main
 if __name__ == '__main__':
+    # kill -USR1 <pid> で処理時間（p50/p95/p99）の集計をログに出力する
+    # （ハンドラでは出力を予約するだけで、次の計測時に出力する）
+    # 定期的な出力の間隔は LATENCY_SUMMARY_SEC（秒）で指定する
+    if hasattr(signal, "SIGUSR1"):
+        signal.signal(signal.SIGUSR1,
+                      lambda signum, frame:
+                      get_latency_monitor().request_summary())
     od = Order()
-    at = AutoTrader(od)
-    line = Line()
-    bitbank = Bitbank()
+    # optimizer.pyで選んだパラメータを使う場合は STRATEGY_PARAMS にJSONのパスを指定する
+    params_path = os.getenv("STRATEGY_PARAMS")
+    params = None if params_path is None else StrategyParams.load(params_path)
+    # 複数ペアを並行に売買する場合は TRADE_PAIRS に "ペア:枚数" をカンマ区切りで指定する
+    # 例) TRADE_PAIRS=xrp_jpy:1,mona_jpy:1
+    trade_pairs = os.getenv("TRADE_PAIRS")
+    if trade_pairs is not None:
+        pair_amounts = dict(item.split(":")
+                            for item in trade_pairs.split(","))
+        mpt = MultiPairTrader(pair_amounts, params=params)
+        register_metrics(mpt.bitbank, mpt.mtau, mpt.line)
+        start_metrics_server()
+        try:
+            msg = "=== 処理開始[{0}] 総資産:{1}円===".format(
+                ",".join(pair_amounts), mpt.bitbank.get_total_assets())
+            mpt.myLogger.info(msg)
+            mpt.line.notify_line(msg)
+            mpt.run(mpt.LOOP_COUNT_MAIN)
+        except KeyboardInterrupt as ki:
+            mpt.line.notify_line_stamp(
+                "自動売買が中断されました 詳細：{0}".format(ki), "1", "3")
+        except BaseException as be:
+            mpt.line.notify_line_stamp(
+                "システムエラーが発生しました！ 詳細：{0}".format(be), "1", "17")
+            raise
+        finally:
+            mpt.line.notify_line_stamp(
+                "自動売買が終了！処理回数：{0}".format(mpt.counts), "2", "516")
+            mpt.line.close()  # 未送信の通知を送信してから終了する
+        sys.exit(1 if mpt.errors else 0)
+    at = AutoTrader(od, params=params)
+    line = get_line_notify_queue()
+    bitbank = at.bitbank  # ペーパートレードでは資産・注文を売買と共有する
+    # METRICS_PORT を指定した場合は http://127.0.0.1:<port>/metrics で公開する
+    register_metrics(bitbank, at.mtau, line)
+    start_metrics_server()
     count = 0
 
     try:
@@ -453,12 +777,11 @@ if __name__ == '__main__':
             line.notify_line(msg)
             buy_result = at.buy_order()        # 買い注文処理
             at.sell_order()   # 売り注文処理
+            at.myLogger.debug("リクエスト統計 {0}".format(
+                bitbank.scheduler.get_stats()))
 
-            activeOrders = bitbank.get_active_orders()["orders"]
-            if activeOrders != []:
-                at.myLogger.debug("デバッグ 注文一覧 {0}".format(activeOrders))
-                time.sleep(60)
-                at.myLogger.debug("デバッグ ６０秒後 注文一覧 {0}".format(activeOrders))
+            # アクティブ注文は完了するまで最大60秒待つ
+            activeOrders = bitbank.get_remaining_orders()
             if activeOrders != []:
                 line.notify_line_stamp("売買数が合いません！！！ 注文数：{0}".format(
                     len(activeOrders)), "1", "422")
@@ -477,3 +800,4 @@ if __name__ == '__main__':
         raise BaseException
     finally:
         line.notify_line_stamp("自動売買が終了！処理回数：{0}回".format(count), "2", "516")
+        line.close()  # 未送信の通知を送信してから終了する
@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import hmac
+import time
+import hashlib
+from urllib.parse import urlencode
+
+from httpSession import get_http_session
+
+# 接続先（環境変数で模擬取引所 mockExchange.py などに向けられる）
+PUBLIC_END_POINT = "https://public.bitbank.cc"
+PRIVATE_END_POINT = "https://api.bitbank.cc/v1"
+
+
+def get_public_end_point():
+    """ Public APIの接続先（環境変数 BITBANK_PUBLIC_END_POINT） """
+    return os.getenv("BITBANK_PUBLIC_END_POINT", PUBLIC_END_POINT)
+
+
+def get_private_end_point():
+    """ Private APIの接続先（環境変数 BITBANK_PRIVATE_END_POINT） """
+    return os.getenv("BITBANK_PRIVATE_END_POINT", PRIVATE_END_POINT)
+
+
+class BitbankError(Exception):
+    """ bitbank APIがエラー（success=0）を返した場合の例外 """
+
+    def __init__(self, code):
+        super().__init__("bitbank api error code:{0}".format(code))
+        self.code = code
+
+
+def make_auth_headers(api_key, api_secret, message, nonce=None):
+    """ Private APIの認証ヘッダを作成する
+    ACCESS-SIGNATURE = HMAC-SHA256(api_secret, nonce + message)
+        GET : message = "/v1" + path + "?" + query
+        POST: message = リクエストボディ(JSON)
+    """
+    if nonce is None:
+        nonce = str(int(time.time() * 1000))
+    signature = hmac.new(api_secret.encode("utf-8"),
+                         (nonce + message).encode("utf-8"),
+                         hashlib.sha256).hexdigest()
+    return {"Content-Type": "application/json",
+            "ACCESS-KEY": api_key,
+            "ACCESS-NONCE": nonce,
+            "ACCESS-SIGNATURE": signature}
+
+
+def parse_response(response):
+    """ レスポンスのdataを返却する（success=0の場合はBitbankError） """
+    result = response.json()
+    if result.get("success") != 1:
+        raise BitbankError(result.get("data", {}).get("code"))
+    return result["data"]
+
+
+class BitbankPublic:
+    """ python_bitbankcc.public と同じメソッドのPublic APIクライアント
+    共有のHttpSessionで接続を使い回す。
+    """
+
+    def __init__(self, session=None, end_point=None):
+        """ コンストラクタ
+        end_point: 接続先（省略時は get_public_end_point()）
+        """
+        if session is None:
+            session = get_http_session()
+        self.session = session
+        if end_point is None:
+            end_point = get_public_end_point()
+        self.end_point = end_point
+
+    def _query(self, path):
+        return parse_response(self.session.get(self.end_point + path))
+
+    def get_ticker(self, pair):
+        """ ティッカーを取得 """
+        return self._query("/{0}/ticker".format(pair))
+
+    def get_tickers(self):
+        """ 全ペアのティッカーを取得 """
+        return self._query("/tickers")
+
+    def get_depth(self, pair):
+        """ 板情報を取得 """
+        return self._query("/{0}/depth".format(pair))
+
+    def get_transactions(self, pair, yyyymmdd=None):
+        """ 約定履歴を取得 """
+        path = "/{0}/transactions".format(pair)
+        if yyyymmdd is not None:
+            path = path + "/" + yyyymmdd
+        return self._query(path)
+
+    def get_candlestick(self, pair, candle_type, yyyymmdd):
+        """ ロウソク足を取得 """
+        return self._query("/{0}/candlestick/{1}/{2}".format(
+            pair, candle_type, yyyymmdd))
+
+
+class BitbankPrivate:
+    """ python_bitbankcc.private と同じメソッドのPrivate APIクライアント
+    共有のHttpSessionで接続を使い回す。
+    """
+
+    def __init__(self, api_key, api_secret, session=None, end_point=None):
+        """ コンストラクタ
+        end_point: 接続先（省略時は get_private_end_point()）
+        """
+        self.api_key = api_key
+        self.api_secret = api_secret
+        if session is None:
+            session = get_http_session()
+        self.session = session
+        if end_point is None:
+            end_point = get_private_end_point()
+        self.end_point = end_point
+
+    def _get_query(self, path, query=None):
+        if query:
+            path = path + "?" + urlencode(query)
+        headers = make_auth_headers(self.api_key, self.api_secret,
+                                    "/v1" + path)
+        return parse_response(self.session.get(self.end_point + path,
+                                               headers=headers))
+
+    def _post_query(self, path, body):
+        data = json.dumps(body)
+        headers = make_auth_headers(self.api_key, self.api_secret, data)
+        return parse_response(self.session.post(self.end_point + path,
+                                                data=data, headers=headers))
+
+    def get_asset(self):
+        """ 資産を取得 """
+        return self._get_query("/user/assets")
+
+    def get_order(self, pair, order_id):
+        """ 注文情報を取得 """
+        return self._get_query("/user/spot/order",
+                               {"pair": pair, "order_id": order_id})
+
+    def get_orders_info(self, pair, order_ids):
+        """ 複数の注文情報をまとめて取得 """
+        return self._post_query("/user/spot/orders_info",
+                                {"pair": pair, "order_ids": order_ids})
+
+    def get_active_orders(self, pair, options=None):
+        """ アクティブ注文情報を取得 """
+        query = {"pair": pair}
+        if options is not None:
+            query.update(options)
+        return self._get_query("/user/spot/active_orders", query)
+
+    def order(self, pair, price, amount, side, order_type):
+        """ 注文 """
+        return self._post_query("/user/spot/order",
+                                {"pair": pair,
+                                 "price": price,
+                                 "amount": amount,
+                                 "side": side,
+                                 "type": order_type})
+
+    def cancel_order(self, pair, order_id):
+        """ 注文キャンセル """
+        return self._post_query("/user/spot/cancel_order",
+                                {"pair": pair, "order_id": order_id})
@@ -2,17 +2,22 @@
 import os
 import time
 
-from myUtil import Line
+from myUtil import LineNotifyQueue, get_line_notify_queue
 from technicalAnalysis import MyTechnicalAnalysisUtil
+from metricsServer import get_metrics, start_metrics_server
 
 
 class Advisor:
-    def __init__(self):
-        """ コンストラクタ """
+    def __init__(self, line=None):
+        """ コンストラクタ
+        line: LINE通知のキュー（省略時はプロセス内で共有のもの）
+        """
         self.api_key = os.getenv("BITBANK_API_KEY")
         self.api_secret = os.getenv("BITBANK_API_SECRET")
         self.check_env()
-        self.line = Line()
+        if line is None:
+            line = get_line_notify_queue()
+        self.line = line
 
     def check_env(self):
         """ 環境変数のチェック """
@@ -25,6 +30,9 @@ class Advisor:
 
     def notify_rsi_under_20(self):
         mtau = MyTechnicalAnalysisUtil()
+        metrics = get_metrics()
+        metrics.add_stats("candle_cache", mtau.get_candle_cache_stats)
+        metrics.add_stats("line", self.line.get_stats)
 
         while True:
             pair_dic = {"btc_jpy": 514, "xrp_jpy": 166}
@@ -35,6 +43,7 @@ class Advisor:
             pre_rci = None
             for pair in pair_dic:
                 for candle_type in candle_type_list:
+                    metrics.tick()
                     rsi = mtau.get_rsi(candle_type, pair)
                     rci = mtau.get_rci(candle_type, pair)
 
@@ -59,13 +68,16 @@ class Advisor:
 
 # main
 if __name__ == '__main__':
-    line = Line()
+    # 短時間に続いた通知は1分ごとに1つのメッセージにまとめて送る
+    line = LineNotifyQueue(digest_sec=60.0)
+    # METRICS_PORT を指定した場合は http://127.0.0.1:<port>/metrics で公開する
+    start_metrics_server()
     retry = 0
     while True:
         print("===== RSI通知処理開始 ======")
 
         try:
-            Advisor().notify_rsi_under_20()
+            Advisor(line).notify_rsi_under_20()
         except BaseException as be:
             msg = "Retry:{0}, RSI通知でエラーが発生しました！ 詳細：{1}".format(be, retry)
             print(be)
@@ -73,3 +85,4 @@ if __name__ == '__main__':
             # raise BaseException
 
         retry = retry + 1
+        get_metrics().inc("retries", {"site": "notify_rsi_under_20"})
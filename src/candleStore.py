@@ -0,0 +1,128 @@
+import os
+import threading
+
+import numpy as np
+
+# 1ロウソク=48byteの固定長レコード
+CANDLE_DTYPE = np.dtype([("time", "<i8"),     # UnixTime（ミリ秒）
+                         ("open", "<f8"),     # 始値
+                         ("hight", "<f8"),    # 高値
+                         ("low", "<f8"),      # 安値
+                         ("close", "<f8"),    # 終値
+                         ("amount", "<f8")])  # 出来高
+
+
+def to_records(ohlcv):
+    """ bitbankのohlcv（[始値,高値,安値,終値,出来高,UnixTime]のlist）を
+    CANDLE_DTYPEの配列に変換する
+    """
+    records = np.empty(len(ohlcv), dtype=CANDLE_DTYPE)
+    if len(ohlcv) == 0:
+        return records
+    values = np.asarray(ohlcv, dtype=float).reshape(-1, 6)
+    records["time"] = values[:, 5].astype("int64")
+    records["open"] = values[:, 0]
+    records["hight"] = values[:, 1]
+    records["low"] = values[:, 2]
+    records["close"] = values[:, 3]
+    records["amount"] = values[:, 4]
+    return records
+
+
+def sort_unique(records):
+    """ 時刻順に並べ、同じ時刻のロウソクは後から追加されたものを残す """
+    if len(records) == 0:
+        return records
+    times = records["time"]
+    if len(records) > 1 and np.all(times[1:] > times[:-1]):
+        return records  # 時刻順・重複なし（通常はこちら）
+    order = np.argsort(times, kind="stable")[::-1]
+    _, first = np.unique(times[order], return_index=True)
+    return records[order[first]]
+
+
+class CandleStore:
+    """ 確定済みのロウソク足をローカルに保存するクラス
+    (pair, candle_type)ごとに下記２ファイルへ追記のみ行う。
+        <pair>_<candle_type>.bin  : CANDLE_DTYPEの固定長レコード
+        <pair>_<candle_type>.keys : 保存済みの日付(yyyymmdd)を1行ずつ
+    読み込みはメモリマップで行うため、JSONのパースは発生しない。
+    """
+
+    def __init__(self, root_dir="./candle_store"):
+        """ コンストラクタ """
+        self.root_dir = root_dir
+        self._keys = {}     # key:(pair, candle_type) value:保存済み日付のset
+        self._memmaps = {}  # key:(pair, candle_type) value:(ファイルサイズ, memmap)
+        self._lock = threading.Lock()
+
+    def get_path(self, pair, candle_type, ext):
+        """ 保存先ファイルのパスを返却する """
+        return os.path.join(self.root_dir,
+                            "{0}_{1}.{2}".format(pair, candle_type, ext))
+
+    def get_keys(self, pair, candle_type):
+        """ 保存済みの日付(yyyymmdd)のsetを返却する """
+        with self._lock:
+            return set(self._load_keys(pair, candle_type))
+
+    def has_key(self, pair, candle_type, key):
+        """ 指定日が保存済みか """
+        with self._lock:
+            return key in self._load_keys(pair, candle_type)
+
+    def _load_keys(self, pair, candle_type):
+        keys = self._keys.get((pair, candle_type))
+        if keys is None:
+            keys = set()
+            path = self.get_path(pair, candle_type, "keys")
+            if os.path.exists(path):
+                with open(path) as f:
+                    keys = set(line.strip() for line in f if line.strip())
+            self._keys[(pair, candle_type)] = keys
+        return keys
+
+    def append(self, pair, candle_type, key, ohlcv):
+        """ 確定済みの1日分のロウソクを追記する（保存済みの場合は何もしない） """
+        records = to_records(ohlcv)
+        with self._lock:
+            keys = self._load_keys(pair, candle_type)
+            if key in keys:
+                return
+            os.makedirs(self.root_dir, exist_ok=True)
+            # レコードを書いてから日付を書く（途中で落ちても日付が無ければ再取得される）
+            with open(self.get_path(pair, candle_type, "bin"), "ab") as f:
+                f.write(records.tobytes())
+            with open(self.get_path(pair, candle_type, "keys"), "a") as f:
+                f.write(key + "\n")
+            keys.add(key)
+
+    def load(self, pair, candle_type):
+        """ 保存済みの全ロウソクをメモリマップしたCANDLE_DTYPEの配列で返却する（保存順） """
+        path = self.get_path(pair, candle_type, "bin")
+        if not os.path.exists(path):
+            return np.empty(0, dtype=CANDLE_DTYPE)
+        size = os.path.getsize(path)
+        count = size // CANDLE_DTYPE.itemsize
+        if count == 0:
+            return np.empty(0, dtype=CANDLE_DTYPE)
+
+        with self._lock:
+            cached = self._memmaps.get((pair, candle_type))
+            if cached is not None and cached[0] == size:
+                return cached[1]
+            mm = np.memmap(path, dtype=CANDLE_DTYPE, mode="r", shape=(count,))
+            self._memmaps[(pair, candle_type)] = (size, mm)
+            return mm
+
+    def read_range(self, pair, candle_type, start_ms, end_ms):
+        """ start_ms <= time < end_ms のロウソクを時刻順・重複なしで返却する """
+        records = self.load(pair, candle_type)
+        times = records["time"]
+        if len(records) > 1 and np.all(times[1:] > times[:-1]):
+            # 時刻順に追記されている場合は二分探索で切り出す
+            s = np.searchsorted(times, start_ms, side="left")
+            e = np.searchsorted(times, end_ms, side="left")
+            return records[s:e]
+        mask = (times >= start_ms) & (times < end_ms)
+        return sort_unique(records[mask])
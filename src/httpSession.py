@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class HttpSession:
+    """ keep-aliveで接続を使い回すHTTPセッション
+    Bitbank、MyTechnicalAnalysisUtil、Lineで共有し（get_http_session）、
+    ポーリングのたびにTCP+TLSの接続を作り直さないようにする。
+    """
+
+    def __init__(self, pool_connections=4, pool_maxsize=16, timeout=3.0):
+        """ コンストラクタ
+        pool_connections: 接続を保持するホスト数
+        pool_maxsize: 1ホストあたりに保持する接続数（同時にリクエストするスレッド数以上）
+        timeout: 1リクエストの期限（秒）
+        """
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_connections,
+                              pool_maxsize=pool_maxsize)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.adapter = adapter
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def request(self, method, url, **kwargs):
+        """ リクエストする（timeoutを省略した場合は既定の期限） """
+        kwargs.setdefault("timeout", self.timeout)
+        with self._lock:
+            self.requests = self.requests + 1
+        return self.session.request(method, url, **kwargs)
+
+    def get(self, url, **kwargs):
+        """ GETリクエスト """
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        """ POSTリクエスト """
+        return self.request("POST", url, **kwargs)
+
+    def get_stats(self):
+        """ リクエスト数、新規接続数、接続の再利用数・再利用率を返却する """
+        pools = self.adapter.poolmanager.pools
+        connections = sum(pools[key].num_connections for key in pools.keys())
+        with self._lock:
+            requests_count = self.requests
+        reused = max(0, requests_count - connections)
+        ratio = reused / requests_count if requests_count > 0 else 0.0
+        return {"requests": requests_count,
+                "connections": connections,
+                "reused": reused,
+                "reuse_ratio": ratio}
+
+    def close(self):
+        """ 保持している接続を閉じる """
+        self.session.close()
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_http_session():
+    """ プロセス内で共有するHttpSessionを返却する """
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = HttpSession()
+        return _session
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pandas as pd
+
+# 一度に順位付けする要素数の上限（窓数 × n）
+RANK_CHUNK_ELEMENTS = 2000000
+
+
+def sliding_windows(values, n):
+    """ 最後の軸に沿って長さnの窓をコピーせずに並べる
+    values: shape (..., 本数) → 戻り値: shape (..., 本数-n+1, n)
+    （sliding_window_viewはnumpy 1.20以降のためas_stridedを使う）
+    """
+    values = np.ascontiguousarray(values, dtype=float)
+    shape = values.shape[:-1] + (values.shape[-1] - n + 1, n)
+    strides = values.strides + (values.strides[-1],)
+    return np.lib.stride_tricks.as_strided(values, shape=shape,
+                                           strides=strides, writeable=False)
+
+
+def _rci_windows(windows, ties):
+    """ 窓ごとのRCIを返却する windows: shape (..., n) """
+    n = windows.shape[-1]
+    positions = np.broadcast_to(np.arange(n), windows.shape)
+    # 価格の高い順（同値は新しい順）に並べたときの窓内の位置
+    order = np.lexsort((-positions, -windows), axis=-1)
+    a = n - order  # 並べた順の時間の順位（新しい順）
+    b = np.broadcast_to(np.arange(1, n + 1, dtype=float), windows.shape)
+    if ties == "average":
+        # 同値の並びは先頭と末尾の順位の平均にする
+        ranked = np.take_along_axis(windows, order, axis=-1)
+        same = ranked[..., 1:] == ranked[..., :-1]
+        first = np.where(np.concatenate(
+            [np.zeros(same.shape[:-1] + (1,), dtype=bool), same], axis=-1),
+            0, b)
+        first = np.maximum.accumulate(first, axis=-1)
+        last = np.where(np.concatenate(
+            [same, np.zeros(same.shape[:-1] + (1,), dtype=bool)], axis=-1),
+            n + 1, b)
+        last = np.minimum.accumulate(last[..., ::-1], axis=-1)[..., ::-1]
+        b = (first + last) / 2.0
+    y = ((a - b) ** 2).sum(axis=-1)
+    rci = (1 - 6 * y / (n * (n ** 2 - 1))) * 100
+    return np.where(np.isnan(windows).any(axis=-1), np.nan, rci)
+
+
+def rolling_rci(closes, n, ties="newest"):
+    """ 全期間のRCIを返却する（最初のn-1本と、窓にNaNを含む場合はNaN）
+    closes: 終値 shape (本数,) または (銘柄数, 本数) など最後の軸が時間の配列
+    ties:
+        "newest": 同値の終値は新しいロウソクを上位の順位とする（get_rciと同じ）
+        "average": 同値の終値は順位の平均とする
+    """
+    if ties not in ("newest", "average"):
+        raise ValueError(
+            "ties must be 'newest' or 'average': {0}".format(ties))
+    closes = np.asarray(closes, dtype=float)
+    rci = np.full(closes.shape, np.nan)
+    if closes.shape[-1] < n:
+        return rci
+
+    windows = sliding_windows(closes, n).reshape(
+        (-1,) + (closes.shape[-1] - n + 1, n))
+    out = rci.reshape((-1, closes.shape[-1]))
+    count = windows.shape[1]
+    # 中間配列が大きくなり過ぎないよう、窓をまとめて区切りながら計算する
+    chunk = max(1, RANK_CHUNK_ELEMENTS // n)
+    if count <= chunk:
+        rows = max(1, chunk // count)
+        for s in range(0, windows.shape[0], rows):
+            out[s:s + rows, n - 1:] = _rci_windows(windows[s:s + rows], ties)
+    else:
+        for s in range(windows.shape[0]):
+            for i in range(0, count, chunk):
+                out[s, n - 1 + i:n - 1 + i + chunk] = _rci_windows(
+                    windows[s, i:i + chunk], ties)
+    return rci
+
+
+def rolling_rsi(closes, n=14, method="sma"):
+    """ 全期間のRSIを返却する（最初のn本はNaN）
+    closes: 終値 shape (本数,) または (銘柄数, 本数) など最後の軸が時間の配列
+    method: 上げ幅・下げ幅の平均の取り方
+        "sma": 単純移動平均（MyTechnicalAnalysisUtil.get_rsi() と同じ値になる）
+        "wilder": Wilderの平滑移動平均（α=1/n StreamingRsiと同じ値になる）
+        "ema": 指数平滑移動平均（α=2/(n+1)）
+    """
+    if method not in ("sma", "wilder", "ema"):
+        raise ValueError(
+            "method must be 'sma', 'wilder' or 'ema': {0}".format(method))
+    closes = np.asarray(closes, dtype=float)
+    # 銘柄を列に並べ、全銘柄をpandasで１回に計算する
+    frame = pd.DataFrame(closes.reshape((-1, closes.shape[-1])).T)
+    diff = frame.diff()
+    up = diff.clip(lower=0)
+    down = (-diff).clip(lower=0)
+    if method == "sma":
+        up_mean = up.rolling(n).mean()
+        down_mean = down.rolling(n).mean()
+    else:
+        alpha = 1.0 / n if method == "wilder" else 2.0 / (n + 1)
+        up_mean = up.ewm(alpha=alpha, adjust=False).mean()
+        down_mean = down.ewm(alpha=alpha, adjust=False).mean()
+        up_mean.iloc[:n] = np.nan
+        down_mean.iloc[:n] = np.nan
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rsi = 100.0 - (100.0 / (1.0 + up_mean.values / down_mean.values))
+    return rsi.T.reshape(closes.shape)
+
+
+def rolling_macd(closes, n_short=12, n_long=26, n_signal=9):
+    """ 全期間のMACDとシグナルを返却する（MyTechnicalAnalysisUtil.get_macd() と同じ計算）
+    closes: 終値 shape (本数,) または (銘柄数, 本数) など最後の軸が時間の配列
+    戻り値: (MACD, シグナル) closesと同じshape
+    """
+    closes = np.asarray(closes, dtype=float)
+    frame = pd.DataFrame(closes.reshape((-1, closes.shape[-1])).T)
+    macd = frame.ewm(span=n_short).mean() - frame.ewm(span=n_long).mean()
+    signal = macd.ewm(span=n_signal).mean()
+    return (macd.values.T.reshape(closes.shape),
+            signal.values.T.reshape(closes.shape))
@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+
+import os
+import time
+import functools
+import threading
+from collections import deque
+
+import numpy as np
+
+
+class LatencyHistogram:
+    """ 1つの処理（スパン）の処理時間を集計するクラス
+    百分位（p50/p95/p99）は直近window件から計算し、件数・合計・最大は累計する。
+    """
+
+    def __init__(self, window=1024):
+        """ コンストラクタ """
+        self.samples = deque(maxlen=window)  # 直近の処理時間（秒）
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds):
+        """ 処理時間を追加する """
+        self.samples.append(seconds)
+        self.count = self.count + 1
+        self.total = self.total + seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def copy(self):
+        """ 集計の複製を返却する """
+        histogram = LatencyHistogram(self.samples.maxlen)
+        histogram.samples.extend(self.samples)
+        histogram.count = self.count
+        histogram.total = self.total
+        histogram.max = self.max
+        return histogram
+
+    def get_summary(self):
+        """ 件数、合計、平均、最大、直近window件のp50/p95/p99（秒）を返却する """
+        summary = {"count": self.count, "sum": self.total,
+                   "mean": self.total / self.count if self.count else 0.0,
+                   "max": self.max}
+        if len(self.samples) > 0:
+            p50, p95, p99 = np.percentile(list(self.samples), [50, 95, 99])
+        else:
+            p50 = p95 = p99 = 0.0
+        summary.update({"p50": p50, "p95": p95, "p99": p99})
+        return summary
+
+
+class LatencyMonitor:
+    """ 売買ループの処理時間をスパン（処理名）ごとに集計するクラス
+    ・timedデコレータ・spanで計測し、スパンごとのLatencyHistogramに追加する
+    ・summary_interval_sec秒ごとに全スパンの集計をログに出力する（0の場合は出力しない）
+    ・dump()でいつでも集計を取得できる
+    ・request_summary()で次の計測時に集計をログに出力する（シグナルハンドラ用）
+    """
+
+    def __init__(self, window=1024, summary_interval_sec=60.0, logger=None,
+                 clock=time.time):
+        """ コンストラクタ """
+        self.window = window
+        self.summary_interval_sec = summary_interval_sec
+        self.logger = logger
+        self.clock = clock
+        self.histograms = {}  # key:スパン名 value:LatencyHistogram
+        self._last_summary = clock()
+        self._summary_requested = threading.Event()
+        self._lock = threading.Lock()
+
+    def record(self, name, seconds):
+        """ スパンの処理時間（秒）を追加する """
+        log = False
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = LatencyHistogram(self.window)
+                self.histograms[name] = histogram
+            histogram.record(seconds)
+            if self.summary_interval_sec > 0:
+                now = self.clock()
+                if now - self._last_summary >= self.summary_interval_sec:
+                    self._last_summary = now
+                    log = True
+        if log or self._summary_requested.is_set():
+            self._summary_requested.clear()
+            self.log_summary()
+
+    def request_summary(self):
+        """ 次のrecord()で集計をログに出力する
+        シグナルハンドラはrecord()の途中（ロック中）のスレッドで動くことがあるため、
+        ハンドラからはlog_summary()ではなくこれを呼ぶ
+        """
+        self._summary_requested.set()
+
+    def span(self, name):
+        """ withで囲んだ処理の時間を計測する """
+        return _Span(self, name)
+
+    def dump(self):
+        """ 全スパンの集計 {スパン名: LatencyHistogram.get_summary()} を返却する """
+        with self._lock:
+            histograms = {name: histogram.copy()
+                          for name, histogram in self.histograms.items()}
+        # 百分位の計算はロックの外で行う
+        return {name: histogram.get_summary()
+                for name, histogram in histograms.items()}
+
+    def format_summary(self):
+        """ 全スパンの集計を1スパン1行（ミリ秒）の文字列にする """
+        lines = []
+        for name, s in sorted(self.dump().items()):
+            lines.append("{0} n:{1} p50:{2:.1f} p95:{3:.1f} p99:{4:.1f} "
+                         "max:{5:.1f}ms".format(name, s["count"],
+                                                s["p50"] * 1000,
+                                                s["p95"] * 1000,
+                                                s["p99"] * 1000,
+                                                s["max"] * 1000))
+        return "\n".join(lines)
+
+    def log_summary(self):
+        """ 全スパンの集計をログに出力する """
+        if self.logger is None:
+            # myUtilもこのモジュールを使うため、ここでimportする
+            from myUtil import MyLogger
+            self.logger = MyLogger("LatencyMonitor")
+        self.logger.info("処理時間\n" + self.format_summary())
+
+    def clear(self):
+        """ 集計を消去する """
+        with self._lock:
+            self.histograms = {}
+
+
+class _Span:
+    def __init__(self, monitor, name):
+        self.monitor = monitor
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.monitor.record(self.name, time.perf_counter() - self.start)
+
+
+def timed(name):
+    """ 関数・メソッドの処理時間を共有のLatencyMonitorのスパンnameで計測するデコレータ """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                get_latency_monitor().record(name,
+                                             time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+_monitor = None
+_monitor_lock = threading.Lock()
+
+
+def get_latency_monitor():
+    """ プロセス内で共有するLatencyMonitorを返却する
+    集計をログに出力する間隔は環境変数 LATENCY_SUMMARY_SEC（既定 60秒 0:出力しない）
+    """
+    global _monitor
+    if _monitor is not None:
+        return _monitor
+    with _monitor_lock:
+        if _monitor is None:
+            _monitor = LatencyMonitor(summary_interval_sec=float(
+                os.getenv("LATENCY_SUMMARY_SEC", "60")))
+        return _monitor
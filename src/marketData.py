@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+
+import json
+import time
+import threading
+
+from myUtil import MyLogger
+
+# 配信データの種類
+CHANNELS = ("ticker", "transactions", "depth")
+
+
+class MarketDataSource:
+    """ 市場データ（ticker/transactions/depth）の配信元の基底クラス
+    実装クラスはメッセージを受信したらon_message()を呼ぶ。
+    利用側はget_ticker()等で最新の配信データを参照する（リクエストしない）。
+    """
+
+    def __init__(self, pairs=("xrp_jpy",)):
+        """ コンストラクタ """
+        self.pairs = tuple(pairs)
+        self._state = {}      # key:(channel, pair) value:(受信時刻, data)
+        self._listeners = []  # listener(channel, pair, data)
+        self._lock = threading.Lock()
+        self.myLogger = MyLogger(self.__class__.__name__)
+
+    def start(self):
+        """ 配信を開始する """
+        raise NotImplementedError
+
+    def stop(self):
+        """ 配信を終了する """
+        raise NotImplementedError
+
+    def add_listener(self, listener):
+        """ 受信時に呼び出す関数 listener(channel, pair, data) を登録する """
+        self._listeners.append(listener)
+
+    def on_message(self, channel, pair, data):
+        """ 受信したメッセージを最新の状態として保持する """
+        with self._lock:
+            self._state[(channel, pair)] = (time.time(), data)
+        for listener in self._listeners:
+            listener(channel, pair, data)
+
+    def get_latest(self, channel, pair, max_age_sec=None):
+        """ 最新の配信データを返却する（未受信またはmax_age_secより古い場合はNone） """
+        with self._lock:
+            entry = self._state.get((channel, pair))
+        if entry is None:
+            return None
+        received_at, data = entry
+        if max_age_sec is not None and time.time() - received_at > max_age_sec:
+            return None
+        return data
+
+    def get_ticker(self, pair, max_age_sec=None):
+        """ 最新のティッカー {"sell","buy","high","low","last","vol","timestamp"} """
+        return self.get_latest("ticker", pair, max_age_sec)
+
+    def get_transactions(self, pair, max_age_sec=None):
+        """ 最新の約定履歴 {"transactions": [...]} """
+        return self.get_latest("transactions", pair, max_age_sec)
+
+    def get_depth(self, pair, max_age_sec=None):
+        """ 最新の板情報 {"asks": [...], "bids": [...], "timestamp"} """
+        return self.get_latest("depth", pair, max_age_sec)
+
+
+class MarketDataRecorder:
+    """ 受信したメッセージをJSON Lines形式で記録するlistener
+    記録したファイルはReplayMarketDataSourceで再生できる。
+    """
+
+    def __init__(self, path):
+        """ コンストラクタ """
+        self.path = path
+        self._lock = threading.Lock()
+
+    def __call__(self, channel, pair, data):
+        line = json.dumps({"t": time.time(), "channel": channel,
+                           "pair": pair, "data": data})
+        with self._lock:
+            with open(self.path, "a") as f:
+                f.write(line + "\n")
+
+
+class BitbankStreamSource(MarketDataSource):
+    """ bitbankのリアルタイムAPI（Socket.IO）から配信を受けるクラス
+    https://github.com/bitbankinc/bitbank-api-docs/blob/master/public-stream.md
+    python-socketio[client] が必要。
+    """
+
+    # ルーム名の接頭辞と配信データの種類の対応
+    ROOM_PREFIXES = (("ticker_", "ticker"),
+                     ("transactions_", "transactions"),
+                     ("depth_whole_", "depth"))
+
+    def __init__(self, pairs=("xrp_jpy",), url="https://stream.bitbank.cc"):
+        """ コンストラクタ """
+        super().__init__(pairs)
+        self.url = url
+        self.client = None
+
+    def start(self):
+        """ 接続して各ペアのルームに参加する """
+        import socketio
+
+        self.client = socketio.Client(reconnection=True)
+        self.client.on("connect", self.join_rooms)
+        self.client.on("message", self.on_stream_message)
+        self.client.connect(self.url, transports=["websocket"])
+
+    def stop(self):
+        """ 切断する """
+        if self.client is not None:
+            self.client.disconnect()
+
+    def join_rooms(self):
+        """ 接続（再接続）時にルームへ参加する """
+        for pair in self.pairs:
+            for prefix, _ in self.ROOM_PREFIXES:
+                self.client.emit("join-room", prefix + pair)
+
+    def on_stream_message(self, message):
+        """ 配信メッセージを処理する
+        {"room_name": "ticker_xrp_jpy", "message": {"pair":..,"data":..}}
+        """
+        room_name = message.get("room_name", "")
+        for prefix, channel in self.ROOM_PREFIXES:
+            if room_name.startswith(prefix):
+                pair = room_name[len(prefix):]
+                self.on_message(channel, pair, message["message"]["data"])
+                return
+        self.myLogger.warning("未対応のルーム {0}".format(room_name))
+
+
+class ReplayMarketDataSource(MarketDataSource):
+    """ MarketDataRecorderで記録したメッセージを再生するクラス（オフライン用）
+    speed: 再生速度の倍率（1.0=記録時と同じ間隔、0=待たずに再生）
+    """
+
+    def __init__(self, path, speed=1.0, pairs=("xrp_jpy",)):
+        """ コンストラクタ """
+        super().__init__(pairs)
+        self.path = path
+        self.speed = speed
+        self._thread = None
+        self._stop_event = threading.Event()
+
+    def start(self):
+        """ 別スレッドで再生を開始する """
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self.replay, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """ 再生を中断する """
+        self._stop_event.set()
+        self.join()
+
+    def join(self, timeout=None):
+        """ 再生が終わるまで待つ """
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def replay(self):
+        """ 記録時の間隔/speedで再生する """
+        pre_t = None
+        with open(self.path) as f:
+            for line in f:
+                if self._stop_event.is_set():
+                    break
+                if not line.strip():
+                    continue
+                message = json.loads(line)
+                if message["pair"] not in self.pairs:
+                    continue
+                if pre_t is not None and self.speed:
+                    wait = (message["t"] - pre_t) / self.speed
+                    if wait > 0 and self._stop_event.wait(wait):
+                        break
+                pre_t = message["t"]
+                self.on_message(message["channel"], message["pair"],
+                                message["data"])
@@ -0,0 +1,270 @@
+# -*- coding: utf-8 -*-
+
+import os
+import time
+import threading
+from collections import deque
+from socketserver import ThreadingMixIn
+from http.server import HTTPServer, BaseHTTPRequestHandler
+
+from latencyMonitor import get_latency_monitor
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+PREFIX = "bitbank_"
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def escape_label(value):
+    """ ラベルの値をPrometheusのテキスト形式でエスケープする """
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"") \
+        .replace("\n", "\\n")
+
+
+def format_labels(labels):
+    """ {名前: 値} を {名前="値",...} の形式にする（空の場合は空文字） """
+    if not labels:
+        return ""
+    return "{" + ",".join("{0}=\"{1}\"".format(k, escape_label(v))
+                          for k, v in sorted(labels.items())) + "}"
+
+
+def get_process_memory():
+    """ プロセスのメモリ使用量 (RSS, 最大RSS) をbyteで返却する（取得できない場合はNone） """
+    rss = None
+    try:
+        with open("/proc/self/statm") as f:
+            rss = int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (IOError, OSError, ValueError):
+        pass
+    max_rss = None
+    if resource is not None:
+        # Linuxはキロバイト単位
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    return rss, max_rss
+
+
+class MetricsRegistry:
+    """ 常駐プロセスの稼働状況をPrometheusのテキスト形式で出力するクラス
+    ・inc: エラー数・リトライ数などのカウンタ
+    ・tick: 売買判定などのループ回数（カウンタと直近rate_window_sec秒の1秒あたりの回数）
+    ・add_stats: get_stats()の数値をゲージとして出力する
+    ・LatencyMonitorのスパン（APIのエンドポイント、注文の約定までの時間など）は
+      百分位のsummaryとして出力する
+    """
+
+    def __init__(self, rate_window_sec=60.0, latency_monitor=None,
+                 clock=time.time):
+        """ コンストラクタ """
+        self.rate_window_sec = rate_window_sec
+        self.latency_monitor = latency_monitor
+        self.clock = clock
+        self.started_at = clock()
+        self.counters = {}  # key:(名前, ラベルのtuple) value:回数
+        self.ticks = {}     # key:名前 value:直近のtick時刻のdeque
+        self.stats = {}     # key:名前の接頭辞 value:(get_stats, ラベル名)
+        self._lock = threading.Lock()
+
+    def inc(self, name, labels=None, value=1):
+        """ カウンタ name に value を加える """
+        key = (name, tuple(sorted((labels or {}).items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def tick(self, name="ticks"):
+        """ ループ1回分を記録する """
+        self.inc(name)
+        now = self.clock()
+        with self._lock:
+            times = self.ticks.setdefault(name, deque())
+            times.append(now)
+            self._expire(times, now)
+
+    def get_rate(self, name="ticks"):
+        """ 直近rate_window_sec秒の1秒あたりの回数 """
+        now = self.clock()
+        with self._lock:
+            times = self.ticks.get(name)
+            if times is None:
+                return 0.0
+            self._expire(times, now)
+            window = min(self.rate_window_sec, now - self.started_at)
+            return len(times) / window if window > 0 else 0.0
+
+    def _expire(self, times, now):
+        while times and times[0] <= now - self.rate_window_sec:
+            times.popleft()
+
+    def add_stats(self, name, get_stats, label=None):
+        """ get_stats() の数値をゲージ <name>_<キー> として出力する
+        label: get_stats() が {ラベルの値: {キー: 数値}} を返す場合のラベル名
+        同じnameで登録し直した場合は置き換える
+        """
+        with self._lock:
+            self.stats[name] = (get_stats, label)
+
+    def render(self):
+        """ 全てのメトリクスをPrometheusのテキスト形式で返却する """
+        lines = []
+        with self._lock:
+            counters = sorted(self.counters.items())
+            tick_names = sorted(self.ticks)
+            stats = sorted(self.stats.items())
+
+        typed = set()
+        for (name, labels), value in counters:
+            metric = PREFIX + name + "_total"
+            if metric not in typed:
+                typed.add(metric)
+                lines.append("# TYPE {0} counter".format(metric))
+            lines.append("{0}{1} {2}".format(metric, format_labels(
+                dict(labels)), value))
+
+        for name in tick_names:
+            metric = PREFIX + name + "_per_second"
+            lines.append("# TYPE {0} gauge".format(metric))
+            lines.append("{0} {1}".format(metric, self.get_rate(name)))
+
+        for name, (get_stats, label) in stats:
+            lines.extend(self.render_stats(name, get_stats(), label))
+
+        lines.extend(self.render_latency())
+        lines.extend(self.render_process())
+        return "\n".join(lines) + "\n"
+
+    def render_stats(self, name, stats, label):
+        if label is None:
+            stats = {None: stats}
+        samples = {}  # key:メトリクス名 value:[(ラベル, 値)]
+        for label_value, values in sorted(stats.items(),
+                                          key=lambda item: str(item[0])):
+            labels = {} if label is None else {label: label_value}
+            for key, value in sorted(values.items()):
+                if isinstance(value, bool) or \
+                        not isinstance(value, (int, float)):
+                    continue
+                metric = "{0}{1}_{2}".format(PREFIX, name, key)
+                samples.setdefault(metric, []).append((labels, value))
+        lines = []
+        for metric, values in sorted(samples.items()):
+            lines.append("# TYPE {0} gauge".format(metric))
+            for labels, value in values:
+                lines.append("{0}{1} {2}".format(
+                    metric, format_labels(labels), value))
+        return lines
+
+    def render_latency(self):
+        monitor = self.latency_monitor
+        if monitor is None:
+            monitor = get_latency_monitor()
+        dump = monitor.dump()
+        if not dump:
+            return []
+        metric = PREFIX + "span_seconds"
+        lines = ["# TYPE {0} summary".format(metric)]
+        for span, s in sorted(dump.items()):
+            for quantile, key in (("0.5", "p50"), ("0.95", "p95"),
+                                  ("0.99", "p99")):
+                lines.append("{0}{1} {2}".format(metric, format_labels(
+                    {"span": span, "quantile": quantile}), s[key]))
+            labels = format_labels({"span": span})
+            lines.append("{0}_sum{1} {2}".format(metric, labels, s["sum"]))
+            lines.append("{0}_count{1} {2}".format(metric, labels,
+                                                   s["count"]))
+        return lines
+
+    def render_process(self):
+        rss, max_rss = get_process_memory()
+        lines = ["# TYPE process_start_time_seconds gauge",
+                 "process_start_time_seconds {0}".format(self.started_at)]
+        if rss is not None:
+            lines.append("# TYPE process_resident_memory_bytes gauge")
+            lines.append("process_resident_memory_bytes {0}".format(rss))
+        if max_rss is not None:
+            lines.append("# TYPE process_max_resident_memory_bytes gauge")
+            lines.append("process_max_resident_memory_bytes {0}".format(
+                max_rss))
+        return lines
+
+
+class _ThreadingServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """ GET /metrics でメトリクスを返す """
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = self.server.registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class MetricsServer:
+    """ MetricsRegistryを http://<host>:<port>/metrics で公開するサーバ
+    （Prometheusから収集する）
+    """
+
+    def __init__(self, registry, host="127.0.0.1", port=0):
+        """ コンストラクタ（port=0の場合は空いているポートを使う） """
+        self.registry = registry
+        self.httpd = _ThreadingServer((host, port), _Handler)
+        self.httpd.registry = registry
+        self._thread = None
+
+    @property
+    def url(self):
+        """ メトリクスのURL """
+        host, port = self.httpd.server_address[:2]
+        return "http://{0}:{1}/metrics".format(host, port)
+
+    def start(self):
+        """ バックグラウンドのスレッドで応答を開始する """
+        self._thread = threading.Thread(target=self.httpd.serve_forever,
+                                        daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """ 応答を停止する """
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+_metrics = None
+_metrics_lock = threading.Lock()
+
+
+def get_metrics():
+    """ プロセス内で共有するMetricsRegistryを返却する """
+    global _metrics
+    if _metrics is not None:
+        return _metrics
+    with _metrics_lock:
+        if _metrics is None:
+            _metrics = MetricsRegistry()
+        return _metrics
+
+
+def start_metrics_server():
+    """ 環境変数 METRICS_PORT が設定されている場合にメトリクスのサーバを開始する
+    METRICS_HOST: 待ち受けるアドレス（既定 127.0.0.1）
+    戻り値: MetricsServer（METRICS_PORTが無い場合はNone）
+    """
+    port = os.getenv("METRICS_PORT")
+    if port is None:
+        return None
+    host = os.getenv("METRICS_HOST", "127.0.0.1")
+    return MetricsServer(get_metrics(), host, int(port)).start()
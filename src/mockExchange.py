@@ -0,0 +1,510 @@
+# -*- coding: utf-8 -*-
+
+import os
+import re
+import json
+import time
+import random
+import calendar
+import threading
+from datetime import datetime, timedelta
+from socketserver import ThreadingMixIn
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import numpy as np
+
+from candleStore import CandleStore
+from technicalAnalysis import CANDLE_PERIOD_SEC, YEAR_KEY_CANDLE_TYPES
+
+DAY_MS = 24 * 60 * 60 * 1000
+
+# bitbankのエラーコード
+ERROR_NOT_FOUND = 10000          # URLが存在しません
+ERROR_AUTH = 20001               # API認証に失敗しました
+ERROR_ORDER_NOT_FOUND = 50009    # 注文が存在しません
+ERROR_CANNOT_CANCEL = 50010      # 注文をキャンセルできません
+ERROR_INSUFFICIENT = 60001       # 保有数量が不足しています
+ERROR_BUSY = 70009               # ただいま混雑しています（注入するエラー）
+
+ACTIVE_STATUSES = ("UNFILLED", "PARTIALLY_FILLED")
+
+
+class MockError(Exception):
+    """ 模擬取引所がエラー（success=0）を返す場合の例外 """
+
+    def __init__(self, code):
+        super().__init__("mock exchange error code:{0}".format(code))
+        self.code = code
+
+
+def _no_delay():
+    return 0.0
+
+
+class MatchingEngine:
+    """ 資産と注文を管理し、現在の価格（get_quote）で注文を約定させるクラス
+    BitbankPrivateと同じ形式の注文情報・資産を返す。
+    ・注文はfill_delay()秒経過するまで約定しない（発注から約定までの遅延）
+    ・成行注文は現在の売り（買い注文）・買い（売り注文）にslippageの割合を加えた価格で、
+      指値注文は価格が注文価格に達した時点で全量約定する
+    """
+
+    def __init__(self, get_quote, assets=None, slippage=0.0, fill_delay=None,
+                 clock=time.time):
+        """ コンストラクタ
+        get_quote: get_quote(pair) で (現在値, 売り注文の最安値, 買い注文の最高値)
+                   を返す関数
+        assets: 初期資産 例) {"jpy": 100000.0}
+        fill_delay: 発注から約定できるまでの秒数を返す関数（省略時は遅延なし）
+        """
+        self.get_quote = get_quote
+        self.slippage = slippage
+        if fill_delay is None:
+            fill_delay = _no_delay
+        self.fill_delay = fill_delay
+        self.clock = clock
+        if assets is None:
+            assets = {"jpy": 100000.0}
+        self.assets = {}  # key:資産 value:[保有量, ロック中の数量]
+        for asset, amount in assets.items():
+            self.assets[asset] = [float(amount), 0.0]
+        self.assets.setdefault("jpy", [0.0, 0.0])
+        self.orders = {}  # key:注文ID value:注文情報
+        self._next_order_id = 1
+        self._lock = threading.Lock()
+
+    def get_now_ms(self):
+        """ 現在の時刻（ミリ秒） """
+        return int(self.clock() * 1000)
+
+    def get_assets(self):
+        """ 資産 """
+        with self._lock:
+            self._match_all()
+            return {"assets": [{"asset": asset,
+                                "onhand_amount": str(onhand),
+                                "locked_amount": str(locked),
+                                "free_amount": str(onhand - locked)}
+                               for asset, (onhand, locked)
+                               in self.assets.items()]}
+
+    def order(self, pair, price, amount, side, order_type):
+        """ 注文（資産が不足する場合はERROR_INSUFFICIENT） """
+        with self._lock:
+            base, quote = pair.split("_")
+            amount = float(amount)
+            last, sell, buy = self.get_quote(pair)
+            if order_type == "market":
+                price = None
+                cost_price = sell if side == "buy" else buy
+            else:
+                price = float(price)
+                cost_price = price
+            if side == "buy":
+                lock_asset, lock_amount = quote, amount * cost_price
+            else:
+                lock_asset, lock_amount = base, amount
+            onhand, locked = self.assets.setdefault(lock_asset, [0.0, 0.0])
+            if onhand - locked < lock_amount:
+                raise MockError(ERROR_INSUFFICIENT)
+            self.assets[lock_asset][1] = locked + lock_amount
+
+            order_id = self._next_order_id
+            self._next_order_id = order_id + 1
+            order = {"order_id": order_id, "pair": pair, "side": side,
+                     "type": order_type, "start_amount": str(amount),
+                     "remaining_amount": str(amount),
+                     "executed_amount": "0", "price": price,
+                     "average_price": "0", "ordered_at": self.get_now_ms(),
+                     "status": "UNFILLED",
+                     "_lock": (lock_asset, lock_amount),
+                     "_fillable_at": self.get_now_ms() + int(
+                         self.fill_delay() * 1000)}
+            self.orders[order_id] = order
+            self._match(order)
+            return self._public(order)
+
+    def get_order(self, pair, order_id):
+        """ 注文情報 """
+        with self._lock:
+            self._match_all()
+            return self._public(self._get(pair, order_id))
+
+    def get_orders_info(self, pair, order_ids):
+        """ 複数の注文情報（存在しない注文IDは含めない） """
+        with self._lock:
+            self._match_all()
+            orders = [self.orders.get(int(order_id)) for order_id in order_ids]
+            return {"orders": [self._public(order) for order in orders
+                               if order is not None and order["pair"] == pair]}
+
+    def get_active_orders(self, pair, options=None):
+        """ アクティブ注文（optionsは無視する） """
+        with self._lock:
+            self._match_all()
+            return {"orders": [self._public(order)
+                               for order in self.orders.values()
+                               if order["pair"] == pair and
+                               order["status"] in ACTIVE_STATUSES]}
+
+    def cancel_order(self, pair, order_id):
+        """ 注文キャンセル """
+        with self._lock:
+            self._match_all()
+            order = self._get(pair, order_id)
+            if order["status"] not in ACTIVE_STATUSES:
+                raise MockError(ERROR_CANNOT_CANCEL)
+            self._unlock(order)
+            order["status"] = "CANCELED_UNFILLED"
+            return self._public(order)
+
+    def _get(self, pair, order_id):
+        order = self.orders.get(int(order_id))
+        if order is None or order["pair"] != pair:
+            raise MockError(ERROR_ORDER_NOT_FOUND)
+        return order
+
+    def _public(self, order):
+        return {key: value for key, value in order.items()
+                if not key.startswith("_")}
+
+    def _match_all(self):
+        """ 約定できる注文を約定させる """
+        for order in list(self.orders.values()):
+            if order["status"] in ACTIVE_STATUSES:
+                self._match(order)
+
+    def _match(self, order):
+        """ 遅延（fill_delay）後、成行注文は現在の売り・買い＋スリッページで、
+        指値注文は価格が注文価格に達していれば約定させる
+        """
+        if self.get_now_ms() < order["_fillable_at"]:
+            return
+        last, sell, buy = self.get_quote(order["pair"])
+        if order["type"] == "market":
+            if order["side"] == "buy":
+                self._fill(order, sell * (1.0 + self.slippage))
+            else:
+                self._fill(order, buy * (1.0 - self.slippage))
+        elif order["side"] == "buy" and sell <= order["price"]:
+            self._fill(order, order["price"])
+        elif order["side"] == "sell" and buy >= order["price"]:
+            self._fill(order, order["price"])
+
+    def _fill(self, order, price):
+        """ 注文を全量約定させ、資産を移動する """
+        self._unlock(order)
+        base, quote = order["pair"].split("_")
+        amount = float(order["start_amount"])
+        sign = 1.0 if order["side"] == "buy" else -1.0
+        self.assets.setdefault(base, [0.0, 0.0])
+        self.assets[base][0] = self.assets[base][0] + sign * amount
+        self.assets[quote][0] = self.assets[quote][0] - sign * amount * price
+        order["remaining_amount"] = "0"
+        order["executed_amount"] = str(amount)
+        order["average_price"] = str(price)
+        order["executed_at"] = self.get_now_ms()
+        order["status"] = "FULLY_FILLED"
+
+    def _unlock(self, order):
+        asset, amount = order["_lock"]
+        self.assets[asset][1] = max(0.0, self.assets[asset][1] - amount)
+
+
+class MockExchange(MatchingEngine):
+    """ 記録したロウソク足（CandleStoreの1min）で価格を再生し、注文を約定させる模擬取引所
+    ・記録の先頭からwarmup_days日後の0時を「今日」の0時に合わせ、
+      現在時刻までの記録ロウソクだけを公開する（時間の経過とともに価格が進む）
+    ・ティッカーの現在値は公開済みの最新ロウソクの終値、売り・買いは±spread/2
+    ・注文はMatchingEngineで約定させる
+    """
+
+    def __init__(self, store, pairs=("xrp_jpy",), assets=None, spread=0.002,
+                 warmup_days=2, clock=time.time):
+        """ コンストラクタ
+        store: 記録したロウソク足（CandleStore）
+        assets: 初期資産 例) {"jpy": 100000.0}
+        """
+        self.spread = spread
+        self.records = {}  # key:ペア value:時刻順の1minロウソク
+        for pair in pairs:
+            self.records[pair] = np.array(store.load(pair, "1min"))
+        first = min(int(records["time"][0])
+                    for records in self.records.values())
+        start_ms = (first // DAY_MS + warmup_days) * DAY_MS
+        today_ms = int(clock() * 1000) // DAY_MS * DAY_MS
+        self.offset_ms = today_ms - start_ms  # 記録の時刻 + offset_ms = 現在の時刻
+        super().__init__(self.get_quote, assets, clock=clock)
+        for pair in pairs:
+            self.assets.setdefault(pair.split("_")[0], [0.0, 0.0])
+
+    def get_visible(self, pair, start_ms, end_ms):
+        """ start_ms <= time < end_ms の公開済み（現在時刻まで）の1minロウソクを
+        時刻を現在に合わせて返却する
+        """
+        records = self.records.get(pair)
+        if records is None:
+            raise MockError(ERROR_NOT_FOUND)
+        end_ms = min(end_ms, self.get_now_ms() + 1)
+        times = records["time"]
+        s = np.searchsorted(times, start_ms - self.offset_ms, side="left")
+        e = np.searchsorted(times, end_ms - self.offset_ms, side="left")
+        visible = records[s:e].copy()
+        visible["time"] = visible["time"] + self.offset_ms
+        return visible
+
+    def get_last(self, pair):
+        """ 現在値（公開済みの最新ロウソクの終値） """
+        records = self.records.get(pair)
+        if records is None:
+            raise MockError(ERROR_NOT_FOUND)
+        i = np.searchsorted(records["time"],
+                            self.get_now_ms() - self.offset_ms, side="right")
+        return float(records["close"][max(0, i - 1)])
+
+    def get_quote(self, pair):
+        """ (現在値, 売り注文の最安値, 買い注文の最高値) """
+        last = self.get_last(pair)
+        half = last * self.spread / 2.0
+        return last, round(last + half, 3), round(last - half, 3)
+
+    def get_ticker(self, pair):
+        """ ティッカー """
+        last, sell, buy = self.get_quote(pair)
+        now = self.get_now_ms()
+        day = self.get_visible(pair, now - DAY_MS, now + 1)
+        high = day["hight"].max() if len(day) > 0 else last
+        low = day["low"].min() if len(day) > 0 else last
+        return {"pair": pair, "sell": str(sell), "buy": str(buy),
+                "high": str(high), "low": str(low), "last": str(last),
+                "vol": str(day["amount"].sum()), "timestamp": now}
+
+    def get_tickers(self):
+        """ 全ペアのティッカー """
+        return [self.get_ticker(pair) for pair in self.records]
+
+    def get_depth(self, pair, levels=5):
+        """ 板情報（現在値の前後に等間隔の注文を並べる） """
+        last, sell, buy = self.get_quote(pair)
+        tick = max(0.001, round(last * self.spread / 2.0, 3))
+        asks = [[str(round(sell + tick * i, 3)), "1000.0"]
+                for i in range(levels)]
+        bids = [[str(round(buy - tick * i, 3)), "1000.0"]
+                for i in range(levels)]
+        return {"asks": asks, "bids": bids, "timestamp": self.get_now_ms()}
+
+    def get_candlestick(self, pair, candle_type, key):
+        """ ロウソク足（1minの記録を candle_type の期間にまとめる） """
+        period_ms = CANDLE_PERIOD_SEC.get(candle_type)
+        if period_ms is None:
+            raise MockError(ERROR_NOT_FOUND)
+        period_ms = period_ms * 1000
+        if candle_type in YEAR_KEY_CANDLE_TYPES:
+            start = datetime(int(key), 1, 1)
+            end = datetime(int(key) + 1, 1, 1)
+        else:
+            start = datetime.strptime(key, "%Y%m%d")
+            end = start + timedelta(days=1)
+        start_ms = calendar.timegm(start.timetuple()) * 1000
+        end_ms = calendar.timegm(end.timetuple()) * 1000
+        records = self.get_visible(pair, start_ms, end_ms)
+
+        ohlcv = []
+        if len(records) > 0:
+            groups = records["time"] // period_ms * period_ms
+            _, first = np.unique(groups, return_index=True)
+            last = np.append(first[1:], len(records)) - 1
+            highs = np.maximum.reduceat(records["hight"], first)
+            lows = np.minimum.reduceat(records["low"], first)
+            amounts = np.add.reduceat(records["amount"], first)
+            for i, f in enumerate(first):
+                ohlcv.append([str(records["open"][f]), str(highs[i]),
+                              str(lows[i]), str(records["close"][last[i]]),
+                              str(amounts[i]), int(groups[f])])
+        return {"candlestick": [{"type": candle_type, "ohlcv": ohlcv}],
+                "timestamp": self.get_now_ms()}
+
+
+class _ThreadingServer(ThreadingMixIn, HTTPServer):
+    """ 接続ごとにスレッドで応答する（多数のトレーダーから同時に接続する） """
+    daemon_threads = True
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """ bitbankと同じURL・レスポンス形式で模擬取引所を公開する """
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        self.server.mock.handle(self, "GET", url.path, query)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length).decode("utf-8") if length > 0 else ""
+        url = urlparse(self.path)
+        self.server.mock.handle(self, "POST", url.path,
+                                json.loads(body) if body else {})
+
+    def reply(self, result):
+        body = json.dumps(result).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class MockExchangeServer:
+    """ MockExchangeをHTTPで公開するサーバ
+    latency_sec（+0〜jitter_secの乱数）だけ待ってから応答し、
+    error_rateの割合でERROR_BUSYを返す。
+    Bitbank・MyTechnicalAnalysisUtilは環境変数 BITBANK_PUBLIC_END_POINT、
+    BITBANK_PRIVATE_END_POINT に public_end_point、private_end_point を
+    設定すると接続先がこのサーバになる。
+    """
+
+    ROUTES = [
+        ("GET", re.compile(r"^/tickers$"), "tickers", False),
+        ("GET", re.compile(r"^/(\w+)/ticker$"), "ticker", False),
+        ("GET", re.compile(r"^/(\w+)/depth$"), "depth", False),
+        ("GET", re.compile(r"^/(\w+)/candlestick/(\w+)/(\d+)$"),
+         "candlestick", False),
+        ("GET", re.compile(r"^/v1/user/assets$"), "assets", True),
+        ("GET", re.compile(r"^/v1/user/spot/order$"), "get_order", True),
+        ("GET", re.compile(r"^/v1/user/spot/active_orders$"),
+         "active_orders", True),
+        ("POST", re.compile(r"^/v1/user/spot/order$"), "order", True),
+        ("POST", re.compile(r"^/v1/user/spot/cancel_order$"), "cancel_order",
+         True),
+        ("POST", re.compile(r"^/v1/user/spot/orders_info$"), "orders_info",
+         True),
+    ]
+
+    def __init__(self, exchange, host="127.0.0.1", port=0, latency_sec=0.0,
+                 jitter_sec=0.0, error_rate=0.0, seed=None):
+        """ コンストラクタ（port=0の場合は空いているポートを使う） """
+        self.exchange = exchange
+        self.latency_sec = latency_sec
+        self.jitter_sec = jitter_sec
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.stats = {}  # key:ルート名 value:リクエスト数
+        self.errors = 0
+        self._lock = threading.Lock()
+        self.httpd = _ThreadingServer((host, port), _Handler)
+        self.httpd.mock = self
+        self._thread = None
+
+    @property
+    def public_end_point(self):
+        """ Public APIの接続先 """
+        host, port = self.httpd.server_address[:2]
+        return "http://{0}:{1}".format(host, port)
+
+    @property
+    def private_end_point(self):
+        """ Private APIの接続先 """
+        return self.public_end_point + "/v1"
+
+    def start(self):
+        """ バックグラウンドのスレッドで応答を開始する """
+        self._thread = threading.Thread(target=self.httpd.serve_forever,
+                                        daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """ 応答を停止する """
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def get_stats(self):
+        """ ルートごとのリクエスト数と注入したエラー数を返却する """
+        with self._lock:
+            stats = dict(self.stats)
+            stats["errors"] = self.errors
+        return stats
+
+    def handle(self, handler, method, path, params):
+        """ リクエストを処理して応答する """
+        with self._lock:
+            wait = self.latency_sec + self.random.random() * self.jitter_sec
+            inject = self.random.random() < self.error_rate
+        if wait > 0:
+            time.sleep(wait)
+        try:
+            name, args, private = self.route(method, path)
+            if private and "ACCESS-KEY" not in handler.headers:
+                raise MockError(ERROR_AUTH)
+            with self._lock:
+                self.stats[name] = self.stats.get(name, 0) + 1
+                if inject:
+                    self.errors = self.errors + 1
+            if inject:
+                raise MockError(ERROR_BUSY)
+            result = {"success": 1, "data": self.call(name, args, params)}
+        except MockError as e:
+            result = {"success": 0, "data": {"code": e.code}}
+        except (KeyError, ValueError):
+            result = {"success": 0, "data": {"code": ERROR_NOT_FOUND}}
+        handler.reply(result)
+
+    def route(self, method, path):
+        for route_method, pattern, name, private in self.ROUTES:
+            match = pattern.match(path)
+            if route_method == method and match is not None:
+                return name, match.groups(), private
+        raise MockError(ERROR_NOT_FOUND)
+
+    def call(self, name, args, params):
+        exchange = self.exchange
+        if name == "tickers":
+            return exchange.get_tickers()
+        if name == "ticker":
+            return exchange.get_ticker(args[0])
+        if name == "depth":
+            return exchange.get_depth(args[0])
+        if name == "candlestick":
+            return exchange.get_candlestick(*args)
+        if name == "assets":
+            return exchange.get_assets()
+        if name == "get_order":
+            return exchange.get_order(params["pair"], params["order_id"])
+        if name == "active_orders":
+            return exchange.get_active_orders(params["pair"])
+        if name == "order":
+            return exchange.order(params["pair"], params.get("price"),
+                                  params["amount"], params["side"],
+                                  params["type"])
+        if name == "cancel_order":
+            return exchange.cancel_order(params["pair"], params["order_id"])
+        return exchange.get_orders_info(params["pair"], params["order_ids"])
+
+
+if __name__ == '__main__':
+    import sys
+
+    # python mockExchange.py フィクスチャのディレクトリ [ポート]
+    # フィクスチャはbenchmark.pyのrecord_fixture/make_synthetic_fixtureで作成する
+    fixture_dir = sys.argv[1]
+    port = int(sys.argv[2]) if len(sys.argv) > 2 else 8080
+    pairs = os.getenv("MOCK_PAIRS", "xrp_jpy").split(",")
+    server = MockExchangeServer(
+        MockExchange(CandleStore(fixture_dir), pairs),
+        port=port,
+        latency_sec=float(os.getenv("MOCK_LATENCY_SEC", "0")),
+        jitter_sec=float(os.getenv("MOCK_JITTER_SEC", "0")),
+        error_rate=float(os.getenv("MOCK_ERROR_RATE", "0")))
+    print("export BITBANK_PUBLIC_END_POINT={0}".format(
+        server.public_end_point))
+    print("export BITBANK_PRIVATE_END_POINT={0}".format(
+        server.private_end_point))
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
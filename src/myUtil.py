@@ -1,9 +1,18 @@
 import os
+import json
+import time
+import queue
+import atexit
 import logging
+import threading
+from collections import OrderedDict
 from logging import getLogger, StreamHandler, DEBUG
+from logging.handlers import QueueHandler, QueueListener
 from datetime import datetime, timezone, timedelta
 
-import requests
+from httpSession import get_http_session
+from requestScheduler import TokenBucket
+from latencyMonitor import timed
 
 
 class MyUtil:
@@ -15,54 +24,133 @@ class MyUtil:
         return datetime.now(JST).strftime('%Y/%m/%d %H:%M:%S')
 
 
+LOG_FORMAT = "%(asctime)s %(name)s %(levelname)s %(message)s"
+
+
+class JsonFormatter(logging.Formatter):
+    """ 1行1JSONのログ（time, level, name, thread, message, exception） """
+
+    def format(self, record):
+        log = OrderedDict([
+            ("time", datetime.fromtimestamp(record.created, timezone.utc)
+             .isoformat()),
+            ("level", record.levelname),
+            ("name", record.name),
+            ("thread", record.threadName),
+            ("message", record.getMessage())])
+        if record.exc_info:
+            log["exception"] = self.formatException(record.exc_info)
+        return json.dumps(log, ensure_ascii=False, default=str)
+
+
+class _LazyQueueHandler(QueueHandler):
+    """ メッセージの組み立て（%引数の展開）を出力スレッドで行うQueueHandler
+    （同じプロセス内のキューのため、レコードをそのまま渡す
+      %引数に渡したオブジェクトは出力されるまで変更しないこと）
+    """
+
+    def prepare(self, record):
+        return record
+
+
+_log_handler = None
+_log_listener = None
+_log_lock = threading.Lock()
+
+
+def configure_logging(stream=None, json_lines=None):
+    """ MyLoggerの出力先を設定し直す（出力はバックグラウンドのスレッドで行う）
+    stream: 出力先（省略時は標準エラー）
+    json_lines: Trueの場合は1行1JSON（省略時は環境変数 LOG_FORMAT=json の場合True）
+    戻り値: MyLoggerが共有するハンドラ
+    """
+    global _log_handler, _log_listener
+    if json_lines is None:
+        json_lines = os.getenv("LOG_FORMAT") == "json"
+    handler = StreamHandler(stream)
+    handler.setFormatter(JsonFormatter() if json_lines
+                         else logging.Formatter(LOG_FORMAT))
+    with _log_lock:
+        if _log_handler is None:
+            _log_handler = _LazyQueueHandler(queue.Queue())
+            atexit.register(flush_logs)  # 終了時に残りのログを出力する
+        if _log_listener is not None:
+            _log_listener.stop()
+        _log_listener = QueueListener(_log_handler.queue, handler)
+        _log_listener.start()
+    return _log_handler
+
+
+def get_log_handler():
+    """ MyLoggerが共有するハンドラ（キューに積むだけ）を返却する """
+    if _log_handler is None:
+        configure_logging()
+    return _log_handler
+
+
+def flush_logs():
+    """ キューに積まれたログを全て出力するまで待つ """
+    with _log_lock:
+        if _log_listener is not None:
+            _log_listener.stop()
+            _log_listener.start()
+
+
 class MyLogger:
-    """ ログの出力表現を集中的に管理する自分専用クラス """
+    """ ログの出力表現を集中的に管理する自分専用クラス
+    ・同じnameで何度作成してもハンドラは1つ（全てのMyLoggerで共有）
+    ・呼び出し元はキューに積むだけで、書式化と出力はバックグラウンドのスレッドで行う
+    ・msgに%形式の引数を渡すと、出力するレベルの場合だけ展開する
+      例) debug("last:%.3f rci:%.1f", last, rci)
+    ・出力するレベルは環境変数 LOG_LEVEL（既定 DEBUG）
+    """
 
     def __init__(self, name):
         """ コンストラクタ """
         # 参考：http://joemphilips.com/post/python_logging/
-        if hasattr(self, "logger"):
-            return
-
         self.logger = getLogger(name)
-        self.logger.setLevel(DEBUG)
-        formatter = logging.Formatter(
-            "%(asctime)s %(name) %(levelname)s %(message)s")
-        sh = StreamHandler()
-        sh.setLevel(DEBUG)
-        sh.setFormatter(formatter)
-        self.logger.addHandler(sh)
-
-    def debug(self, msg):
+        self.logger.setLevel(os.getenv("LOG_LEVEL", "DEBUG").upper())
+        handler = get_log_handler()
+        with _log_lock:
+            if handler not in self.logger.handlers:
+                self.logger.addHandler(handler)
+
+    def debug(self, msg, *args):
         """ DEBUG	10	動作確認などデバッグの記録 """
-        self.logger.debug(msg)
+        self.logger.debug(msg, *args)
 
-    def info(self, msg):
+    def info(self, msg, *args):
         """ INFO	20	正常動作の記録 """
-        self.logger.info(msg)
+        self.logger.info(msg, *args)
 
-    def warning(self, msg):
+    def warning(self, msg, *args):
         """ WARNING	30	ログの定義名 """
-        self.logger.warning(msg)
+        self.logger.warning(msg, *args)
 
-    def error(self, msg):
+    def error(self, msg, *args):
         """ ERROR	40	エラーなど重大な問題 """
-        self.logger.error(msg)
+        self.logger.error(msg, *args)
 
     def exception(self, msg, ex):
         """ Exception   40	例外など重大な問題 """
-        self.logger.exception(msg, ex)
+        self.logger.exception("%s %s", msg, ex)
 
-    def critical(self, msg):
+    def critical(self, msg, *args):
         """ CRITICAL	50	停止など致命的な問題 """
-        self.logger.critical(msg)
+        self.logger.critical(msg, *args)
 
 
 class Line:
     """ Line機能をまとめたクラス """
 
-    def __init__(self):
+    def __init__(self, session=None):
+        """ コンストラクタ
+        session: HTTPセッション（省略時はプロセス内で共有のもの）
+        """
         self.line_notify_token = os.getenv("LINE_NOTIFY_TOKEN")
+        if session is None:
+            session = get_http_session()
+        self.session = session
 
     def check_env(self):
         """ 環境変数のチェック """
@@ -77,6 +165,7 @@ class Line:
         """ LINE通知（messageのみ） """
         return self.notify_line_stamp(message, "", "")
 
+    @timed("Line.notify_line_stamp")
     def notify_line_stamp(self, message, stickerPackageId, stickerId):
         """ LINE通知（スタンプ付き）
         LINEスタンプの種類は下記URL参照
@@ -93,4 +182,177 @@ class Line:
 
         headers = {'Authorization': 'Bearer ' +
                    self.line_notify_token}  # 発行したトークン
-        return requests.post(line_notify_api, data=payload, headers=headers)
+        return self.session.post(line_notify_api, data=payload,
+                                 headers=headers)
+
+
+class LineNotifyQueue:
+    """ LINE通知をキューに積み、バックグラウンドのスレッドで送信するクラス
+    Lineと同じメソッドで呼び出せ、呼び出し元は送信を待たずに戻る。
+    ・digest_sec秒以内に積まれた通知は１つのメッセージにまとめる（ダイジェスト）
+    ・同じ内容の通知は１件にまとめ、件数を付ける
+    ・スタンプが異なる通知は別のメッセージで送る（スタンプ無しの通知は最初のスタンプに付ける）
+    ・送信はLINE Notifyの上限（既定 1000回/時）を超えないように待つ
+    messageには送信時に文字列を返す関数も指定できる（総資産の取得など、
+    時間のかかる処理を送信スレッドで行う場合）。
+    """
+
+    MAX_MESSAGE_LEN = 1000  # LINE Notifyのメッセージの最大文字数
+
+    def __init__(self, line=None, digest_sec=1.0, rate_per_hour=1000,
+                 burst=10):
+        """ コンストラクタ """
+        if line is None:
+            line = Line()
+        self.line = line
+        self.digest_sec = digest_sec
+        self.bucket = TokenBucket(rate_per_hour / 3600.0, burst)
+        self.stats = {"queued": 0, "sent": 0, "coalesced": 0, "failed": 0}
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._closed = False
+        self.myLogger = MyLogger("LineNotifyQueue")
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def notify_line(self, message):
+        """ LINE通知（messageのみ） """
+        self.notify_line_stamp(message, "", "")
+
+    def notify_line_stamp(self, message, stickerPackageId, stickerId):
+        """ LINE通知（スタンプ付き）をキューに積む（close後はRuntimeError） """
+        with self._lock:
+            # close の終了の印より後に積むと送信されずに残るため、ロック内で積む
+            if self._closed:
+                raise RuntimeError("LineNotifyQueue is closed")
+            self.stats["queued"] = self.stats["queued"] + 1
+            self._queue.put((message, stickerPackageId, stickerId))
+
+    def flush(self):
+        """ キューに積んだ通知が全て送信されるまで待つ """
+        self._queue.join()
+
+    def close(self):
+        """ 残りの通知を送信し、送信スレッドを終了する """
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(None)
+        self._thread.join()
+
+    def get_stats(self):
+        """ 積んだ件数、送信回数、まとめた件数、失敗回数、未送信の件数を返却する """
+        with self._lock:
+            stats = dict(self.stats)
+        stats["queue_depth"] = self._queue.qsize()
+        return stats
+
+    def _run(self):
+        closing = False
+        while not closing:
+            item = self._queue.get()
+            if item is None:
+                self._queue.task_done()
+                break
+            batch = [item]
+            deadline = time.time() + self.digest_sec
+            while True:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._queue.task_done()
+                    closing = True
+                    break
+                batch.append(item)
+            try:
+                self._send(batch)
+            finally:
+                for i in range(len(batch)):
+                    self._queue.task_done()
+
+    def _send(self, batch):
+        """ まとめた通知を送信する """
+        counts = OrderedDict()  # key:(メッセージ, スタンプ) value:件数
+        for message, package_id, sticker_id in batch:
+            if callable(message):
+                try:
+                    message = message()
+                except Exception as e:
+                    self._add_stat("failed")
+                    self.myLogger.warning("通知メッセージの作成失敗 {0}".format(e))
+                    continue
+            key = (message, package_id, sticker_id)
+            counts[key] = counts.get(key, 0) + 1
+        self._add_stat("coalesced", len(batch) - len(counts))
+
+        groups = OrderedDict()  # key:スタンプ value:メッセージのlist
+        plain = []  # スタンプ無しのメッセージ
+        for (message, p_id, s_id), count in counts.items():
+            if count > 1:
+                message = "{0}（{1}件）".format(message, count)
+            if p_id != "" and s_id != "":
+                groups.setdefault((p_id, s_id), []).append(message)
+            else:
+                plain.append(message)
+        if not groups:
+            groups[("", "")] = []
+        first = next(iter(groups))
+        groups[first] = plain + groups[first]
+
+        for (package_id, sticker_id), lines in groups.items():
+            for message in self.split_message(lines):
+                self._post(message, package_id, sticker_id)
+
+    def split_message(self, lines):
+        """ 行をMAX_MESSAGE_LEN文字以内のメッセージにまとめる """
+        messages = []
+        current = ""
+        for line in lines:
+            line = line[:self.MAX_MESSAGE_LEN]
+            if current == "":
+                current = line
+            elif len(current) + 1 + len(line) <= self.MAX_MESSAGE_LEN:
+                current = current + "\n" + line
+            else:
+                messages.append(current)
+                current = line
+        if current != "":
+            messages.append(current)
+        return messages
+
+    def _post(self, message, package_id, sticker_id):
+        """ 送信上限を守って１件送信する """
+        wait = self.bucket.get_wait()
+        while wait > 0:
+            time.sleep(wait)
+            wait = self.bucket.get_wait()
+        self.bucket.consume()
+        try:
+            self.line.notify_line_stamp(message, package_id, sticker_id)
+            self._add_stat("sent")
+        except Exception as e:
+            self._add_stat("failed")
+            self.myLogger.warning("LINE通知失敗 {0}".format(e))
+
+    def _add_stat(self, name, count=1):
+        with self._lock:
+            self.stats[name] = self.stats[name] + count
+
+
+_line_queue = None
+_line_queue_lock = threading.Lock()
+
+
+def get_line_notify_queue():
+    """ プロセス内で共有するLineNotifyQueueを返却する """
+    global _line_queue
+    with _line_queue_lock:
+        if _line_queue is None:
+            _line_queue = LineNotifyQueue()
+        return _line_queue
@@ -1,10 +1,13 @@
+import os
 import time
 from datetime import datetime, timedelta
 
 import pandas as pd
-import pandas_datareader.data as web
 
 import technicalAnalysis
+from myUtil import get_line_notify_queue
+from stockHistory import HistoryFetcher, get_history_source
+from stockScreener import PanelScreener
 
 NY_DOW_SYMBOLS = {"AAPL", "AXP", "BA", "CAT", "CSCO",
                   "CVX", "DIS", "DWDP", "GS", "HD",
@@ -74,6 +77,18 @@ TARGET_SYMBOLS = NY_DOW_SP_SYMBOLS
 
 class Rakuten():
 
+    def __init__(self, line=None, screener=None):
+        """ コンストラクタ
+        line: LINE通知のキュー（省略時はプロセス内で共有のもの）
+        screener: 銘柄を選ぶ条件（省略時は RSI 20 % 以下）
+        """
+        if line is None:
+            line = get_line_notify_queue()
+        self.line = line
+        if screener is None:
+            screener = PanelScreener(rsi_threshold=20.0)
+        self.screener = screener
+
     def get_rakuten_stocks(self):
         """
         楽天信託で取り扱っている株式情報（取扱が"○"）を
@@ -107,10 +122,20 @@ class Rakuten():
 
         return CSV_FILE_PATH
 
-    def notify_rsi_under_20(self, symbol, candle):
-        # TODO RSI/RSCを計算する
-        # RSI が 20 % 以下の場合にLINE通知する
-        pass
+    def notify_rsi_under_20(self, candles):
+        """ RSI が 20 % 以下の銘柄をLINE通知する
+        candles: {銘柄: 日足のDataFrame}
+        全銘柄の終値を1つの配列にそろえ、RSI/RCI/MACDをまとめて計算する。
+        戻り値: 通知した銘柄の指標のDataFrame（PanelScreener.screen）
+        """
+        result = self.screener.screen(candles)
+        msg_rxi = "【{0} 買い時】RSI= {1:.1f} ％ RCI= {2:.1f} ％ MACD= {3:.3f}{4}"
+        for symbol, row in result.iterrows():
+            msg = msg_rxi.format(symbol, row["rsi"], row["rci"], row["macd"],
+                                 " GC" if row["golden_cross"] else "")
+            self.line.notify_line(msg)
+            print(msg)
+        return result
 
 
 # main
@@ -120,12 +145,16 @@ if __name__ == '__main__':
 
     symbols = set(df["現地コード"]) & TARGET_SYMBOLS
 
-    for symbol in TARGET_SYMBOLS:
-        try:
-            df_rakuten_candle = web.DataReader(
-                symbol, 'morningstar', start, end)
-            r.notify_rsi_under_20(symbol, df_rakuten_candle)
-        except ValueError as ve:
-            msg = "\[{}\] is \[{}\]".format(symbol, ve)
-            print(msg)
-        print(df_rakuten_candle)
+    # 全銘柄の日足を並列に取得する（取得済みの日はキャッシュを使う）
+    fetcher = HistoryFetcher(
+        get_history_source(),
+        cache_dir=os.getenv("STOCK_CACHE_DIR", "./cache/stocks"),
+        max_workers=int(os.getenv("STOCK_MAX_WORKERS", "8")))
+    candles, errors = fetcher.fetch_all(TARGET_SYMBOLS, start, end)
+    for symbol, e in sorted(errors.items()):
+        msg = "[{}] is [{}]".format(symbol, e)
+        print(msg)
+
+    r.notify_rsi_under_20(candles)
+    print(fetcher.get_stats())
+    r.line.close()  # 未送信の通知を送信してから終了する
@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+
+import os
+import random
+import shutil
+import tempfile
+import itertools
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from backtest import Backtester, calc_indicators
+from strategyParams import StrategyParams
+
+# ワーカープロセスで共有するロウソク足（メモリマップ）と指標のキャッシュ
+_worker_paths = None
+_worker_times = None
+_worker_closes = None
+_worker_indicators = OrderedDict()  # key:指標の期間 value:calc_indicatorsの結果
+WORKER_INDICATOR_CACHE_SIZE = 4
+
+
+def _load_worker_data(times_path, closes_path):
+    """ ワーカープロセスで最初の1回だけロウソク足を読み込む
+    配列はpickleせずメモリマップで読み込む。
+    （ProcessPoolExecutorのinitializerはPython 3.7以降のため使わない）
+    """
+    global _worker_paths, _worker_times, _worker_closes
+    if _worker_paths == (times_path, closes_path):
+        return
+    _worker_times = np.load(times_path, mmap_mode="r")
+    _worker_closes = np.load(closes_path, mmap_mode="r")
+    _worker_indicators.clear()
+    _worker_paths = (times_path, closes_path)
+
+
+def _get_worker_indicators(params):
+    """ 指標の期間が同じパラメータでは指標を再計算しない """
+    key = params.get_indicator_spans()
+    indicators = _worker_indicators.get(key)
+    if indicators is None:
+        indicators = calc_indicators(_worker_closes, params)
+        _worker_indicators[key] = indicators
+        if len(_worker_indicators) > WORKER_INDICATOR_CACHE_SIZE:
+            _worker_indicators.popitem(last=False)
+    else:
+        _worker_indicators.move_to_end(key)
+    return indicators
+
+
+def _evaluate(param_dict, backtester_kwargs, times_path, closes_path):
+    """ 1つのパラメータでバックテストし、パラメータと結果のdictを返却する """
+    _load_worker_data(times_path, closes_path)
+    params = StrategyParams.from_dict(param_dict)
+    backtester = Backtester(params, **backtester_kwargs)
+    result = backtester.run(_worker_times, _worker_closes,
+                            _get_worker_indicators(params))
+    row = dict(param_dict)
+    row.update(result.summary())
+    return row
+
+
+class Optimizer:
+    """ AutoTraderのパラメータをグリッドサーチ/ランダムサーチで最適化するクラス
+    バックテストはプロセスプールで全コアを使って並列に実行する。
+    ロウソク足は一時ファイル（.npy）に保存し、各ワーカーはメモリマップで参照する。
+    """
+
+    def __init__(self, times, closes, workers=None, base_params=None,
+                 **backtester_kwargs):
+        """ コンストラクタ
+        workers: プロセス数（省略時はCPUコア数）
+        base_params: 探索しない項目の値（StrategyParams）
+        backtester_kwargs: Backtesterの引数（amount, fee_rate, use_stop_loss）
+        """
+        self.times = np.ascontiguousarray(times, dtype="int64")
+        self.closes = np.ascontiguousarray(closes, dtype=float)
+        self.workers = workers or os.cpu_count()
+        if base_params is None:
+            base_params = StrategyParams()
+        self.base_params = base_params
+        self.backtester_kwargs = backtester_kwargs
+        self.results = None
+
+    def make_grid(self, grid):
+        """ {項目名: 値のlist} の全組合せのパラメータのlistを返却する """
+        names = sorted(grid)
+        params_list = []
+        for values in itertools.product(*[grid[name] for name in names]):
+            param_dict = self.base_params.to_dict()
+            param_dict.update(zip(names, values))
+            params_list.append(StrategyParams.from_dict(param_dict))
+        return params_list
+
+    def make_random(self, space, n_iter, seed=None):
+        """ {項目名: 値のlist または (最小, 最大)} からn_iter個のパラメータをランダムに作成する """
+        rs = random.Random(seed)
+        params_list = []
+        for i in range(n_iter):
+            param_dict = self.base_params.to_dict()
+            for name, values in space.items():
+                if isinstance(values, tuple):
+                    low, high = values
+                    if isinstance(low, int) and isinstance(high, int):
+                        param_dict[name] = rs.randint(low, high)
+                    else:
+                        param_dict[name] = rs.uniform(low, high)
+                else:
+                    param_dict[name] = rs.choice(values)
+            params_list.append(StrategyParams.from_dict(param_dict))
+        return params_list
+
+    def evaluate(self, params_list):
+        """ パラメータのlistを並列にバックテストし、損益・シャープレシオ順の結果を返却する """
+        # 指標の期間が同じものを同じワーカーでまとめて処理するよう並べ替える
+        params_list = sorted(params_list,
+                             key=lambda p: p.get_indicator_spans())
+        param_dicts = [params.to_dict() for params in params_list]
+        chunksize = max(1, len(param_dicts) // (self.workers * 4))
+
+        tmp_dir = tempfile.mkdtemp(prefix="optimizer_")
+        try:
+            times_path = os.path.join(tmp_dir, "times.npy")
+            closes_path = os.path.join(tmp_dir, "closes.npy")
+            np.save(times_path, self.times)
+            np.save(closes_path, self.closes)
+
+            with ProcessPoolExecutor(max_workers=self.workers) as executor:
+                rows = list(executor.map(
+                    _evaluate, param_dicts,
+                    itertools.repeat(self.backtester_kwargs),
+                    itertools.repeat(times_path),
+                    itertools.repeat(closes_path),
+                    chunksize=chunksize))
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+        df = pd.DataFrame(rows)
+        df = df.sort_values(["pnl", "sharpe"], ascending=False)
+        self.results = df.reset_index(drop=True)
+        return self.results
+
+    def grid_search(self, grid):
+        """ グリッドサーチ """
+        return self.evaluate(self.make_grid(grid))
+
+    def random_search(self, space, n_iter, seed=None):
+        """ ランダムサーチ """
+        return self.evaluate(self.make_random(space, n_iter, seed))
+
+    def get_best_params(self, rank=0):
+        """ 結果の上位rank番目のパラメータを返却する """
+        if self.results is None or len(self.results) <= rank:
+            raise ValueError(
+                "no results. run grid_search or random_search first")
+        param_dict = {}
+        for name in StrategyParams.DEFAULTS:
+            value = self.results[name].iloc[rank]
+            if hasattr(value, "item"):
+                value = value.item()
+            param_dict[name] = value
+        return StrategyParams.from_dict(param_dict)
+
+
+# main
+if __name__ == '__main__':
+    import sys
+    from technicalAnalysis import MyTechnicalAnalysisUtil
+
+    s_yyyymmdd, e_yyyymmdd = sys.argv[1], sys.argv[2]
+    output_path = sys.argv[3] if len(sys.argv) > 3 else "strategy_params.json"
+    records = MyTechnicalAnalysisUtil().get_candle_records(
+        "1min", s_yyyymmdd, e_yyyymmdd)
+
+    optimizer = Optimizer(records["time"], records["close"])
+    results = optimizer.grid_search({"benefit": [0.05, 0.097, 0.15, 0.2],
+                                     "sell_order_range": [0.03, 0.07, 0.1],
+                                     "ema_diff_threshold": [0.05, 0.1, 0.2],
+                                     "rci_threshold": [80, 90, 95],
+                                     "macd_short": [9, 12],
+                                     "macd_long": [26, 30]})
+    print(results.head(20))
+    optimizer.get_best_params().save(output_path)
+    print("saved: {0}".format(output_path))
@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+
+import time
+import threading
+from concurrent.futures import Future
+
+from myUtil import MyLogger
+from latencyMonitor import timed
+
+# これ以上状態が変わらない注文のステータス
+FINAL_STATUSES = ("FULLY_FILLED", "CANCELED_UNFILLED",
+                  "CANCELED_PARTIALLY_FILLED")
+
+
+class OrderTracker:
+    """ 発注済みの注文を全ペアまとめて追跡するクラス
+    ・ペアごとに未完了の注文IDをまとめて１リクエスト（orders_info）で確認する
+    ・状態に変化が無く、価格が注文価格から離れている間は確認間隔を延ばし、
+      約定が進んだ場合や価格が注文価格に近づいた場合は最短間隔に戻す
+    ・注文が完了（約定・取消）するとtrackが返したFutureに注文情報を設定する
+    """
+
+    def __init__(self, prvApi, get_last=None, min_interval_sec=0.1,
+                 max_interval_sec=2.0, backoff=1.5, near_ratio=0.002,
+                 on_complete=None):
+        """ コンストラクタ
+        prvApi: get_orders_info(pair, order_ids) を持つPrivate APIクライアント
+        get_last: get_last(pair) で現在価格を返す関数（省略時は常に最短間隔）
+        near_ratio: 現在価格と注文価格の差がこの割合以下なら「近い」とみなす
+        on_complete: 追跡した注文が完了するたびに on_complete(注文情報) を呼び出す
+        """
+        self.prvApi = prvApi
+        self.get_last = get_last
+        self.min_interval_sec = min_interval_sec
+        self.max_interval_sec = max_interval_sec
+        self.backoff = backoff
+        self.near_ratio = near_ratio
+        self.on_complete = on_complete
+        self.stats = {"requests": 0, "errors": 0, "completed": 0}
+        self._pairs = {}  # key:ペア value:{"orders", "interval", "due"}
+        self._cond = threading.Condition()
+        self._thread = None
+        self.myLogger = MyLogger("OrderTracker")
+
+    def track(self, order_value, callback=None):
+        """ 注文（orderの戻り値）の追跡を開始し、完了時の注文情報のFutureを返却する
+        callback: 完了時に callback(注文情報) を呼び出す
+        """
+        pair = order_value["pair"]
+        order_id = order_value["order_id"]
+        with self._cond:
+            state = self._pairs.setdefault(
+                pair, {"orders": {}, "interval": self.min_interval_sec,
+                       "due": time.time()})
+            if order_id in state["orders"]:
+                future = state["orders"][order_id]["future"]
+            else:
+                future = Future()
+                state["orders"][order_id] = {"future": future, "last": None}
+                state["interval"] = self.min_interval_sec
+                state["due"] = min(state["due"],
+                                   time.time() + self.min_interval_sec)
+            self._start()
+            self._cond.notify_all()
+        if callback is not None:
+            future.add_done_callback(lambda f: callback(f.result()))
+        return future
+
+    def wait(self, order_value, timeout=None):
+        """ 注文が完了するまで待ち、注文情報を返却する """
+        return self.track(order_value).result(timeout)
+
+    def untrack(self, order_value):
+        """ 注文の追跡をやめる（trackが返したFutureは取消す） """
+        with self._cond:
+            state = self._pairs.get(order_value["pair"])
+            if state is None:
+                return
+            entry = state["orders"].pop(order_value["order_id"], None)
+        if entry is not None:
+            entry["future"].cancel()
+
+    def get_pending_count(self):
+        """ 追跡中の注文数 """
+        with self._cond:
+            return sum(len(state["orders"]) for state in self._pairs.values())
+
+    def get_stats(self):
+        """ リクエスト数、エラー数、完了数、ペアごとの確認間隔を返却する """
+        with self._cond:
+            stats = dict(self.stats)
+            stats["intervals"] = {pair: state["interval"]
+                                  for pair, state in self._pairs.items()}
+        return stats
+
+    def _start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                pairs = self._get_due_pairs()
+                while not pairs:
+                    self._cond.wait(self._get_wait())
+                    pairs = self._get_due_pairs()
+            for pair in pairs:
+                try:
+                    self.poll_pair(pair)
+                except Exception as e:
+                    # 確認中の注文を待っている呼び出し元に例外を返し、追跡は続ける
+                    self.myLogger.exception(
+                        "注文状態の確認処理で例外({0})".format(pair), e)
+                    self._fail_pair(pair, e)
+
+    def _fail_pair(self, pair, exception):
+        """ ペアの追跡中の注文を全て例外で完了させる """
+        with self._cond:
+            state = self._pairs[pair]
+            entries = list(state["orders"].values())
+            state["orders"].clear()
+            self.stats["errors"] = self.stats["errors"] + 1
+        for entry in entries:
+            entry["future"].set_exception(exception)
+
+    def _get_due_pairs(self):
+        now = time.time()
+        return [pair for pair, state in self._pairs.items()
+                if state["orders"] and state["due"] <= now]
+
+    def _get_wait(self):
+        dues = [state["due"] for state in self._pairs.values()
+                if state["orders"]]
+        if not dues:
+            return None  # 追跡する注文が追加されるまで待つ
+        return max(0.0, min(dues) - time.time())
+
+    @timed("OrderTracker.poll_pair")
+    def poll_pair(self, pair):
+        """ ペアの未完了の注文をまとめて確認する """
+        with self._cond:
+            state = self._pairs[pair]
+            order_ids = list(state["orders"])
+        if not order_ids:
+            return
+
+        try:
+            orders = self.prvApi.get_orders_info(pair, order_ids)["orders"]
+        except Exception as e:
+            self.myLogger.warning("注文状態の確認失敗({0}) {1}".format(pair, e))
+            with self._cond:
+                self.stats["requests"] = self.stats["requests"] + 1
+                self.stats["errors"] = self.stats["errors"] + 1
+                self._schedule(state, False)
+            return
+
+        near = self.is_near(pair, orders)
+        completed = []
+        failed = []
+        with self._cond:
+            self.stats["requests"] = self.stats["requests"] + 1
+            changed = False
+            for order in orders:
+                entry = state["orders"].get(order.get("order_id"))
+                if entry is None:
+                    continue
+                try:
+                    progress = (order["status"], order["executed_amount"])
+                except KeyError as e:
+                    # 不正な注文情報は追跡をやめて呼び出し元に例外を返す
+                    del state["orders"][order["order_id"]]
+                    failed.append((entry["future"], e))
+                    continue
+                if entry["last"] != progress:
+                    changed = True
+                    entry["last"] = progress
+                if order["status"] in FINAL_STATUSES:
+                    del state["orders"][order["order_id"]]
+                    completed.append((entry["future"], order))
+                    self.stats["completed"] = self.stats["completed"] + 1
+            self._schedule(state, changed or near)
+
+        # コールバックはロックの外で呼び出す
+        for future, order in completed:
+            if self.on_complete is not None:
+                try:
+                    self.on_complete(order)
+                except Exception as e:
+                    self.myLogger.exception("注文完了時の処理で例外", e)
+            future.set_result(order)
+        for future, e in failed:
+            future.set_exception(e)
+
+    def _schedule(self, state, fast):
+        """ 次の確認時刻を決める """
+        if fast:
+            state["interval"] = self.min_interval_sec
+        else:
+            state["interval"] = min(state["interval"] * self.backoff,
+                                    self.max_interval_sec)
+        state["due"] = time.time() + state["interval"]
+
+    def is_near(self, pair, orders):
+        """ 現在価格がいずれかの注文価格に近いか判定する（成行注文は常に近い） """
+        if self.get_last is None:
+            return True
+        prices = []
+        for order in orders:
+            if order["status"] in FINAL_STATUSES:
+                continue
+            if order.get("price") is None or order.get("type") == "market":
+                return True
+            prices.append(float(order["price"]))
+        if not prices:
+            return False
+        try:
+            last = float(self.get_last(pair))
+        except Exception:
+            return False
+        return any(abs(last - price) <= price * self.near_ratio
+                   for price in prices)
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+
+import os
+import time
+import random
+
+from mockExchange import MatchingEngine
+
+
+class PaperPrivateApi(MatchingEngine):
+    """ BitbankPrivateと同じメソッドで、注文を送らずに約定を模擬するクラス（ペーパートレード）
+    価格は実際（または模擬取引所で再生した）のティッカーを使い、
+    発注から latency_sec + 0〜jitter_sec秒（乱数）後に約定させる。
+    """
+
+    def __init__(self, get_quote, assets=None, slippage=0.0, latency_sec=0.0,
+                 jitter_sec=0.0, seed=None, clock=time.time):
+        """ コンストラクタ
+        get_quote: get_quote(pair) で (現在値, 売り注文の最安値, 買い注文の最高値)
+                   を返す関数（Bitbank.get_ticker_value）
+        slippage: 成行注文の約定価格を売り・買いから不利な方向にずらす割合
+        """
+        self.latency_sec = latency_sec
+        self.jitter_sec = jitter_sec
+        self.random = random.Random(seed)
+        super().__init__(get_quote, assets, slippage, self.get_latency, clock)
+
+    @classmethod
+    def from_env(cls, get_quote):
+        """ 環境変数の設定で作成する
+        PAPER_JPY: 初期資産（円） PAPER_SLIPPAGE: スリッページ（割合）
+        PAPER_LATENCY_SEC, PAPER_JITTER_SEC: 発注から約定までの遅延（秒）
+        """
+        return cls(get_quote,
+                   {"jpy": float(os.getenv("PAPER_JPY", "100000"))},
+                   float(os.getenv("PAPER_SLIPPAGE", "0")),
+                   float(os.getenv("PAPER_LATENCY_SEC", "0.1")),
+                   float(os.getenv("PAPER_JITTER_SEC", "0.1")))
+
+    def get_latency(self):
+        """ 発注から約定できるまでの秒数 """
+        return self.latency_sec + self.random.random() * self.jitter_sec
+
+    def get_asset(self):
+        """ 資産を取得 """
+        return self.get_assets()
@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+
+import time
+import heapq
+import itertools
+import threading
+
+from latencyMonitor import get_latency_monitor
+from metricsServer import get_metrics
+
+# 優先度（小さいほど先に処理する）
+PRIORITY_HIGH = 0     # 注文・注文状況の確認・ティッカー
+PRIORITY_NORMAL = 1
+PRIORITY_LOW = 2      # ロウソク足・資産の取得
+
+# エンドポイント種別ごとの上限 (1秒あたりのリクエスト数, バースト数)
+DEFAULT_LIMITS = {"public": (10.0, 10),
+                  "private_query": (10.0, 10),
+                  "private_update": (6.0, 6)}
+
+# python_bitbankcc のメソッド → (エンドポイント種別, 優先度)
+PUBLIC_ROUTES = {"get_ticker": ("public", PRIORITY_HIGH),
+                 "get_tickers": ("public", PRIORITY_HIGH),
+                 "get_depth": ("public", PRIORITY_HIGH),
+                 "get_transactions": ("public", PRIORITY_NORMAL),
+                 "get_candlestick": ("public", PRIORITY_LOW)}
+PRIVATE_ROUTES = {"order": ("private_update", PRIORITY_HIGH),
+                  "cancel_order": ("private_update", PRIORITY_HIGH),
+                  "cancel_orders": ("private_update", PRIORITY_HIGH),
+                  "get_order": ("private_query", PRIORITY_HIGH),
+                  "get_orders_info": ("private_query", PRIORITY_HIGH),
+                  "get_active_orders": ("private_query", PRIORITY_HIGH),
+                  "get_asset": ("private_query", PRIORITY_LOW)}
+
+
+class TokenBucket:
+    """ トークンバケット（rate個/秒で補充、最大capacity個） """
+
+    def __init__(self, rate, capacity, clock=time.monotonic):
+        """ コンストラクタ """
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.clock = clock
+        self.tokens = float(capacity)
+        self.updated = clock()
+
+    def refill(self):
+        """ 経過時間分のトークンを補充する """
+        now = self.clock()
+        self.tokens = min(self.capacity,
+                          self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def get_wait(self):
+        """ トークンを1つ取得できるまでの秒数（0なら即取得可） """
+        self.refill()
+        if self.tokens >= 1.0:
+            return 0.0
+        return (1.0 - self.tokens) / self.rate
+
+    def consume(self):
+        """ トークンを1つ消費する """
+        self.tokens = self.tokens - 1.0
+
+
+class RequestScheduler:
+    """ bitbank APIへのリクエストをエンドポイント種別ごとのトークンバケットで
+    流量制限するクラス。待ちが発生した場合は優先度順（同じ優先度は到着順）に処理する。
+    プロセス内の全クライアントで共有する（get_request_scheduler）。
+    """
+
+    def __init__(self, limits=None, clock=time.monotonic):
+        """ コンストラクタ
+        limits: {エンドポイント種別: (1秒あたりのリクエスト数, バースト数)}
+        """
+        self.limits = dict(DEFAULT_LIMITS)
+        if limits is not None:
+            self.limits.update(limits)
+        self.clock = clock
+        self._cond = threading.Condition()
+        self._seq = itertools.count()
+        self._buckets = {}
+        self._queues = {}
+        self._stats = {}
+        for endpoint, (rate, capacity) in self.limits.items():
+            self._buckets[endpoint] = TokenBucket(rate, capacity, clock)
+            self._queues[endpoint] = []
+            self._stats[endpoint] = {"requests": 0, "max_queue_depth": 0,
+                                     "wait_total": 0.0, "wait_max": 0.0}
+
+    def acquire(self, endpoint, priority=PRIORITY_NORMAL):
+        """ リクエストしてよくなるまで待つ 戻り値：待った秒数 """
+        queue = self._queues[endpoint]
+        bucket = self._buckets[endpoint]
+        stats = self._stats[endpoint]
+        entry = (priority, next(self._seq))
+        start = self.clock()
+        with self._cond:
+            heapq.heappush(queue, entry)
+            stats["max_queue_depth"] = max(stats["max_queue_depth"],
+                                           len(queue))
+            self._cond.notify_all()  # 先頭が入れ替わった可能性がある
+            while True:
+                if queue[0] == entry:
+                    wait = bucket.get_wait()
+                    if wait <= 0.0:
+                        bucket.consume()
+                        heapq.heappop(queue)
+                        self._cond.notify_all()
+                        break
+                    self._cond.wait(wait)
+                else:
+                    self._cond.wait()
+
+            waited = self.clock() - start
+            stats["requests"] = stats["requests"] + 1
+            stats["wait_total"] = stats["wait_total"] + waited
+            stats["wait_max"] = max(stats["wait_max"], waited)
+        return waited
+
+    def call(self, endpoint, priority, func, *args, **kwargs):
+        """ 流量制限してfuncを呼び出す """
+        self.acquire(endpoint, priority)
+        return func(*args, **kwargs)
+
+    def wrap(self, api, routes, default_route=("public", PRIORITY_NORMAL)):
+        """ apiのメソッド呼び出しを流量制限するプロキシを返却する """
+        return ScheduledApi(api, self, routes, default_route)
+
+    def wrap_public(self, pubApi):
+        """ python_bitbankcc.public をラップする """
+        return self.wrap(pubApi, PUBLIC_ROUTES, ("public", PRIORITY_NORMAL))
+
+    def wrap_private(self, prvApi):
+        """ python_bitbankcc.private をラップする """
+        return self.wrap(prvApi, PRIVATE_ROUTES,
+                         ("private_query", PRIORITY_NORMAL))
+
+    def get_stats(self):
+        """ エンドポイント種別ごとの待ち行列の長さ・待ち時間を返却する """
+        with self._cond:
+            result = {}
+            for endpoint, stats in self._stats.items():
+                requests = stats["requests"]
+                wait_avg = 0.0
+                if requests > 0:
+                    wait_avg = stats["wait_total"] / requests
+                result[endpoint] = {
+                    "queue_depth": len(self._queues[endpoint]),
+                    "max_queue_depth": stats["max_queue_depth"],
+                    "requests": requests,
+                    "wait_avg": wait_avg,
+                    "wait_max": stats["wait_max"]}
+            return result
+
+
+class ScheduledApi:
+    """ メソッド呼び出しをRequestScheduler経由にするプロキシ """
+
+    def __init__(self, api, scheduler, routes, default_route):
+        """ コンストラクタ """
+        self.api = api
+        self.scheduler = scheduler
+        self.routes = routes
+        self.default_route = default_route
+
+    def __getattr__(self, name):
+        attr = getattr(self.api, name)
+        if not callable(attr):
+            return attr
+        endpoint, priority = self.routes.get(name, self.default_route)
+
+        def measured(*args, **kwargs):
+            # 流量制限の待ちを除いたリクエストの時間とエラー数を記録する
+            try:
+                with get_latency_monitor().span("api." + name):
+                    return attr(*args, **kwargs)
+            except Exception:
+                get_metrics().inc("api_errors", {"method": name})
+                raise
+
+        def scheduled(*args, **kwargs):
+            return self.scheduler.call(endpoint, priority, measured,
+                                       *args, **kwargs)
+        return scheduled
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_request_scheduler():
+    """ プロセス内で共有するRequestSchedulerを返却する """
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = RequestScheduler()
+        return _scheduler
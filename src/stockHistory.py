@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import time
+import threading
+from datetime import timedelta
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from requestScheduler import TokenBucket
+
+
+def to_day(value):
+    """ 日付・日時を時刻なしのTimestampにする """
+    return pd.Timestamp(value).normalize()
+
+
+class DataReaderSource:
+    """ pandas_datareader から日足を取得するデータソース """
+
+    def __init__(self, data_source="morningstar", rate_per_sec=2.0,
+                 capacity=4):
+        """ コンストラクタ
+        data_source: web.DataReader のデータソース名
+        rate_per_sec, capacity: 1秒あたりのリクエスト数とバースト数の上限
+        """
+        self.name = data_source
+        self.rate_per_sec = rate_per_sec
+        self.capacity = capacity
+
+    def fetch(self, symbol, start, end):
+        """ start〜end（日付）の日足のDataFrame（index:日付）を返却する """
+        # 使わない環境（ローカルのデータソース）では不要なため、ここでimportする
+        import pandas_datareader.data as web
+        df = web.DataReader(symbol, self.name, start, end)
+        if isinstance(df.index, pd.MultiIndex):
+            # (銘柄, 日付) のindexで返すデータソースがある
+            df = df.reset_index(level=0, drop=True)
+        return df
+
+
+class LocalCsvSource:
+    """ <directory>/<銘柄>.csv（1列目が日付）から日足を読み込むデータソース
+    （テストやオフラインでの確認で DataReaderSource の代わりに使う）
+    """
+
+    def __init__(self, directory, rate_per_sec=None, capacity=1):
+        """ コンストラクタ（rate_per_secがNoneの場合は流量制限しない） """
+        self.name = "local"
+        self.directory = directory
+        self.rate_per_sec = rate_per_sec
+        self.capacity = capacity
+
+    def fetch(self, symbol, start, end):
+        """ start〜end（日付）の日足のDataFrame（index:日付）を返却する """
+        path = os.path.join(self.directory, "{0}.csv".format(symbol))
+        if not os.path.exists(path):
+            raise ValueError("{0} not found".format(symbol))
+        df = pd.read_csv(path, index_col=0, parse_dates=True)
+        return df.loc[to_day(start):to_day(end)]
+
+
+def get_history_source():
+    """ 環境変数で選んだデータソースを返却する
+    STOCK_SOURCE_DIR: 指定した場合はディレクトリのCSV（LocalCsvSource）
+    STOCK_DATA_SOURCE: web.DataReader のデータソース名（既定 morningstar）
+    STOCK_RATE_PER_SEC: 1秒あたりのリクエスト数の上限（既定 2）
+    """
+    directory = os.getenv("STOCK_SOURCE_DIR")
+    if directory is not None:
+        return LocalCsvSource(directory)
+    return DataReaderSource(os.getenv("STOCK_DATA_SOURCE", "morningstar"),
+                            float(os.getenv("STOCK_RATE_PER_SEC", "2")))
+
+
+class HistoryCache:
+    """ 取得した日足を <directory>/<データソース>/<銘柄>.csv に保存するキャッシュ
+    取得済みの期間（開始日〜終了日）は <銘柄>.json に保存する
+    （休場日は行が無いため、行の日付ではなく取得した期間で判断する
+      終了日は取得できた最新の日足の日とし、まだ無い日は次回に取得し直す）
+    """
+
+    def __init__(self, directory):
+        """ コンストラクタ """
+        self.directory = directory
+
+    def get_path(self, source_name, symbol, ext):
+        return os.path.join(self.directory, source_name,
+                            "{0}.{1}".format(symbol, ext))
+
+    def load(self, source_name, symbol):
+        """ (日足のDataFrame, 取得済みの開始日, 終了日) を返却する
+        保存していない場合は (None, None, None)
+        """
+        meta_path = self.get_path(source_name, symbol, "json")
+        csv_path = self.get_path(source_name, symbol, "csv")
+        if not (os.path.exists(meta_path) and os.path.exists(csv_path)):
+            return None, None, None
+        with open(meta_path) as f:
+            meta = json.load(f)
+        df = pd.read_csv(csv_path, index_col=0, parse_dates=True)
+        return df, to_day(meta["start"]), to_day(meta["end"])
+
+    def save(self, source_name, symbol, df, start, end):
+        """ 日足と取得済みの期間を保存する """
+        csv_path = self.get_path(source_name, symbol, "csv")
+        os.makedirs(os.path.dirname(csv_path), exist_ok=True)
+        df.to_csv(csv_path)
+        with open(self.get_path(source_name, symbol, "json"), "w") as f:
+            json.dump({"start": to_day(start).strftime("%Y-%m-%d"),
+                       "end": to_day(end).strftime("%Y-%m-%d")}, f)
+
+
+class HistoryFetcher:
+    """ 複数銘柄の日足を並列に取得するクラス
+    ・同時に取得する銘柄数は max_workers まで
+    ・データソースごとに rate_per_sec（1秒あたりのリクエスト数）を守る
+    ・cache_dir を指定した場合は保存した日足を使い、足りない直近の日だけ取得する
+    """
+
+    def __init__(self, source, cache_dir=None, max_workers=8,
+                 clock=time.monotonic):
+        """ コンストラクタ """
+        self.source = source
+        self.cache = None if cache_dir is None else HistoryCache(cache_dir)
+        self.max_workers = max_workers
+        self.clock = clock
+        self._buckets = {}  # key:データソース名 value:TokenBucket
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "cache_hits": 0, "errors": 0}
+
+    def _acquire(self, source):
+        """ データソースの流量制限を守ってリクエストしてよくなるまで待つ """
+        if source.rate_per_sec is None:
+            return
+        while True:
+            with self._lock:
+                bucket = self._buckets.get(source.name)
+                if bucket is None:
+                    bucket = TokenBucket(source.rate_per_sec, source.capacity,
+                                         self.clock)
+                    self._buckets[source.name] = bucket
+                wait = bucket.get_wait()
+                if wait <= 0:
+                    bucket.consume()
+                    return
+            time.sleep(wait)
+
+    def _fetch_source(self, symbol, start, end):
+        self._acquire(self.source)
+        with self._lock:
+            self.stats["requests"] = self.stats["requests"] + 1
+        return self.source.fetch(symbol, start, end)
+
+    @staticmethod
+    def get_covered_end(df, end):
+        """ 取得済みとする終了日（endと最新の日足の日の早い方 日足が無い場合はNone）
+        取引時間前やデータソースの遅れで、まだ無い日を取得済みにしない
+        """
+        if len(df) == 0:
+            return None
+        return min(end, to_day(df.index.max()))
+
+    def fetch(self, symbol, start, end):
+        """ 1銘柄の start〜end（日付）の日足のDataFrame（index:日付）を返却する """
+        start, end = to_day(start), to_day(end)
+        if self.cache is None:
+            return self._fetch_source(symbol, start, end)
+
+        name = self.source.name
+        cached, cached_start, cached_end = self.cache.load(name, symbol)
+        if cached is None or start < cached_start:
+            df = self._fetch_source(symbol, start, end)
+            covered_end = self.get_covered_end(df, end)
+            if covered_end is not None:
+                self.cache.save(name, symbol, df, start, covered_end)
+            return df
+        if end > cached_end:
+            # 保存済みの翌日から終了日までだけ取得する
+            new = self._fetch_source(symbol, cached_end + timedelta(days=1),
+                                     end)
+            covered_end = self.get_covered_end(new, end)
+            if covered_end is not None:
+                cached = pd.concat([cached, new])
+                cached = cached[~cached.index.duplicated(keep="last")]
+                self.cache.save(name, symbol, cached, cached_start,
+                                max(cached_end, covered_end))
+        else:
+            with self._lock:
+                self.stats["cache_hits"] = self.stats["cache_hits"] + 1
+        return cached.loc[start:end]
+
+    def fetch_all(self, symbols, start, end):
+        """ 全銘柄の日足を並列に取得する
+        戻り値: ({銘柄: DataFrame}, {銘柄: 取得できなかった例外})
+        """
+        results = {}
+        errors = {}
+        symbols = sorted(symbols)
+        executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        try:
+            futures = [(symbol, executor.submit(self.fetch, symbol, start,
+                                                end))
+                       for symbol in symbols]
+            for symbol, future in futures:
+                try:
+                    results[symbol] = future.result()
+                except Exception as e:
+                    errors[symbol] = e
+        finally:
+            executor.shutdown(wait=True)
+        with self._lock:
+            self.stats["errors"] = self.stats["errors"] + len(errors)
+        return results, errors
+
+    def get_stats(self):
+        """ データソースへのリクエスト数、キャッシュだけで返した数、エラー数を返却する """
+        with self._lock:
+            return dict(self.stats)
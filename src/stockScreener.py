@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pandas as pd
+
+from myUtil import MyLogger
+from indicatorSeries import rolling_rci, rolling_rsi, rolling_macd
+
+
+def align_closes(candles, column="Close"):
+    """ {銘柄: 日足のDataFrame} の終値を日付でそろえる
+    戻り値: (銘柄のlist, 日付のindex, 終値 shape (銘柄数, 日数))
+    途中の取引が無い日は前日の終値で埋め、最初の日足より前と
+    最後の日足より後はNaNのままにする。
+    """
+    symbols = sorted(candles)
+    if not symbols:
+        return [], pd.DatetimeIndex([]), np.empty((0, 0))
+    frame = pd.concat([candles[symbol][column].rename(symbol)
+                       for symbol in symbols], axis=1).sort_index()
+    # 途中の欠けがあると diff() の前後でRSIが窓の期間NaNになる
+    frame = frame.ffill().where(frame.bfill().notna())
+    return symbols, frame.index, frame.values.T
+
+
+def get_last_valid(closes):
+    """ 銘柄ごとの最後の終値の位置（終値が無い銘柄は-1） """
+    valid = ~np.isnan(closes)
+    last = closes.shape[1] - 1 - np.argmax(valid[:, ::-1], axis=1)
+    return np.where(valid.any(axis=1), last, -1)
+
+
+class PanelScreener:
+    """ 全銘柄の終値（銘柄数 × 日数の2次元配列）からRSI、RCI、MACDを１回で計算し、
+    閾値を超えた銘柄を選ぶクラス
+    最新日の日足が無い銘柄は、その銘柄の最後の日足で判定する。
+    """
+
+    def __init__(self, rsi_n=14, rsi_method="sma", rsi_threshold=20.0,
+                 rci_n=9, rci_threshold=-80.0, macd_n=(12, 26, 9)):
+        """ コンストラクタ
+        rsi_threshold: RSIがこれ以下の銘柄を選ぶ（売られすぎ）
+        rci_threshold: RCIがこれ以下の銘柄を選ぶ（底値圏）
+        macd_n: MACDの (短期, 長期, シグナル) の期間
+        """
+        self.rsi_n = rsi_n
+        self.rsi_method = rsi_method
+        self.rsi_threshold = rsi_threshold
+        self.rci_n = rci_n
+        self.rci_threshold = rci_threshold
+        self.macd_n = macd_n
+        self.excluded = []  # 前回のscreenで指標を計算できなかった銘柄
+        self.myLogger = MyLogger("PanelScreener")
+
+    def evaluate(self, symbols, closes, dates=None):
+        """ 全銘柄の最後の日足の指標を返却する
+        closes: 終値 shape (銘柄数, 日数)
+        dates: 日数分の日付（指定した場合は判定した日を date 列に入れる）
+        戻り値: DataFrame（index:銘柄
+                列: [date], close, rsi, rci, macd, signal, rsi_under,
+                    rci_under, golden_cross）
+        """
+        closes = np.asarray(closes, dtype=float)
+        rows = np.arange(len(symbols))
+        last = get_last_valid(closes)
+        at = np.maximum(last, 0)
+
+        rsi = rolling_rsi(closes, self.rsi_n, self.rsi_method)[rows, at]
+        # RCIは最後の日足までの窓だけ計算する
+        n = self.rci_n
+        index = at[:, None] - np.arange(n - 1, -1, -1)
+        windows = np.where(index >= 0, closes[rows[:, None],
+                                              np.maximum(index, 0)], np.nan)
+        rci = rolling_rci(windows, n)[:, -1]
+        macd, signal = rolling_macd(closes, *self.macd_n)
+        diff = macd - signal
+        # MACDがシグナルを下から上へ抜けた（前日は下、最新日は上）
+        pre = np.maximum(at - 1, 0)
+        golden = (last >= 1) & (diff[rows, pre] < 0) & \
+            (diff[rows, at] >= 0)
+
+        missing = last < 0
+        close = np.where(missing, np.nan, closes[rows, at])
+        rsi = np.where(missing, np.nan, rsi)
+        rci = np.where(missing, np.nan, rci)
+        with np.errstate(invalid="ignore"):
+            rsi_under = rsi <= self.rsi_threshold
+            rci_under = rci <= self.rci_threshold
+        columns = ["close", "rsi", "rci", "macd", "signal",
+                   "rsi_under", "rci_under", "golden_cross"]
+        result = pd.DataFrame({"close": close,
+                               "rsi": rsi, "rci": rci,
+                               "macd": np.where(missing, np.nan,
+                                                macd[rows, at]),
+                               "signal": np.where(missing, np.nan,
+                                                  signal[rows, at]),
+                               "rsi_under": rsi_under,
+                               "rci_under": rci_under,
+                               "golden_cross": golden & ~missing},
+                              index=pd.Index(symbols, name="symbol"),
+                              columns=columns)
+        if dates is not None:
+            dates = np.asarray(dates, dtype="datetime64[ns]")
+            result.insert(0, "date", np.where(missing, np.datetime64("NaT"),
+                                              dates[at]))
+        return result
+
+    def screen(self, candles, column="Close"):
+        """ {銘柄: 日足のDataFrame} から RSIが閾値以下の銘柄をRSIの低い順に返却する
+        （列は evaluate と同じ）
+        日足が足りずRSIを計算できない銘柄は self.excluded に入れてログに出力する。
+        """
+        symbols, dates, closes = align_closes(candles, column)
+        if not symbols:
+            self.excluded = []
+            return self.evaluate([], np.empty((0, 1)))
+        result = self.evaluate(symbols, closes, dates)
+
+        self.excluded = list(result.index[result["rsi"].isna()])
+        if self.excluded:
+            self.myLogger.warning("日足が足りず判定できない銘柄 %d件: %s",
+                                  len(self.excluded),
+                                  ",".join(self.excluded))
+        stale = result.index[result["date"] < dates[-1]]
+        if len(stale) > 0:
+            self.myLogger.info("最新日（%s）の日足が無く直近の日足で判定した銘柄: %s",
+                               dates[-1].strftime("%Y-%m-%d"),
+                               ",".join(stale))
+        return result[result["rsi_under"]].sort_values("rsi")
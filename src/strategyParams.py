@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+
+import json
+
+
+class StrategyParams:
+    """ AutoTraderの売買条件のパラメータ
+    既定値は AutoTrader / 判定メソッド内の値と同じ。
+    """
+
+    DEFAULTS = {"benefit": 0.097,               # 利益
+                "buy_cancel_threshold": 0.5,    # 再買い注文するための閾値
+                "sell_order_range": 0.07,
+                # 損切価格 = 買値 - sell_order_range * 閾値
+                "stop_loss_threshold": 10,
+                "rsi_n": 14,
+                "rsi_threshold": 60,            # 損切判定のRSI閾値
+                "stop_loss_n": 0.30,            # RSI超過時の損切閾値の倍率
+                "ema_diff_threshold": 0.1,      # EMSクロスdiffの絶対値の総和の閾値
+                "ema_diff_short": 9,
+                "ema_diff_long": 26,
+                "ema_diff_window": 9,
+                "macd_short": 12,
+                "macd_long": 26,
+                "macd_signal": 9,
+                "rci_n": 9,
+                "rci_threshold": 90}            # RCIがこれより小さい場合はまだ売らない
+
+    def __init__(self, **kwargs):
+        """ コンストラクタ（指定しない項目は既定値） """
+        unknown = set(kwargs) - set(self.DEFAULTS)
+        if unknown:
+            raise ValueError("unknown params: {0}".format(sorted(unknown)))
+        for name, value in self.DEFAULTS.items():
+            setattr(self, name, kwargs.get(name, value))
+
+    def to_dict(self):
+        """ dictに変換する """
+        return {name: getattr(self, name) for name in self.DEFAULTS}
+
+    @classmethod
+    def from_dict(cls, params):
+        """ dictから作成する """
+        return cls(**params)
+
+    def save(self, path):
+        """ JSONファイルに保存する """
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2, sort_keys=True)
+
+    @classmethod
+    def load(cls, path):
+        """ JSONファイルから読み込む（無い項目は既定値） """
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
+
+    def get_indicator_spans(self):
+        """ 指標の計算に使う期間（IndicatorEngineの引数） """
+        return ((self.macd_short, self.macd_long, self.macd_signal),
+                (self.ema_diff_short, self.ema_diff_long,
+                 self.ema_diff_window),
+                self.rsi_n, "sma", self.rci_n)
+
+    def __repr__(self):
+        return "StrategyParams({0})".format(self.to_dict())
+
+    def __eq__(self, other):
+        return (isinstance(other, StrategyParams) and
+                self.to_dict() == other.to_dict())
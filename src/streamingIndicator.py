@@ -0,0 +1,345 @@
+import math
+from collections import deque
+
+
+class StreamingEma:
+    """ EMA(指数平滑移動平均)を1本ごとに逐次計算するクラス
+    pandasの ewm(span=n).mean()（adjust=True）と同じ値になる。
+        EMA = Σ(1-α)^i * x[t-i] / Σ(1-α)^i
+        *α=2÷(n+1)
+    確定済みの分子・分母を保持しておき、未確定のロウソクが更新（revise）
+    された場合は確定済みの値から再計算する。
+    """
+
+    def __init__(self, span=None, alpha=None):
+        """ コンストラクタ """
+        if alpha is None:
+            alpha = 2.0 / (float(span) + 1.0)
+        self.decay = 1.0 - alpha
+        self._base_num = 0.0  # 確定済み（1本前まで）の分子
+        self._base_den = 0.0  # 確定済み（1本前まで）の分母
+        self._num = 0.0
+        self._den = 0.0
+        self.count = 0
+        self.value = math.nan
+
+    def append(self, x):
+        """ 新しいロウソクの値を追加する """
+        self._base_num = self._num
+        self._base_den = self._den
+        self.count = self.count + 1
+        return self.revise(x)
+
+    def revise(self, x):
+        """ 最新（未確定）のロウソクの値を更新する """
+        self._num = x + self.decay * self._base_num
+        self._den = 1.0 + self.decay * self._base_den
+        self.value = self._num / self._den
+        return self.value
+
+
+class StreamingRma:
+    """ pandasの ewm(alpha=α, adjust=False).mean() と同じ値を逐次計算するクラス
+    （WilderのRSIで使う平滑移動平均）
+    """
+
+    def __init__(self, alpha):
+        """ コンストラクタ """
+        self.alpha = alpha
+        self._base = math.nan  # 確定済み（1本前まで）の値
+        self.count = 0
+        self.value = math.nan
+
+    def append(self, x):
+        """ 新しい値を追加する """
+        self._base = self.value
+        self.count = self.count + 1
+        return self.revise(x)
+
+    def revise(self, x):
+        """ 最新（未確定）の値を更新する """
+        if self.count <= 1:
+            self.value = x
+        else:
+            self.value = self._base + self.alpha * (x - self._base)
+        return self.value
+
+
+class StreamingWindow:
+    """ 直近n個の値を保持するウィンドウ（合計は差分で更新する） """
+
+    def __init__(self, n):
+        """ コンストラクタ """
+        self.n = n
+        self.values = deque(maxlen=n)
+        self.sum = 0.0
+
+    def append(self, x):
+        """ 新しい値を追加する """
+        if len(self.values) == self.n:
+            self.sum = self.sum - self.values[0]
+        self.values.append(x)
+        self.sum = self.sum + x
+
+    def revise(self, x):
+        """ 最新の値を更新する """
+        self.sum = self.sum - self.values[-1] + x
+        self.values[-1] = x
+
+    def is_full(self):
+        """ n個の値がそろっているか """
+        return len(self.values) == self.n
+
+    def total(self):
+        """ 合計値（誤差が蓄積しないよう再計算する） """
+        return math.fsum(self.values)
+
+
+class StreamingMacd:
+    """ MACDとシグナルを逐次計算するクラス
+    MyTechnicalAnalysisUtil.get_macd() と同じ値になる。
+        MACD = 短期EMA – 長期EMA
+        シグナル = MACDの指数平滑移動平均
+    """
+
+    def __init__(self, n_short=12, n_long=26, n_signal=9):
+        """ コンストラクタ """
+        self.ema_short = StreamingEma(n_short)
+        self.ema_long = StreamingEma(n_long)
+        self.ema_signal = StreamingEma(n_signal)
+        # MACD-シグナル（1本前, 最新）
+        self.diffs = deque([math.nan, math.nan], maxlen=2)
+        self.macd = math.nan
+        self.signal = math.nan
+
+    def append(self, close):
+        """ 新しいロウソクの終値を追加する """
+        self.ema_short.append(close)
+        self.ema_long.append(close)
+        self.macd = self.ema_short.value - self.ema_long.value
+        self.signal = self.ema_signal.append(self.macd)
+        self.diffs.append(self.macd - self.signal)
+
+    def revise(self, close):
+        """ 最新（未確定）のロウソクの終値を更新する """
+        self.ema_short.revise(close)
+        self.ema_long.revise(close)
+        self.macd = self.ema_short.value - self.ema_long.value
+        self.signal = self.ema_signal.revise(self.macd)
+        self.diffs[-1] = self.macd - self.signal
+
+
+class StreamingEmaDiff:
+    """ 短期EMAと長期EMAの差の絶対値を、直近window本分合計して逐次計算するクラス
+    AutoTrader.is_buy_order() の条件3と同じ値になる。
+    """
+
+    def __init__(self, n_short=9, n_long=26, window=9):
+        """ コンストラクタ """
+        self.ema_short = StreamingEma(n_short)
+        self.ema_long = StreamingEma(n_long)
+        self.window = StreamingWindow(window)
+
+    def append(self, close):
+        """ 新しいロウソクの終値を追加する """
+        self.ema_short.append(close)
+        self.ema_long.append(close)
+        self.window.append(abs(self.ema_short.value - self.ema_long.value))
+
+    def revise(self, close):
+        """ 最新（未確定）のロウソクの終値を更新する """
+        self.ema_short.revise(close)
+        self.ema_long.revise(close)
+        self.window.revise(abs(self.ema_short.value - self.ema_long.value))
+
+    @property
+    def abs_sum(self):
+        """ 差の絶対値の総和 """
+        return self.window.total()
+
+
+class StreamingRsi:
+    """ RSIを逐次計算するクラス
+    method:
+        "sma": 単純移動平均（MyTechnicalAnalysisUtil.get_rsi() と同じ値になる）
+        "wilder": Wilderの平滑移動平均（α=1/n）
+    """
+
+    def __init__(self, n=14, method="sma"):
+        """ コンストラクタ """
+        if method not in ("sma", "wilder"):
+            raise ValueError(
+                "method must be 'sma' or 'wilder': {0}".format(method))
+        self.n = n
+        self.method = method
+        self._pre_close = math.nan  # 1本前（確定済み）の終値
+        self._close = math.nan
+        self.count = 0
+        if method == "sma":
+            self._up = StreamingWindow(n)
+            self._down = StreamingWindow(n)
+        else:
+            self._up = StreamingRma(1.0 / n)
+            self._down = StreamingRma(1.0 / n)
+        self.value = math.nan
+
+    def append(self, close):
+        """ 新しいロウソクの終値を追加する """
+        self.count = self.count + 1
+        self._pre_close = self._close
+        self._close = close
+        if self.count >= 2:
+            diff = close - self._pre_close
+            self._up.append(max(diff, 0.0))
+            self._down.append(max(-diff, 0.0))
+        self.value = self._calc()
+        return self.value
+
+    def revise(self, close):
+        """ 最新（未確定）のロウソクの終値を更新する """
+        self._close = close
+        if self.count >= 2:
+            diff = close - self._pre_close
+            self._up.revise(max(diff, 0.0))
+            self._down.revise(max(-diff, 0.0))
+        self.value = self._calc()
+        return self.value
+
+    def _calc(self):
+        """ RSI = 100 - 100 / (1 + 上げ幅平均 / 下げ幅平均) """
+        if self.count - 1 < self.n:
+            return math.nan
+        if self.method == "sma":
+            up = self._up.total() / self.n
+            down = self._down.total() / self.n
+        else:
+            up = self._up.value
+            down = self._down.value
+        if down == 0.0:
+            return 100.0 if up > 0.0 else math.nan
+        return 100.0 - (100.0 / (1.0 + up / down))
+
+
+class StreamingRci:
+    """ RCIを逐次計算するクラス
+    MyTechnicalAnalysisUtil.get_rci() と同じ値になる。
+    同値の終値は新しいロウソクを上位の順位とする。
+    """
+
+    def __init__(self, n=9):
+        """ コンストラクタ """
+        self.n = n
+        self.closes = deque(maxlen=n)  # 古い順
+        self.value = math.nan
+
+    def append(self, close):
+        """ 新しいロウソクの終値を追加する """
+        self.closes.append(close)
+        self.value = self._calc()
+        return self.value
+
+    def revise(self, close):
+        """ 最新（未確定）のロウソクの終値を更新する """
+        self.closes[-1] = close
+        self.value = self._calc()
+        return self.value
+
+    def _calc(self):
+        """ RCI = ( 1 – 6y / ( n × ( n**2 – 1 ) ) ) × 100 """
+        n = self.n
+        if len(self.closes) < n:
+            return math.nan
+        # 時間の順位 a：新しい順に1,2,...  価格の順位 b：高い順に1,2,...
+        order = sorted(range(n), key=lambda i: (self.closes[i], i),
+                       reverse=True)
+        y = 0
+        for b, i in enumerate(order, 1):
+            a = n - i
+            y = y + (a - b) ** 2
+        return (1 - 6 * y / (n * (n ** 2 - 1))) * 100
+
+
+class IndicatorEngine:
+    """ ロウソク足を1本ずつ受け取り、EMA/MACD/シグナル/RSI/RCIを逐次計算するクラス
+    ・新しいロウソク（時刻が進んだ）→ 追加（append）
+    ・同じ時刻のロウソク（未確定のロウソクの更新）→ 修正（revise）
+    どちらもロウソクの本数に依存しない定数時間で更新する。
+    """
+
+    def __init__(self, macd_spans=(12, 26, 9), ema_diff_spans=(9, 26, 9),
+                 rsi_n=14, rsi_method="sma", rci_n=9):
+        """ コンストラクタ
+        macd_spans: (短期EMA, 長期EMA, シグナル)
+        ema_diff_spans: (短期EMA, 長期EMA, 合計する本数)
+        """
+        self.macd_ = StreamingMacd(*macd_spans)
+        self.ema_diff_ = StreamingEmaDiff(*ema_diff_spans)
+        self.rsi_ = StreamingRsi(rsi_n, rsi_method)
+        self.rci_ = StreamingRci(rci_n)
+        self.last_time = None  # 最新ロウソクのUnixTime（ミリ秒）
+        self.close = math.nan
+        self.count = 0
+
+    def update(self, candle_time, close):
+        """ ロウソクの時刻と終値で指標を更新する
+        戻り値: 追加="append", 修正="revise", 古いロウソク=None
+        """
+        close = float(close)
+        indicators = (self.macd_, self.ema_diff_, self.rsi_, self.rci_)
+        if self.last_time is None or candle_time > self.last_time:
+            for indicator in indicators:
+                indicator.append(close)
+            self.last_time = candle_time
+            self.count = self.count + 1
+            result = "append"
+        elif candle_time == self.last_time:
+            for indicator in indicators:
+                indicator.revise(close)
+            result = "revise"
+        else:
+            return None
+        self.close = close
+        return result
+
+    def update_ohlcv(self, ohlcv):
+        """ bitbankのohlcv（[始値,高値,安値,終値,出来高,UnixTime]のlist）で更新する
+        最新ロウソク以降の分だけを処理する。
+        """
+        start = len(ohlcv)
+        if self.last_time is not None:
+            while start > 0 and ohlcv[start - 1][5] >= self.last_time:
+                start = start - 1
+        else:
+            start = 0
+        for row in ohlcv[start:]:
+            self.update(row[5], row[3])
+
+    @property
+    def macd(self):
+        """ 最新のMACD """
+        return self.macd_.macd
+
+    @property
+    def signal(self):
+        """ 最新のシグナル """
+        return self.macd_.signal
+
+    @property
+    def macd_diffs(self):
+        """ MACD-シグナル の（1本前, 最新）"""
+        return self.macd_.diffs[0], self.macd_.diffs[1]
+
+    @property
+    def ema_diff_abs_sum(self):
+        """ 短期EMAと長期EMAの差の絶対値の総和 """
+        return self.ema_diff_.abs_sum
+
+    @property
+    def rsi(self):
+        """ 最新のRSI """
+        return self.rsi_.value
+
+    @property
+    def rci(self):
+        """ 最新のRCI """
+        return self.rci_.value
@@ -1,11 +1,22 @@
+import os
 import time
+import calendar
+import threading
 from enum import Enum
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 
 import pandas as pd
 import numpy as np
-import python_bitbankcc
 from myUtil import MyLogger
+from bitbankHttp import BitbankPublic
+from requestScheduler import get_request_scheduler
+from candleStore import CandleStore, to_records, sort_unique
+from streamingIndicator import IndicatorEngine
+from strategyParams import StrategyParams
+from indicatorSeries import rolling_rci, rolling_rsi
+from latencyMonitor import timed
+from metricsServer import get_metrics
 
 
 class EmaCross(Enum):
@@ -22,6 +33,112 @@ class MacdCross(Enum):
     OTHER = -1
 
 
+# ロウソク足の種類ごとの期間（秒）
+CANDLE_PERIOD_SEC = {"1min": 60,
+                     "5min": 60 * 5,
+                     "15min": 60 * 15,
+                     "30min": 60 * 30,
+                     "1hour": 60 * 60,
+                     "4hour": 60 * 60 * 4,
+                     "8hour": 60 * 60 * 8,
+                     "12hour": 60 * 60 * 12,
+                     "1day": 60 * 60 * 24,
+                     "1week": 60 * 60 * 24 * 7}
+
+# 年(yyyy)単位で取得するロウソク足の種類（それ以外は日(yyyymmdd)単位）
+YEAR_KEY_CANDLE_TYPES = ("4hour", "8hour", "12hour", "1day", "1week")
+
+
+class CandleCache:
+    """ ロウソク足(ohlcv)を(pair, candle_type, 日付)単位でキャッシュするクラス
+    ・確定済みの日（その日が終わった後に取得したもの）は再取得しない
+    ・今日の分は、現在のロウソクの期間が切り替わった場合か、
+      前回取得からttl_sec秒経過した場合のみ再取得する
+
+    PRAM:
+        fetcher: fetcher(pair, candle_type, yyyymmdd)でohlcvのlistを返す関数
+        ttl_sec: 今日の分を再取得するまでの最大秒数
+        clock: 現在のUnixTime（秒）を返す関数（テスト用）
+    """
+
+    def __init__(self, fetcher, ttl_sec=5.0, clock=time.time):
+        """ コンストラクタ """
+        self.fetcher = fetcher
+        self.ttl_sec = ttl_sec
+        self.clock = clock
+        self.hits = 0    # キャッシュヒット数
+        self.misses = 0  # キャッシュミス数（=APIリクエスト数）
+        # key:(pair, candle_type, yyyymmdd) value:(取得時刻, ohlcv)
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get_ohlcv(self, pair, candle_type, yyyymmdd):
+        """ ohlcvのlistを返却する（必要な場合のみAPIから取得） """
+        ohlcv = self.get_cached_ohlcv(pair, candle_type, yyyymmdd)
+        if ohlcv is not None:
+            return ohlcv
+        with self._lock:
+            self.misses = self.misses + 1
+
+        key = (pair, candle_type, yyyymmdd)
+        now = self.clock()
+        ohlcv = self.fetcher(pair, candle_type, yyyymmdd)
+        with self._lock:
+            self._entries[key] = (now, ohlcv)
+        return ohlcv
+
+    def get_cached_ohlcv(self, pair, candle_type, yyyymmdd):
+        """ 有効なキャッシュがあればohlcvのlistを、無ければNoneを返却する """
+        now = self.clock()
+        with self._lock:
+            entry = self._entries.get((pair, candle_type, yyyymmdd))
+            if entry is not None and self.is_fresh(entry[0], now,
+                                                   candle_type, yyyymmdd):
+                self.hits = self.hits + 1
+                return entry[1]
+        return None
+
+    def is_fresh(self, fetched_at, now, candle_type, yyyymmdd):
+        """ キャッシュが有効か判定する """
+        closed_at = self.get_closed_at(yyyymmdd)
+        if fetched_at >= closed_at:
+            return True  # 確定済みの日（年）は再取得不要
+        if now >= closed_at:
+            return False  # 確定前に取得した分は確定後に１度だけ再取得する
+
+        if now - fetched_at >= self.ttl_sec:
+            return False
+
+        period = CANDLE_PERIOD_SEC.get(candle_type)
+        if period is None:
+            return False
+        return int(fetched_at // period) == int(now // period)
+
+    @staticmethod
+    def get_closed_at(yyyymmdd):
+        """ 日(yyyymmdd)または年(yyyy)が終わるUnixTime（秒、UTC） """
+        if len(yyyymmdd) == 4:
+            end = datetime(int(yyyymmdd) + 1, 1, 1)
+        else:
+            end = datetime.strptime(yyyymmdd, '%Y%m%d') + timedelta(days=1)
+        return calendar.timegm(end.timetuple())
+
+    def get_stats(self):
+        """ ヒット数、ミス数、ヒット率を返却する """
+        with self._lock:
+            total = self.hits + self.misses
+            ratio = self.hits / total if total > 0 else 0.0
+            return {"hits": self.hits, "misses": self.misses,
+                    "hit_ratio": ratio}
+
+    def clear(self):
+        """ キャッシュと統計情報をクリアする """
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+
 class MyTechnicalAnalysisUtil:
     """ テクニカル分析のユーティリティクラス
     https://www.rakuten-sec.co.jp/MarketSpeed/onLineHelp/msman2_5_1_2.html
@@ -31,79 +148,263 @@ class MyTechnicalAnalysisUtil:
         cadle_type: "1min","5min","15min","30min","1hour"のいづれか。
     """
 
-    def __init__(self):
-        """ コンストラクタ """
-        self.pubApi = python_bitbankcc.public()
+    def __init__(self, candle_cache=None, candle_store=None, market_data=None,
+                 scheduler=None):
+        """ コンストラクタ
+        candle_cache: 複数インスタンスでキャッシュを共有する場合に指定する
+        candle_store: 確定済みロウソクの保存先（省略時は環境変数CANDLE_STORE_DIR）
+        market_data: 配信データ（MarketDataSource）を使う場合に指定する
+        scheduler: リクエストの流量制限（省略時はプロセス内で共有のもの）
+        """
+        if scheduler is None:
+            scheduler = get_request_scheduler()
+        self.scheduler = scheduler
+        self.pubApi = scheduler.wrap_public(BitbankPublic())
         self.myLogger = MyLogger("MyTechnicalAnalysisUtil")
         self.RSI_N = 14
+        self.CANDLE_CACHE_TTL_SEC = 5.0
+        self.BACKFILL_MAX_WORKERS = 8  # 複数日分を並列取得するスレッド数の上限
+        self._backfill_executor = None
+        self._executor_lock = threading.Lock()
+        if candle_cache is None:
+            candle_cache = CandleCache(self.fetch_ohlcv,
+                                       self.CANDLE_CACHE_TTL_SEC)
+        self.candle_cache = candle_cache
+        self.indicator_engines = {}  # key:(pair, candle_type, 指標の期間)
+        self._rsi_series = {}  # key:(pair, candle_type, 本数, n, method)
+        self._rsi_lock = threading.Lock()
+        if candle_store is None:
+            candle_store = CandleStore(
+                os.getenv("CANDLE_STORE_DIR", "./candle_store"))
+        self.candle_store = candle_store
+        self.market_data = market_data
+        self.MARKET_DATA_MAX_AGE_SEC = 5.0  # これより古い配信データは使わない
+
+    @timed("MTAU.fetch_ohlcv")
+    def fetch_ohlcv(self, pair, candle_type, yyyymmdd):
+        """ APIからohlcvのlistを取得する（キャッシュを経由しない） """
+        try:
+            candlestick = self.pubApi.get_candlestick(
+                pair, candle_type, yyyymmdd)
+        except ConnectionResetError as cre:
+            self.myLogger.exception("get_canlestickでエラー。再実行します", cre)
+            get_metrics().inc("retries", {"site": "fetch_ohlcv"})
+            candlestick = self.pubApi.get_candlestick(
+                pair, candle_type, yyyymmdd)
+        return candlestick["candlestick"][0]["ohlcv"]
+
+    def get_candle_cache_stats(self):
+        """ ロウソク足キャッシュのヒット数、ミス数、ヒット率を返却する """
+        return self.candle_cache.get_stats()
+
+    @timed("MTAU.get_indicator_engine")
+    def get_indicator_engine(self, candle_type, pair="xrp_jpy", params=None):
+        """ 最新のロウソクまで更新した逐次計算の指標（IndicatorEngine）を返却する
+        初回のみ昨日と今日の２日分で初期化し、以降は新しいロウソクと
+        未確定のロウソクのみを定数時間で反映する（pandasを使わない）。
+        配信データがある場合、同じ期間中は配信されたティッカーで未確定の
+        ロウソクを更新し、リクエストしない。
+        params: 指標の期間（StrategyParams 省略時は既定値）
+        """
+        if params is None:
+            params = StrategyParams()
+        spans = params.get_indicator_spans()
+        key = (pair, candle_type, spans)
+        engine = self.indicator_engines.get(key)
+        if engine is None:
+            engine = IndicatorEngine(*spans)
+            self.indicator_engines[key] = engine
+
+        if self.apply_market_data(engine, candle_type, pair, False):
+            return engine
+
+        now_utc = datetime.utcfromtimestamp(time.time())
+        if engine.last_time is None:
+            yesterday = now_utc - timedelta(days=1)
+            engine.update_ohlcv(self.candle_cache.get_ohlcv(
+                pair, candle_type, yesterday.strftime('%Y%m%d')))
+        engine.update_ohlcv(self.candle_cache.get_ohlcv(
+            pair, candle_type, now_utc.strftime('%Y%m%d')))
+        self.apply_market_data(engine, candle_type, pair, True)
+        return engine
+
+    def apply_market_data(self, engine, candle_type, pair, allow_append):
+        """ 配信された最新のティッカーで未確定のロウソクの終値を更新する
+        allow_append: Trueの場合、ロウソクの期間が切り替わっていれば新しいロウソクを追加する
+        戻り値: 更新した場合True
+        """
+        if self.market_data is None or engine.last_time is None:
+            return False
+        ticker = self.market_data.get_ticker(pair,
+                                             self.MARKET_DATA_MAX_AGE_SEC)
+        if ticker is None:
+            return False
+
+        period_ms = CANDLE_PERIOD_SEC[candle_type] * 1000
+        candle_time = int(ticker["timestamp"]) // period_ms * period_ms
+        if candle_time < engine.last_time:
+            return False
+        if candle_time > engine.last_time and not allow_append:
+            return False  # 期間が切り替わったのでロウソクを取得し直す
+        engine.update(candle_time, ticker["last"])
+        return True
+
+    def get_candle_keys(self, candle_type, start_ts, end_ts):
+        """ start_ts-end_ts（UnixTime 秒）のロウソクを取得するための
+        日付(yyyymmdd)のlistを古い順で返却する。
+        4hour以上のロウソクは年(yyyy)単位で取得する。
+        """
+        start_utc = datetime.utcfromtimestamp(start_ts)
+        end_utc = datetime.utcfromtimestamp(end_ts)
+        if candle_type in YEAR_KEY_CANDLE_TYPES:
+            return [str(y) for y in range(start_utc.year, end_utc.year + 1)]
+
+        keys = []
+        crnt_ymd = datetime(start_utc.year, start_utc.month, start_utc.day)
+        while crnt_ymd <= end_utc:
+            keys.append(crnt_ymd.strftime('%Y%m%d'))
+            crnt_ymd = crnt_ymd + timedelta(days=1)
+        return keys
+
+    def get_backfill_keys(self, candle_type, n, now=None):
+        """ 最新（未確定含む）からn本分のロウソクに必要な日付のlistを古い順で返却する """
+        if now is None:
+            now = time.time()
+        period = CANDLE_PERIOD_SEC[candle_type]
+        start_ts = (int(now // period) - (n - 1)) * period
+        return self.get_candle_keys(candle_type, start_ts, now)
+
+    def fetch_ohlcv_list(self, pair, candle_type, keys):
+        """ 複数日分のohlcvを日ごとのlistで返却する
+        キャッシュに無い日が複数ある場合のみスレッドプールで並列に取得する。
+        """
+        ohlcv_list = [self.candle_cache.get_cached_ohlcv(
+            pair, candle_type, key) for key in keys]
+        misses = [i for i, ohlcv in enumerate(ohlcv_list) if ohlcv is None]
+        if len(misses) <= 1:
+            for i in misses:
+                ohlcv_list[i] = self.candle_cache.get_ohlcv(
+                    pair, candle_type, keys[i])
+            return ohlcv_list
+
+        results = self.get_backfill_executor().map(
+            lambda i: self.candle_cache.get_ohlcv(pair, candle_type, keys[i]),
+            misses)
+        for i, ohlcv in zip(misses, results):
+            ohlcv_list[i] = ohlcv
+        return ohlcv_list
+
+    def fetch_closed_ohlcv_list(self, pair, candle_type, keys):
+        """ 確定済みの日のohlcvをキャッシュを使わずに取得し、日ごとのlistで返却する """
+        fetcher = self.candle_cache.fetcher
+        if len(keys) <= 1:
+            return [fetcher(pair, candle_type, key) for key in keys]
+        return list(self.get_backfill_executor().map(
+            lambda key: fetcher(pair, candle_type, key), keys))
+
+    def get_backfill_executor(self):
+        """ 並列取得用のスレッドプール（初回のみ作成し、以降は使い回す） """
+        with self._executor_lock:
+            if self._backfill_executor is None:
+                self._backfill_executor = ThreadPoolExecutor(
+                    max_workers=self.BACKFILL_MAX_WORKERS)
+            return self._backfill_executor
+
+    def fetch_ohlcv_keys(self, pair, candle_type, keys):
+        """ 複数日分のohlcvを並列に取得し、keysの順に連結して返却する """
+        ohlcv = []
+        for ohlcv_tmp in self.fetch_ohlcv_list(pair, candle_type, keys):
+            ohlcv.extend(ohlcv_tmp)
+        return ohlcv
+
+    def to_dataframe(self, ohlcv):
+        """ ohlcvのlistを時刻順・重複なしのDataFrameに変換する """
+        return self.records_to_dataframe(sort_unique(to_records(ohlcv)))
+
+    def records_to_dataframe(self, records):
+        """ CANDLE_DTYPEの配列をDataFrameに変換する """
+        df_ohlcv = pd.DataFrame({"open": records["open"],      # 始値
+                                 "hight": records["hight"],    # 高値
+                                 "low": records["low"],        # 安値
+                                 "close": records["close"],    # 終値
+                                 "amount": records["amount"],  # 出来高
+                                 "time": records["time"]})     # UnixTime
 
-    def get_candlestick_n(self, candle_type, n: int, pair="xrp_jpy"):
-        now = time.time()
-        now_utc = datetime.utcfromtimestamp(now)
+        idx = pd.to_datetime(df_ohlcv['time']/1000, unit='s')
+        df_ohlcv.index = idx
+        df_ohlcv.index.name = "utc"
+        return df_ohlcv
 
-        yyyymmdd = now_utc.strftime('%Y%m%d')
+    @timed("MTAU.get_candlestick_n")
+    def get_candlestick_n(self, candle_type, n: int, pair="xrp_jpy"):
+        """ 最新（未確定含む）からn本分のチャート情報（ロウソク）を取得する。
+        今日の分で足りない場合は必要な日数分だけ前日以前を並列に取得する。
+        """
+        keys = self.get_backfill_keys(candle_type, n)
 
         try:
-            ohlcv = []
-            while len(ohlcv) <= n+1:
-                candlestick_tmp = self.pubApi.get_candlestick(
-                    pair, candle_type, yyyymmdd)
-                ohlcv_tmp = candlestick_tmp["candlestick"][0]["ohlcv"]
-                ohlcv = ohlcv + ohlcv_tmp
+            ohlcv = self.fetch_ohlcv_keys(pair, candle_type, keys)
         except ConnectionResetError as cre:
             self.myLogger.exception("get_canlestickでエラーが発生", cre)
             raise cre
 
-        df_ohlcv = pd.DataFrame(ohlcv,
-                                columns=["open",    # 始値
-                                         "hight",   # 高値
-                                         "low",     # 安値
-                                         "close",   # 終値
-                                         "amount",  # 出来高
-                                         "time"])   # UnixTime
-
-        idx = pd.to_datetime(df_ohlcv['time']/1000, unit='s')
-        df_ohlcv.index = idx
-        df_ohlcv.index.name = "utc"
-
-        return df_ohlcv.tail(n)
+        return self.to_dataframe(ohlcv).tail(n)
 
-    def get_candlestick_range(self, candle_type, s_yyyymmdd, e_yyyymmdd):
+    @timed("MTAU.get_candlestick_range")
+    def get_candlestick_range(self, candle_type, s_yyyymmdd, e_yyyymmdd,
+                              pair="xrp_jpy"):
         """ チャート情報（ロウソク）をstart(yyyymmdd)-end(yyyymmdd)期間分取得する
         """
+        records = self.get_candle_records(candle_type, s_yyyymmdd, e_yyyymmdd,
+                                          pair)
+        return self.records_to_dataframe(records)
+
+    def get_candle_records(self, candle_type, s_yyyymmdd, e_yyyymmdd,
+                           pair="xrp_jpy"):
+        """ チャート情報（ロウソク）をstart(yyyymmdd)-end(yyyymmdd)期間分、
+        CANDLE_DTYPEの配列（時刻順・重複なし）で取得する。
+        保存済みの日はローカル（candle_store）から読み込み、
+        未保存の日のみAPIから並列に取得する。確定済みの日は取得後に保存する。
+        """
         start_ymd = datetime.strptime(s_yyyymmdd, '%Y%m%d')
         end_ymd = datetime.strptime(e_yyyymmdd, '%Y%m%d')
 
         if start_ymd > end_ymd:
             raise ValueError
 
-        crnt_ymd = end_ymd
-
-        df = pd.DataFrame()
-
-        while True:
-            str_crnt_ymd = crnt_ymd.strftime('%Y%m%d')
-            candlestick = self.pubApi.get_candlestick(
-                "xrp_jpy", candle_type, str_crnt_ymd)
-            ohlcv = candlestick["candlestick"][0]["ohlcv"]
-            df_ohlcv = pd.DataFrame(ohlcv,
-                                    columns=["open",   # 始値
-                                             "hight",   # 高値
-                                             "low",     # 安値
-                                             "close",   # 終値
-                                             "amount",  # 出来高
-                                             "time"])   # UnixTime
-            df = df.append(df_ohlcv, ignore_index=True)
-            if str_crnt_ymd == s_yyyymmdd:
-                break
-
-            crnt_ymd = crnt_ymd - timedelta(days=1)
-
-        idx = pd.to_datetime(df['time']/1000, unit='s')
-        df.index = idx
-
-        return df
+        keys = []
+        crnt_ymd = start_ymd
+        while crnt_ymd <= end_ymd:
+            keys.append(crnt_ymd.strftime('%Y%m%d'))
+            crnt_ymd = crnt_ymd + timedelta(days=1)
 
+        now = time.time()
+        stored_keys = self.candle_store.get_keys(pair, candle_type)
+        missing_keys = [key for key in keys if key not in stored_keys]
+        closed_keys = [key for key in missing_keys
+                       if CandleCache.get_closed_at(key) <= now]
+        open_keys = [key for key in missing_keys if key not in closed_keys]
+
+        # 確定済みの日は保存するため、日が終わる前に取得したキャッシュは使わない
+        closed_list = self.fetch_closed_ohlcv_list(pair, candle_type,
+                                                   closed_keys)
+        for key, ohlcv in zip(closed_keys, closed_list):
+            if len(ohlcv) > 0:  # 取得できなかった日は保存済みにしない
+                self.candle_store.append(pair, candle_type, key, ohlcv)
+
+        parts = []
+        for ohlcv in self.fetch_ohlcv_list(pair, candle_type, open_keys):
+            parts.append(to_records(ohlcv))  # 未確定の日は保存しない
+
+        start_ms = calendar.timegm(start_ymd.timetuple()) * 1000
+        end_ms = calendar.timegm(
+            (end_ymd + timedelta(days=1)).timetuple()) * 1000
+        parts.insert(0, self.candle_store.read_range(
+            pair, candle_type, start_ms, end_ms))
+
+        return sort_unique(np.concatenate(parts))
+
+    @timed("MTAU.get_candlestick")
     def get_candlestick(self, candle_type):
         """ 最新のチャート情報（ロウソク）を今日と昨日の２日分取得する。
         ・サンプル
@@ -112,53 +413,17 @@ class MyTechnicalAnalysisUtil:
             222  65.401  65.420  65.334  65.368  35837.8861  1527738120000
             223  65.368  65.368  65.208  65.272  70144.5507  1527738180000
         """
-        now = time.time()
-        now_utc = datetime.utcfromtimestamp(now)
-
-        yyyymmdd = now_utc.strftime('%Y%m%d')
-        # self.myLogger.debug(
-        #    "yyyymmdd={0} candle_type={1}".format(yyyymmdd, candle_type))
-        try:
-            candlestick = self.pubApi.get_candlestick(
-                "xrp_jpy", candle_type, yyyymmdd)
-        except ConnectionResetError as cre:
-            self.myLogger.exception("get_canlestickでエラー。再実行します", cre)
-            candlestick = self.pubApi.get_candlestick(
-                "xrp_jpy", candle_type, yyyymmdd)
-
-        ohlcv = candlestick["candlestick"][0]["ohlcv"]
-        df_ohlcv = pd.DataFrame(ohlcv,
-                                columns=["open",    # 始値
-                                         "hight",   # 高値
-                                         "low",     # 安値
-                                         "close",   # 終値
-                                         "amount",  # 出来高
-                                         "time"])   # UnixTime
-
+        now_utc = datetime.utcfromtimestamp(time.time())
         yesterday = now_utc - timedelta(days=1)
-        str_yesterday = yesterday.strftime('%Y%m%d')
-        try:
-            yday_candlestick = self.pubApi.get_candlestick(
-                "xrp_jpy", candle_type, str_yesterday)
-        except ConnectionResetError as cre:
-            self.myLogger.exception(
-                "get_canlestick(yesterday)でエラー。再実行します", cre)
-            candlestick = self.pubApi.get_candlestick(
-                "xrp_jpy", candle_type, str_yesterday)
-
-        yday_ohlcv = yday_candlestick["candlestick"][0]["ohlcv"]
-        df_yday_ohlcv = pd.DataFrame(yday_ohlcv,
-                                     columns=["open",      # 始値
-                                              "hight",     # 高値
-                                              "low",       # 安値
-                                              "close",     # 終値
-                                              "amount",    # 出来高
-                                              "time"])     # UnixTime
-        df_yday_ohlcv.append(df_ohlcv, ignore_index=True)  # 前日分追加
+        keys = [yesterday.strftime('%Y%m%d'), now_utc.strftime('%Y%m%d')]
+
+        ohlcv = self.fetch_ohlcv_keys("xrp_jpy", candle_type, keys)
+        df_ohlcv = self.to_dataframe(ohlcv).reset_index(drop=True)
 
         # self.myLogger.debug("ohlcv:\n{0}".format(df_ohlcv))
         return df_ohlcv
 
+    @timed("MTAU.get_ema")
     def get_ema(self, candle_type, n_short, n_long):
         """ EMA(指数平滑移動平均)を返却する
         計算式：EMA ＝ 1分前のEMA+α(現在の終値－1分前のEMA)
@@ -176,6 +441,7 @@ class MyTechnicalAnalysisUtil:
 
         return df_ema
 
+    @timed("MTAU.get_macd_cross_status")
     def get_macd_cross_status(self, candle_type):
         """
         ・シグナルをMACDが下から上へ抜けた時＝上昇トレンド(＝買いシグナル)
@@ -188,10 +454,17 @@ class MyTechnicalAnalysisUtil:
 
         # self.myLogger.debug(
         #    "\n======== macd_head =======\n\n {0}".format(mhd))
-        condition_1 = (mhd["diff"].values[0] <= -0.001) and (
-            mhd["diff"].values[1] > -0.001)  # 買いシグナル
-        condition_2 = (mhd["diff"].values[0] >= 0.001) and (
-            mhd["diff"].values[1] < 0.001)  # 売りシグナル
+        status = self.judge_macd_cross(mhd["diff"].values[0],
+                                       mhd["diff"].values[1])
+
+        # self.myLogger.debug("MACD Status:{0}".format(status))
+        return status
+
+    @staticmethod
+    def judge_macd_cross(pre_diff, diff):
+        """ MACD-シグナル の1本前と最新の値からクロス状態を判定する """
+        condition_1 = (pre_diff <= -0.001) and (diff > -0.001)  # 買いシグナル
+        condition_2 = (pre_diff >= 0.001) and (diff < 0.001)    # 売りシグナル
 
         status = MacdCross.OTHER
         if condition_1:
@@ -201,9 +474,9 @@ class MyTechnicalAnalysisUtil:
             # dead cross
             status = MacdCross.DEAD
 
-        # self.myLogger.debug("MACD Status:{0}".format(status))
         return status
 
+    @timed("MTAU.get_macd")
     def get_macd(self, candle_type):
         """ MACD:MACDはEMA（指数平滑移動平均）の長期と短期の値を用いており、主にトレンドの方向性や転換期を見極める指標
         計算式
@@ -223,33 +496,39 @@ class MyTechnicalAnalysisUtil:
 
         return df_ema
 
+    @timed("MTAU.get_rsi")
     def get_rsi(self, candle_type, pair="xrp_jpy"):
         """ RSI：50%を中心にして上下に警戒区域を設け、70%以上を買われすぎ、30%以下を売られすぎと判断します。
         計算式：RSI＝直近N日間の上げ幅合計の絶対値/（直近N日間の上げ幅合計の絶対値＋下げ幅合計の絶対値）×100
         参考
         http://www.algo-fx-blog.com/rsi-python-ml-features/
         """
-        n = 24
-        df_ohlcv = self.get_candlestick_n(candle_type, n, pair)
-        df_close = df_ohlcv["close"].astype('float')
-        df_diff = df_close.diff()
-
-        # 最初のレコードが欠損してしまうので落としてあげる
-        df_diff = df_diff[1:]
-
-        # 値上がり幅、値下がり幅をシリーズへ切り分け
-        up, down = df_diff.copy(), df_diff.copy()
-        up[up < 0] = 0
-        down[down > 0] = 0
-
-        up_sma_14 = up.rolling(window=14, center=False).mean()  # mean:平均を計算
-        down_sma_14 = down.abs().rolling(window=14, center=False).mean()
-
-        df_rs = up_sma_14 / down_sma_14
-        df_rsi = 100.0 - (100.0 / (1.0 + df_rs))
-
-        return df_rsi[-1:].values.tolist()[0]  # 最新のRSIを返却（最終行）
-
+        rsi = self.get_rsi_series(candle_type, 24, self.RSI_N, "sma", pair)
+        return rsi.iloc[-1]  # 最新のRSIを返却（最終行）
+
+    @timed("MTAU.get_rsi_series")
+    def get_rsi_series(self, candle_type, count, n=14, method="sma",
+                       pair="xrp_jpy"):
+        """ 最新（未確定含む）からcount本分の全期間のRSIを返却する
+        戻り値: ロウソクと同じindexのSeries（先頭のn本はNaN）
+        method: "sma"（単純移動平均 get_rsiと同じ）、"wilder"、"ema"
+        同じロウソク（最新の時刻・終値が同じ）に対する２回目以降の呼び出しは
+        計算せずに前回の結果を返却する。
+        """
+        df = self.get_candlestick_n(candle_type, count, pair)
+        key = (pair, candle_type, count, n, method)
+        candles = (len(df), df["time"].values[-1], df["close"].values[-1])
+        with self._rsi_lock:
+            memo = self._rsi_series.get(key)
+            if memo is not None and memo[0] == candles:
+                return memo[1]
+        rsi = pd.Series(rolling_rsi(df["close"].values, n, method),
+                        index=df.index)
+        with self._rsi_lock:
+            self._rsi_series[key] = (candles, rsi)
+        return rsi
+
+    @timed("MTAU.get_rci")
     def get_rci(self, candle_type, pair="xrp_jpy"):
         """ RCI：RCIとは“Rank Correlation Index”の略です。日本語でいうと「順位相関係数」となります。
             日付（時間）と価格それぞれに順位をつけることによって、両者にどれだけの相関関係があるのかを計算し、
@@ -269,7 +548,8 @@ class MyTechnicalAnalysisUtil:
         df = df.sort_values("time", ascending=False)  # 降順
         df["a"] = np.arange(1, len(df)+1)
 
-        df = df.sort_values("close", ascending=False)  # 降順
+        # 降順（同値の場合は新しいロウソクを上位にするため安定ソート）
+        df = df.sort_values("close", ascending=False, kind="stable")
         df["b"] = np.arange(1, len(df)+1)
 
         df["a-b"] = df["a"] - df["b"]
@@ -282,6 +562,20 @@ class MyTechnicalAnalysisUtil:
         # self.myLogger.debug("df_rci:{0}　y:{1}".format(df, y))
         return rci
 
+    @timed("MTAU.get_rci_series")
+    def get_rci_series(self, candle_type, n, windows=(9, 26, 52),
+                       pair="xrp_jpy", ties="newest"):
+        """ 最新（未確定含む）からn本分の全期間のRCIをまとめて返却する
+        戻り値: ロウソクと同じindexのDataFrame（列 "rci_9" など 窓の長さごと）
+        get_rciと違い、全ての窓を１回で計算する（rolling_rci）。
+        各列の先頭（窓の長さ-1本）はNaNになる。
+        ties: 同値の終値の順位（"newest":新しい順 get_rciと同じ "average":平均）
+        """
+        df = self.get_candlestick_n(candle_type, n, pair)
+        closes = df["close"].values
+        return pd.DataFrame({"rci_{0}".format(w): rolling_rci(closes, w, ties)
+                             for w in windows}, index=df.index)
+
 
 if __name__ == '__main__':
     t = MyTechnicalAnalysisUtil()
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+
+from accountState import AccountState
+from bitbankHttp import BitbankError
+
+
+def make_state(clock):
+    calls = []
+
+    def get_asset():
+        calls.append(1)
+        return {"assets": [{"asset": "jpy", "onhand_amount": "1000"},
+                           {"asset": "xrp", "onhand_amount": "10"},
+                           {"asset": "bcc", "onhand_amount": "1"}]}
+
+    def get_last(pair):
+        if pair == "xrp_jpy":
+            return 50.0
+        raise BitbankError(10000)
+
+    return AccountState(get_asset, get_last, 60.0, clock), calls
+
+
+def test_account_state_cache_and_ttl():
+    now = [1000.0]
+    state, calls = make_state(lambda: now[0])
+    assert state.get_total_assets() == 1000 + 10 * 50.0
+    assert state.get_onhand_amount("xrp") == 10.0
+    assert state.get_onhand_amount("btc") == 0.0
+    assert len(calls) == 1
+
+    now[0] = now[0] + 60.0
+    state.get_assets()
+    assert len(calls) == 2
+    assert state.get_stats() == {"hits": 2, "refreshes": 2,
+                                 "invalidations": 0}
+
+
+def test_account_state_invalidate_on_fill():
+    state, calls = make_state(lambda: 1000.0)
+    state.get_assets()
+    # 約定していない注文（取消）では取得し直さない
+    state.on_order_completed({"status": "CANCELED_UNFILLED",
+                              "executed_amount": "0"})
+    state.get_assets()
+    assert len(calls) == 1
+    state.on_order_completed({"status": "FULLY_FILLED",
+                              "executed_amount": "1"})
+    state.get_assets()
+    state.get_assets()
+    assert len(calls) == 2
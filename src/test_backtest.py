@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+
+from backtest import Backtester, calc_indicators, rolling_rci
+from streamingIndicator import IndicatorEngine
+from strategyParams import StrategyParams
+
+
+def make_closes(count, seed=0):
+    rs = np.random.RandomState(seed)
+    return np.round(60.0 + np.cumsum(rs.randn(count) * 0.05), 2)
+
+
+def test_calc_indicators_matches_engine():
+    closes = make_closes(500)
+    indicators = calc_indicators(closes, StrategyParams())
+
+    engine = IndicatorEngine()
+    for i, close in enumerate(closes):
+        engine.update(i * 60000, close)
+        assert np.isclose(engine.macd, indicators["macd"][i])
+        assert np.isclose(engine.signal, indicators["signal"][i])
+        assert np.isclose(engine.ema_diff_abs_sum,
+                          indicators["ema_abs_sum"][i])
+        assert np.isclose(engine.rsi, indicators["rsi"][i], equal_nan=True)
+        assert np.isclose(engine.rci, indicators["rci"][i], equal_nan=True)
+
+
+def test_rolling_rci():
+    assert np.isnan(rolling_rci([1.0, 2.0, 3.0], 9)).all()
+    rci = rolling_rci(np.arange(20, dtype=float), 9)
+    assert np.isnan(rci[:8]).all()
+    assert np.allclose(rci[8:], 100.0)
+
+
+def test_backtester():
+    closes = make_closes(20000, seed=3)
+    times = np.arange(len(closes)) * 60000
+    result = Backtester().run(times, closes)
+
+    trades = result.trades
+    assert len(trades) > 0
+    assert (trades["sell_time"] > trades["buy_time"]).all()
+    buy_times = trades["buy_time"].values
+    sell_times = trades["sell_time"].values
+    assert (buy_times[1:] > sell_times[:-1]).all()
+    assert np.isclose(result.pnl, trades["profit"].sum())
+    assert result.max_drawdown >= 0.0
+
+    summary = result.summary()
+    assert summary["trades"] == len(trades)
+
+    assert set(trades["reason"]) == {"sell"}
+
+    result_sl = Backtester(use_stop_loss=True).run(times, closes)
+    assert set(result_sl.trades["reason"]) <= {"sell", "stop_loss"}
@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+
+from collections import OrderedDict
+
+from benchmark import (Benchmark, make_synthetic_fixture, load_fixture,
+                       save_baseline, load_baseline, compare)
+
+
+def test_benchmark(tmp_path):
+    fixture_dir = str(tmp_path / "fixture")
+    make_synthetic_fixture(fixture_dir, days=2)
+    records, tickers = load_fixture(fixture_dir)
+    assert len(records) == 2 * 1440
+    assert len(tickers) == 1000
+
+    sizes = OrderedDict([("1hour", 60), ("3day", 1440 * 3)])
+    results = Benchmark(records, tickers, sizes=sizes, min_time=0.01,
+                        repeat=1).run()
+    assert len(results) == 2 * 7
+    assert set(results["operation"]) == {
+        "get_ema", "get_macd", "get_macd_cross_status", "get_rsi",
+        "get_rci", "is_buy_order", "is_waittig_sell_order"}
+    # フィクスチャより多い本数は全ロウソクで計測する
+    assert results["candles"].tolist() == [60] * 7 + [2 * 1440] * 7
+    assert (results["ops_per_sec"] > 0).all()
+    assert (results["alloc_kib"] > 0).all()
+
+    path = str(tmp_path / "baseline.json")
+    save_baseline(results, path)
+    baseline = load_baseline(path)
+    assert len(compare(results, baseline)) == 0
+
+    # 速度が半分・割り当てが２倍になった処理を劣化として検出する
+    slower = results.copy()
+    slower.loc[0, "ops_per_sec"] = slower.loc[0, "ops_per_sec"] / 2
+    slower.loc[3, "alloc_kib"] = slower.loc[3, "alloc_kib"] * 2
+    regressions = compare(slower, baseline, 0.2)
+    assert regressions["operation"].tolist() == ["get_ema", "get_rsi"]
+    assert len(compare(slower, baseline, 1.5)) == 0
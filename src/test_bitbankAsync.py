@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+import hashlib
+import hmac
+
+from bitbankAsync import AsyncAutoTrader, make_auth_headers
+from bitbankAutoOrder import AutoTrader, Order
+
+
+class FakeAsyncBitbank:
+    """ AsyncBitbankの代わり（通信しない） """
+
+    def __init__(self):
+        self.orders = []
+        self.closed = False
+
+    async def get_xrp_jpy_value(self):
+        await asyncio.sleep(0)
+        return 50.1, 50.2, 50.0
+
+    async def get_candlestick(self, pair, candle_type, yyyymmdd):
+        ohlcv = [["50", "50", "50", str(50 + (i % 5) * 0.01), "1", i * 60000]
+                 for i in range(100)]
+        return {"candlestick": [{"type": candle_type, "ohlcv": ohlcv}]}
+
+    async def order(self, pair, price, amount, side, order_type):
+        self.orders.append(side)
+        return {"pair": pair, "order_id": len(self.orders)}
+
+    async def get_order(self, pair, order_id):
+        return {"order_id": order_id, "pair": pair, "side": "buy",
+                "type": "market", "average_price": "50.1",
+                "remaining_amount": "0", "executed_amount": "1",
+                "status": "FULLY_FILLED"}
+
+    async def close(self):
+        self.closed = True
+
+
+def test_make_auth_headers():
+    headers = make_auth_headers("key", "secret", "/v1/user/assets", "1000")
+    expected = hmac.new(b"secret", b"1000/v1/user/assets",
+                        hashlib.sha256).hexdigest()
+    assert headers["ACCESS-KEY"] == "key"
+    assert headers["ACCESS-NONCE"] == "1000"
+    assert headers["ACCESS-SIGNATURE"] == expected
+
+
+def test_async_auto_trader(monkeypatch):
+    notified = []
+    monkeypatch.setattr(AutoTrader, "is_buy_order",
+                        lambda self, snapshot=None: True)
+    monkeypatch.setattr(AutoTrader, "is_waittig_sell_order",
+                        lambda self, order, snapshot=None: False)
+    monkeypatch.setattr(AutoTrader, "notify_buy",
+                        lambda self, order: notified.append("buy"))
+    monkeypatch.setattr(AutoTrader, "notify_sell",
+                        lambda self, order: notified.append("sell"))
+
+    od = Order()
+    bitbank = FakeAsyncBitbank()
+    at = AsyncAutoTrader(od, AutoTrader(od), bitbank)
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        count = loop.run_until_complete(
+            asyncio.wait_for(at.run(2), timeout=10))
+    finally:
+        loop.close()
+        asyncio.set_event_loop(None)
+
+    assert count == 2
+    assert bitbank.orders == ["buy", "sell", "buy", "sell"]
+    assert notified == ["buy", "sell", "buy", "sell"]
+    assert at.engine.count == 100
+    assert bitbank.closed
@@ -1,6 +1,11 @@
 # -*- coding: utf-8 -*-
 
-from bitbankAutoOrder import Bitbank, AutoTrader, Order
+from bitbankAutoOrder import (Bitbank, AutoTrader, Order, TickerBoard,
+                              MultiPairTrader)
+from bitbankHttp import BitbankError
+from myUtil import Line
+from streamingIndicator import IndicatorEngine
+from technicalAnalysis import MyTechnicalAnalysisUtil
 
 
 def test_patch_get_xrp_jpy_value(monkeypatch):
@@ -170,3 +175,153 @@ def test_is_waittig_sell_order():
     od.sell_result = sell_order_result
     ao = AutoTrader(od)
     ao.is_waittig_sell_order(od)
+
+
+def test_market_snapshot(monkeypatch):
+    """ 1tickの判定はティッカー1回分のsnapshotを共有する """
+    calls = []
+
+    def get_ticker_value(self, pair):
+        calls.append(pair)
+        return 50.1, 53.1, 49.2
+
+    engine = IndicatorEngine()
+    for i in range(60):
+        engine.update(i * 60000, 50.0 + (i % 7) * 0.01)
+    monkeypatch.setattr(Bitbank, 'get_ticker_value', get_ticker_value)
+    monkeypatch.setattr(MyTechnicalAnalysisUtil, 'get_indicator_engine',
+                        lambda self, candle_type, pair="xrp_jpy",
+                        params=None: engine)
+
+    od = Order()
+    ao = AutoTrader(od)
+    snapshot = ao.get_market_snapshot()
+    assert (snapshot.last, snapshot.sell, snapshot.buy) == (50.1, 53.1, 49.2)
+    assert snapshot.rsi == engine.rsi
+    assert snapshot.latency >= 0.0
+
+    order_result = {
+        "order_id": 43763954,
+        "pair": "xrp_jpy",
+        "side": "buy",
+        "type": "market",
+        "price": "60.0",
+        "start_amount": "1.000000",
+        "remaining_amount": "0.000000",
+        "executed_amount": "1.000000",
+        "status": "FULLY_FILLED"
+    }
+    od.buy_result = order_result
+    ao.is_buy_order(snapshot)
+    ao.is_fully_filled(order_result, snapshot)
+    ao.is_stop_loss(order_result, snapshot)
+    ao.is_buy_order_cancel(order_result, snapshot)
+    ao.is_waittig_sell_order(od, snapshot)
+    assert calls == ["xrp_jpy"]
+
+
+class FakePubApi:
+    """ /tickers で全ペアを返却するテスト用の公開API """
+
+    def __init__(self):
+        self.calls = []
+
+    def get_tickers(self):
+        self.calls.append("tickers")
+        return [{"pair": "xrp_jpy", "last": "50.1", "sell": "50.2",
+                 "buy": "50.0"},
+                {"pair": "btc_jpy", "last": "700000", "sell": "700010",
+                 "buy": "699990"}]
+
+    def get_ticker(self, pair):
+        self.calls.append(pair)
+        return {"last": "1.0", "sell": "1.1", "buy": "0.9"}
+
+
+def test_ticker_board():
+    now = [100.0]
+    api = FakePubApi()
+    board = TickerBoard(api, ttl_sec=1.0, clock=lambda: now[0])
+
+    assert board.get_ticker("xrp_jpy")["last"] == "50.1"
+    assert board.get_ticker("btc_jpy")["last"] == "700000"  # 一括取得済み
+    assert api.calls == ["tickers"]
+    assert (board.hits, board.misses) == (1, 1)
+
+    # /tickers に無いペアは個別に取得する
+    assert board.get_ticker("mona_jpy")["last"] == "1.0"
+    assert api.calls == ["tickers", "tickers", "mona_jpy"]
+
+    now[0] = 101.5
+    board.get_ticker("btc_jpy")
+    assert api.calls[-1] == "tickers"
+
+
+def test_multi_pair_trader(monkeypatch):
+    calls = []
+    monkeypatch.setattr(AutoTrader, 'buy_order',
+                        lambda self: calls.append(("buy", self.pair)))
+    monkeypatch.setattr(AutoTrader, 'sell_order',
+                        lambda self: calls.append(("sell", self.pair)))
+    monkeypatch.setattr(Bitbank, 'get_active_orders',
+                        lambda self, pair='xrp_jpy': {"orders": []})
+
+    mpt = MultiPairTrader({"xrp_jpy": "1", "btc_jpy": "0.0001"})
+    xrp = mpt.traders["xrp_jpy"]
+    btc = mpt.traders["btc_jpy"]
+    assert xrp.bitbank is btc.bitbank
+    assert xrp.mtau is btc.mtau
+    assert xrp.order is not btc.order
+    assert btc.get_buy_order_info()["pair"] == "btc_jpy"
+    assert btc.get_sell_order_info()["amount"] == "0.0001"
+
+    assert mpt.run(2) == {"xrp_jpy": 2, "btc_jpy": 2}
+    expected = [("buy", "xrp_jpy"), ("sell", "xrp_jpy"),
+                ("buy", "btc_jpy"), ("sell", "btc_jpy")] * 2
+    assert sorted(calls) == sorted(expected)
+    assert mpt.errors == {}
+
+
+def test_multi_pair_trader_error(monkeypatch):
+    """ 例外が発生したペアは直ちに通知し、他のペアは停止する """
+    notified = []
+
+    def buy_order(self):
+        if self.pair == "btc_jpy":
+            raise ValueError("btc error")
+
+    monkeypatch.setattr(AutoTrader, 'buy_order', buy_order)
+    monkeypatch.setattr(AutoTrader, 'sell_order', lambda self: None)
+    monkeypatch.setattr(Bitbank, 'get_active_orders',
+                        lambda self, pair='xrp_jpy': {"orders": []})
+    monkeypatch.setattr(Line, 'notify_line_stamp',
+                        lambda self, msg, package_id, sticker_id:
+                        notified.append(msg))
+
+    mpt = MultiPairTrader({"xrp_jpy": "1", "btc_jpy": "0.0001"})
+    counts = mpt.run(10000)
+    mpt.line.flush()
+    assert counts["btc_jpy"] == 1
+    assert counts["xrp_jpy"] < 10000
+    assert list(mpt.errors) == ["btc_jpy"]
+    assert len(notified) == 1 and "btc error" in notified[0]
+
+
+def test_get_total_assets_all_pairs():
+    """ 円以外の資産は <資産>_jpy の現在値で換算する """
+    class FakePrvApi:
+        def get_asset(self):
+            return {"assets": [{"asset": "jpy", "onhand_amount": "1000"},
+                               {"asset": "xrp", "onhand_amount": "10"},
+                               {"asset": "btc", "onhand_amount": "0.001"},
+                               {"asset": "mona", "onhand_amount": "0"},
+                               {"asset": "bcc", "onhand_amount": "1"}]}
+
+    class NoPairPubApi(FakePubApi):
+        def get_ticker(self, pair):
+            raise BitbankError(10000)
+
+    bb = Bitbank()
+    bb.prvApi = FakePrvApi()
+    bb.ticker_board = TickerBoard(NoPairPubApi())
+    assert bb.get_total_assets() == 1000 + 10 * 50.1 + 0.001 * 700000
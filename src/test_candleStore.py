@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+
+from candleStore import CandleStore, CANDLE_DTYPE, to_records
+
+
+def make_ohlcv(start_ms, count, close="65.4"):
+    return [["65.3", "65.5", "65.2", close, "1000.0", start_ms + i * 60000]
+            for i in range(count)]
+
+
+def test_append_and_load(tmp_path):
+    store = CandleStore(str(tmp_path))
+    day1 = 1528329600000  # 2018/06/07 00:00 UTC
+    day2 = day1 + 86400000
+    store.append("xrp_jpy", "1min", "20180607", make_ohlcv(day1, 1440))
+    store.append("xrp_jpy", "1min", "20180608", make_ohlcv(day2, 1440))
+    store.append("xrp_jpy", "1min", "20180608", make_ohlcv(day2, 1440))  # 保存済み
+
+    # 別インスタンスでもメモリマップで読み込める
+    store = CandleStore(str(tmp_path))
+    assert store.get_keys("xrp_jpy", "1min") == {"20180607", "20180608"}
+    records = store.load("xrp_jpy", "1min")
+    assert isinstance(records, np.memmap)
+    assert records.dtype == CANDLE_DTYPE
+    assert len(records) == 2880
+    assert records["close"][0] == 65.4
+
+    records = store.read_range("xrp_jpy", "1min", day1 + 60000 * 10, day2)
+    assert len(records) == 1430
+    assert records["time"][0] == day1 + 60000 * 10
+
+
+def test_read_range_out_of_order(tmp_path):
+    store = CandleStore(str(tmp_path))
+    day1 = 1528329600000
+    day2 = day1 + 86400000
+    store.append("btc_jpy", "1hour", "20180608", make_ohlcv(day2, 24, "2"))
+    store.append("btc_jpy", "1hour", "20180607", make_ohlcv(day1, 24, "1"))
+
+    records = store.read_range("btc_jpy", "1hour", day1, day2 + 86400000)
+    assert np.all(np.diff(records["time"]) > 0)
+    assert len(records) == 48
+    assert records["close"][0] == 1.0
+    assert records["close"][-1] == 2.0
+
+
+def test_to_records():
+    records = to_records([["1", "2", "0.5", "1.5", "10", 1528329600000]])
+    assert records["time"][0] == 1528329600000
+    assert records["hight"][0] == 2.0
+    assert len(to_records([])) == 0
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+
+import json
+import threading
+from socketserver import ThreadingMixIn
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+
+from bitbankHttp import (BitbankPublic, BitbankPrivate, BitbankError,
+                         make_auth_headers)
+from httpSession import HttpSession
+from myUtil import Line
+
+
+class Handler(BaseHTTPRequestHandler):
+    """ keep-aliveで応答するテスト用のサーバ """
+    protocol_version = "HTTP/1.1"
+    received = []
+
+    def reply(self, result):
+        body = json.dumps(result).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self.received.append(("GET", self.path, dict(self.headers), None))
+        if self.path == "/error":
+            self.reply({"success": 0, "data": {"code": 10000}})
+        else:
+            self.reply({"success": 1, "data": {"path": self.path}})
+
+    def do_POST(self):
+        length = int(self.headers["Content-Length"])
+        body = self.rfile.read(length).decode("utf-8")
+        self.received.append(("POST", self.path, dict(self.headers), body))
+        self.reply({"success": 1, "data": {"path": self.path}})
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ThreadingServer(ThreadingMixIn, HTTPServer):
+    """ keep-aliveの接続ごとにスレッドで応答する """
+    daemon_threads = True
+
+
+@pytest.fixture
+def server():
+    Handler.received = []
+    httpd = ThreadingServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield "http://127.0.0.1:{0}".format(httpd.server_port)
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_http_session_reuses_connection(server):
+    session = HttpSession(pool_maxsize=2, timeout=1.0)
+    for i in range(5):
+        assert session.get(server + "/xrp_jpy/ticker").status_code == 200
+    stats = session.get_stats()
+    assert stats == {"requests": 5, "connections": 1, "reused": 4,
+                     "reuse_ratio": 0.8}
+    session.close()
+
+
+def test_bitbank_public(server):
+    session = HttpSession()
+    api = BitbankPublic(session, server)
+    try:
+        assert api.get_ticker("xrp_jpy") == {"path": "/xrp_jpy/ticker"}
+        assert api.get_candlestick("xrp_jpy", "1min", "20180601") == \
+            {"path": "/xrp_jpy/candlestick/1min/20180601"}
+        with pytest.raises(BitbankError) as e:
+            api._query("/error")
+        assert e.value.code == 10000
+    finally:
+        session.close()
+
+
+def test_bitbank_private(server):
+    session = HttpSession()
+    api = BitbankPrivate("key", "secret", session, server + "/v1")
+    try:
+        assert api.get_order("xrp_jpy", 1) == \
+            {"path": "/v1/user/spot/order?pair=xrp_jpy&order_id=1"}
+        api.order("xrp_jpy", None, "1", "buy", "market")
+    finally:
+        session.close()
+
+    method, path, headers, body = Handler.received[0]
+    expected = make_auth_headers("key", "secret", path,
+                                 headers["ACCESS-NONCE"])
+    assert headers["ACCESS-SIGNATURE"] == expected["ACCESS-SIGNATURE"]
+
+    method, path, headers, body = Handler.received[1]
+    assert (method, path) == ("POST", "/v1/user/spot/order")
+    assert json.loads(body)["side"] == "buy"
+    expected = make_auth_headers("key", "secret", body,
+                                 headers["ACCESS-NONCE"])
+    assert headers["ACCESS-SIGNATURE"] == expected["ACCESS-SIGNATURE"]
+
+
+def test_line_uses_session():
+    class FakeSession:
+        def __init__(self):
+            self.calls = []
+
+        def post(self, url, **kwargs):
+            self.calls.append((url, kwargs["data"]))
+
+    session = FakeSession()
+    line = Line(session)
+    line.line_notify_token = "token"
+    line.notify_line_stamp("msg", "1", "2")
+    payload = {"message": "msg", "stickerPackageId": "1", "stickerId": "2"}
+    url = "https://notify-api.line.me/api/notify"
+    assert session.calls == [(url, payload)]
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from indicatorSeries import sliding_windows, rolling_rci, rolling_rsi, \
+    rolling_macd
+from streamingIndicator import StreamingRci, StreamingRsi
+
+
+def make_closes(count, seed=0):
+    rs = np.random.RandomState(seed)
+    # 小数1桁に丸めて同値の終値を多く含める
+    return np.round(60.0 + np.cumsum(rs.randn(count) * 0.05), 1)
+
+
+def test_sliding_windows():
+    windows = sliding_windows(np.arange(5), 3)
+    assert windows.tolist() == [[0, 1, 2], [1, 2, 3], [2, 3, 4]]
+    panel = sliding_windows(np.arange(10).reshape(2, 5), 4)
+    assert panel.shape == (2, 2, 4)
+    assert panel[1, 1].tolist() == [6, 7, 8, 9]
+
+
+@pytest.mark.parametrize("n", [9, 26, 52])
+def test_rolling_rci_matches_streaming(n):
+    closes = make_closes(3000)
+    rci = StreamingRci(n)
+    expected = [rci.append(close) for close in closes]
+    assert np.allclose(rolling_rci(closes, n), expected, equal_nan=True)
+
+
+def test_rolling_rci_average_ties():
+    closes = make_closes(300, seed=1)
+    n = 26
+    rci = rolling_rci(closes, n, ties="average")
+    a = np.arange(n, 0, -1)
+    for end in (n - 1, 150, 299):
+        window = pd.Series(closes[end - n + 1:end + 1])
+        b = window.rank(ascending=False, method="average").values
+        y = ((a - b) ** 2).sum()
+        assert np.isclose(rci[end], (1 - 6 * y / (n * (n ** 2 - 1))) * 100)
+
+    # 全て同値の場合、新しい順では上昇トレンド（100）と同じ順位になる
+    assert np.isclose(rolling_rci(np.ones(9), 9)[-1], 100.0)
+    assert np.isclose(rolling_rci(np.ones(9), 9, ties="average")[-1], 50.0)
+    with pytest.raises(ValueError):
+        rolling_rci(closes, 9, ties="min")
+
+
+def test_rolling_rci_panel():
+    closes = make_closes(200)
+    panel = np.vstack([closes, closes[::-1], closes])
+    panel[2, 50] = np.nan
+    rci = rolling_rci(panel, 9)
+    assert rci.shape == panel.shape
+    assert np.allclose(rci[0], rolling_rci(closes, 9), equal_nan=True)
+    assert np.allclose(rci[1], rolling_rci(closes[::-1], 9), equal_nan=True)
+    # 欠損を含む窓のみNaN
+    assert np.isnan(rci[2, 50:59]).all()
+    assert np.allclose(rci[2, 59:], rci[0, 59:])
+
+
+@pytest.mark.parametrize("method", ["sma", "wilder"])
+def test_rolling_rsi_matches_streaming(method):
+    closes = make_closes(1000)
+    rsi = StreamingRsi(14, method)
+    expected = [rsi.append(close) for close in closes]
+    assert np.allclose(rolling_rsi(closes, 14, method), expected,
+                       equal_nan=True)
+
+
+def test_rolling_rsi_ema_and_panel():
+    closes = make_closes(300)
+    rsi = rolling_rsi(closes, 14, "ema")
+    assert np.isnan(rsi[:14]).all()
+    diff = pd.Series(closes).diff()
+    up = diff.clip(lower=0).ewm(span=14, adjust=False).mean()
+    down = (-diff).clip(lower=0).ewm(span=14, adjust=False).mean()
+    expected = (100.0 - 100.0 / (1.0 + up / down)).values
+    assert np.allclose(rsi[14:], expected[14:])
+
+    panel = np.vstack([closes, closes[::-1]])
+    for method in ("sma", "wilder", "ema"):
+        rsi = rolling_rsi(panel, 9, method)
+        assert rsi.shape == panel.shape
+        assert np.allclose(rsi[1], rolling_rsi(closes[::-1], 9, method),
+                           equal_nan=True)
+
+    # 上昇のみは100、変化なしはNaN
+    assert rolling_rsi(np.arange(20.0), 14)[-1] == 100.0
+    assert np.isnan(rolling_rsi(np.ones(20), 14)[-1])
+    with pytest.raises(ValueError):
+        rolling_rsi(closes, 14, "wma")
+
+
+def test_rolling_macd_matches_get_macd():
+    closes = make_closes(300)
+    close = pd.Series(closes)
+    expected = close.ewm(span=12).mean() - close.ewm(span=26).mean()
+    macd, signal = rolling_macd(closes)
+    assert np.allclose(macd, expected.values)
+    assert np.allclose(signal, expected.ewm(span=9).mean().values)
+
+    panel = np.vstack([closes, closes[::-1]])
+    macd, signal = rolling_macd(panel, 5, 10, 3)
+    assert macd.shape == panel.shape
+    assert np.allclose(signal[1], rolling_macd(closes[::-1], 5, 10, 3)[1])
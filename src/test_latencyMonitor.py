@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+
+import latencyMonitor
+from latencyMonitor import LatencyHistogram, LatencyMonitor, timed
+
+
+class FakeLogger:
+    def __init__(self):
+        self.messages = []
+
+    def info(self, msg):
+        self.messages.append(msg)
+
+
+def test_histogram_percentiles():
+    histogram = LatencyHistogram()
+    for i in range(1, 101):
+        histogram.record(i / 1000.0)
+    summary = histogram.get_summary()
+    assert summary["count"] == 100
+    assert summary["max"] == pytest.approx(0.1)
+    assert summary["mean"] == pytest.approx(0.0505)
+    assert summary["p50"] == pytest.approx(0.0505)
+    assert summary["p95"] == pytest.approx(0.09505)
+    assert summary["p99"] == pytest.approx(0.09901)
+
+
+def test_histogram_window():
+    # 百分位は直近window件、件数と最大は累計
+    histogram = LatencyHistogram(window=10)
+    histogram.record(5.0)
+    for i in range(10):
+        histogram.record(0.01)
+    summary = histogram.get_summary()
+    assert summary["count"] == 11
+    assert summary["max"] == 5.0
+    assert summary["p99"] == pytest.approx(0.01)
+
+
+def test_span_and_dump():
+    monitor = LatencyMonitor(summary_interval_sec=0)
+    with monitor.span("a"):
+        pass
+    monitor.record("b", 0.5)
+    dump = monitor.dump()
+    assert sorted(dump) == ["a", "b"]
+    assert dump["a"]["count"] == 1
+    assert dump["b"]["p50"] == 0.5
+
+
+def test_periodic_summary():
+    now = [1000.0]
+    logger = FakeLogger()
+    monitor = LatencyMonitor(summary_interval_sec=60, logger=logger,
+                             clock=lambda: now[0])
+    monitor.record("Bitbank.get_ticker_value", 0.02)
+    assert logger.messages == []
+    now[0] = now[0] + 60
+    monitor.record("Bitbank.get_ticker_value", 0.04)
+    assert len(logger.messages) == 1
+    assert "Bitbank.get_ticker_value n:2" in logger.messages[0]
+    monitor.record("Bitbank.get_ticker_value", 0.04)
+    assert len(logger.messages) == 1
+
+
+def test_request_summary():
+    # シグナルハンドラからは予約するだけで、ロック中でも待たない
+    logger = FakeLogger()
+    monitor = LatencyMonitor(summary_interval_sec=0, logger=logger)
+    with monitor._lock:
+        monitor.request_summary()
+    assert logger.messages == []
+    monitor.record("a", 0.01)
+    assert len(logger.messages) == 1
+    monitor.record("a", 0.01)
+    assert len(logger.messages) == 1
+
+
+def test_timed(monkeypatch):
+    monitor = LatencyMonitor(summary_interval_sec=0)
+    monkeypatch.setattr(latencyMonitor, "_monitor", monitor)
+
+    @timed("f")
+    def f(x):
+        if x < 0:
+            raise ValueError(x)
+        return x * 2
+
+    assert f(2) == 4
+    with pytest.raises(ValueError):
+        f(-1)
+    # 例外の場合も計測する
+    assert monitor.dump()["f"]["count"] == 2
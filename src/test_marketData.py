@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+
+import json
+
+from bitbankAutoOrder import Bitbank
+from marketData import MarketDataRecorder, ReplayMarketDataSource
+from streamingIndicator import IndicatorEngine
+from strategyParams import StrategyParams
+from technicalAnalysis import MyTechnicalAnalysisUtil, CandleCache
+
+
+def write_messages(path, count):
+    """ テスト用の記録ファイル（ティッカーと板情報） """
+    with open(path, "w") as f:
+        for i in range(count):
+            ticker = {"sell": str(50.2 + i), "buy": str(50.0 + i),
+                      "high": "60", "low": "40", "last": str(50.1 + i),
+                      "vol": "1000", "timestamp": 1528416000000 + i * 1000}
+            f.write(json.dumps({"t": 100.0 + i * 0.01, "channel": "ticker",
+                                "pair": "xrp_jpy", "data": ticker}) + "\n")
+        depth = {"asks": [["50.2", "10"]], "bids": [["50.0", "10"]]}
+        f.write(json.dumps({"t": 200.0, "channel": "depth",
+                            "pair": "btc_jpy", "data": depth}) + "\n")
+
+
+def test_replay_market_data_source(tmp_path):
+    path = str(tmp_path / "stream.jsonl")
+    write_messages(path, 5)
+
+    received = []
+    source = ReplayMarketDataSource(path, speed=0)
+    source.add_listener(lambda channel, pair, data: received.append(channel))
+    assert source.get_ticker("xrp_jpy") is None
+    source.start()
+    source.join(5)
+
+    assert received == ["ticker"] * 5  # 対象外のペアは再生しない
+    assert source.get_ticker("xrp_jpy")["last"] == "54.1"
+    assert source.get_ticker("xrp_jpy", max_age_sec=60) is not None
+    assert source.get_depth("btc_jpy") is None
+
+
+def test_market_data_recorder(tmp_path):
+    path = str(tmp_path / "stream.jsonl")
+    recorder = MarketDataRecorder(path)
+    recorder("ticker", "xrp_jpy", {"last": "50.1"})
+    recorder("depth", "xrp_jpy", {"asks": [], "bids": []})
+
+    source = ReplayMarketDataSource(path, speed=100.0)
+    source.start()
+    source.join(5)
+    assert source.get_ticker("xrp_jpy") == {"last": "50.1"}
+    assert source.get_depth("xrp_jpy") == {"asks": [], "bids": []}
+
+
+def test_indicator_engine_uses_pushed_ticker(tmp_path):
+    path = str(tmp_path / "stream.jsonl")
+    write_messages(path, 3)
+    source = ReplayMarketDataSource(path, speed=0)
+    source.start()
+    source.join(5)
+
+    calls = []
+
+    def fetcher(pair, candle_type, yyyymmdd):
+        calls.append(yyyymmdd)
+        return []
+
+    mtau = MyTechnicalAnalysisUtil(CandleCache(fetcher), market_data=source)
+    engine_spans = StrategyParams().get_indicator_spans()
+    engine = IndicatorEngine(*engine_spans)
+    engine.update(1528416000000, "49.0")
+    mtau.indicator_engines[("xrp_jpy", "1min", engine_spans)] = engine
+
+    # 同じ期間のティッカーが配信済みなのでリクエストしない
+    assert mtau.get_indicator_engine("1min") is engine
+    assert engine.close == 52.1
+    assert calls == []
+
+
+def test_bitbank_uses_pushed_ticker(tmp_path):
+    path = str(tmp_path / "stream.jsonl")
+    write_messages(path, 2)
+    source = ReplayMarketDataSource(path, speed=0)
+    source.start()
+    source.join(5)
+
+    bb = Bitbank(source)
+    assert bb.get_xrp_jpy_value() == (51.1, 51.2, 51.0)
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+
+import requests
+
+from latencyMonitor import LatencyMonitor
+from metricsServer import MetricsRegistry, MetricsServer, format_labels
+from requestScheduler import RequestScheduler
+
+
+def make_registry(clock=None):
+    monitor = LatencyMonitor(summary_interval_sec=0)
+    registry = MetricsRegistry(60.0, monitor, clock or (lambda: 1000.0))
+    return registry, monitor
+
+
+def test_format_labels():
+    assert format_labels({}) == ""
+    assert format_labels({"b": "x\"y", "a": 1}) == "{a=\"1\",b=\"x\\\"y\"}"
+
+
+def test_counters_and_rate():
+    now = [1000.0]
+    registry, _ = make_registry(lambda: now[0])
+    registry.inc("retries", {"site": "fetch_ohlcv"})
+    registry.inc("retries", {"site": "fetch_ohlcv"})
+    now[0] = now[0] + 30
+    for i in range(60):
+        registry.tick()
+    assert registry.get_rate() == 2.0
+    now[0] = now[0] + 61
+    assert registry.get_rate() == 0.0
+
+    text = registry.render()
+    assert "# TYPE bitbank_retries_total counter" in text
+    assert "bitbank_retries_total{site=\"fetch_ohlcv\"} 2" in text
+    assert "bitbank_ticks_total 60" in text
+    assert "bitbank_ticks_per_second 0.0" in text
+
+
+def test_stats_and_latency():
+    registry, monitor = make_registry()
+    registry.add_stats("candle_cache", lambda: {"hits": 3, "misses": 1,
+                                                "hit_ratio": 0.75})
+    registry.add_stats("scheduler", lambda: {"public": {"requests": 5},
+                                             "private_query": {"requests": 2}},
+                       "endpoint")
+    registry.add_stats("order_tracker", lambda: {"requests": 1,
+                                                 "intervals": {"a": 1}})
+    monitor.record("api.get_ticker", 0.25)
+    monitor.record("order.fill.buy", 1.5)
+
+    text = registry.render()
+    assert "bitbank_candle_cache_hit_ratio 0.75" in text
+    assert "bitbank_scheduler_requests{endpoint=\"public\"} 5" in text
+    assert "bitbank_scheduler_requests{endpoint=\"private_query\"} 2" in text
+    assert "bitbank_order_tracker_requests 1" in text
+    assert "intervals" not in text  # 数値以外は出力しない
+    assert "# TYPE bitbank_span_seconds summary" in text
+    assert ("bitbank_span_seconds{quantile=\"0.99\",span=\"api.get_ticker\"}"
+            " 0.25") in text
+    assert "bitbank_span_seconds_count{span=\"order.fill.buy\"} 1" in text
+    assert "process_start_time_seconds" in text
+
+
+def test_server():
+    registry, _ = make_registry()
+    registry.inc("retries")
+    server = MetricsServer(registry).start()
+    try:
+        response = requests.get(server.url, timeout=3)
+        assert response.status_code == 200
+        assert response.headers["Content-Type"].startswith("text/plain")
+        assert "bitbank_retries_total 1" in response.text
+        missing = requests.get(server.url.replace("/metrics", "/"),
+                               timeout=3)
+        assert missing.status_code == 404
+    finally:
+        server.stop()
+
+
+def test_scheduled_api_errors(monkeypatch):
+    import metricsServer
+    import latencyMonitor
+    registry, monitor = make_registry()
+    monkeypatch.setattr(metricsServer, "_metrics", registry)
+    monkeypatch.setattr(latencyMonitor, "_monitor", monitor)
+
+    class Api:
+        def get_ticker(self, pair):
+            raise ValueError(pair)
+
+        def get_depth(self, pair):
+            return {}
+
+    api = RequestScheduler().wrap_public(Api())
+    api.get_depth("xrp_jpy")
+    try:
+        api.get_ticker("xrp_jpy")
+    except ValueError:
+        pass
+    assert monitor.dump()["api.get_ticker"]["count"] == 1
+    assert monitor.dump()["api.get_depth"]["count"] == 1
+    assert "bitbank_api_errors_total{method=\"get_ticker\"} 1" in \
+        registry.render()
@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+
+import calendar
+from datetime import datetime
+
+import pytest
+
+from benchmark import make_synthetic_fixture
+from bitbankAutoOrder import Bitbank
+from bitbankHttp import BitbankPublic, BitbankPrivate, BitbankError
+from candleStore import CandleStore
+from httpSession import HttpSession
+from mockExchange import (MockExchange, MockExchangeServer, ERROR_BUSY,
+                          ERROR_INSUFFICIENT, ERROR_CANNOT_CANCEL)
+from technicalAnalysis import MyTechnicalAnalysisUtil
+
+
+@pytest.fixture(scope="module")
+def store(tmp_path_factory):
+    fixture_dir = str(tmp_path_factory.mktemp("fixture"))
+    make_synthetic_fixture(fixture_dir, days=4, start="20180101")
+    return CandleStore(fixture_dir)
+
+
+@pytest.fixture
+def now():
+    # 2020/01/10 12:00:30 UTC → 記録の 2018/01/03 12:00:30
+    return [calendar.timegm(datetime(2020, 1, 10, 12, 0, 30).timetuple())]
+
+
+def serve(exchange, **kwargs):
+    server = MockExchangeServer(exchange, **kwargs).start()
+    session = HttpSession()
+    pub = BitbankPublic(session, server.public_end_point)
+    prv = BitbankPrivate("key", "secret", session, server.private_end_point)
+    return server, session, pub, prv
+
+
+def test_mock_exchange_replay(store, now):
+    exchange = MockExchange(store, clock=lambda: now[0])
+    server, session, pub, prv = serve(exchange)
+    try:
+        ohlcv = pub.get_candlestick("xrp_jpy", "1min",
+                                    "20200110")["candlestick"][0]["ohlcv"]
+        # 現在時刻（12:00）までのロウソクを今日の時刻で返す
+        assert len(ohlcv) == 12 * 60 + 1
+        assert ohlcv[0][5] == calendar.timegm(
+            datetime(2020, 1, 10).timetuple()) * 1000
+        ticker = pub.get_ticker("xrp_jpy")
+        assert ticker["last"] == ohlcv[-1][3]
+        assert float(ticker["sell"]) > float(ticker["buy"])
+        assert pub.get_tickers()[0]["pair"] == "xrp_jpy"
+
+        hours = pub.get_candlestick("xrp_jpy", "1hour",
+                                    "20200109")["candlestick"][0]["ohlcv"]
+        assert len(hours) == 24
+        assert hours[0][0] == pub.get_candlestick(
+            "xrp_jpy", "1min", "20200109")["candlestick"][0]["ohlcv"][0][0]
+        assert pub.get_candlestick("xrp_jpy", "1min", "20200111") == \
+            {"candlestick": [{"type": "1min", "ohlcv": []}],
+             "timestamp": int(now[0] * 1000)}
+
+        # 時間が進むと価格も進む
+        now[0] = now[0] + 60
+        assert len(pub.get_candlestick(
+            "xrp_jpy", "1min",
+            "20200110")["candlestick"][0]["ohlcv"]) == 12 * 60 + 2
+        assert len(pub.get_depth("xrp_jpy")["asks"]) == 5
+    finally:
+        session.close()
+        server.stop()
+
+
+def test_mock_exchange_orders(store, now):
+    exchange = MockExchange(store, assets={"jpy": 1000.0},
+                            clock=lambda: now[0])
+    server, session, pub, prv = serve(exchange)
+    try:
+        last, sell, buy = exchange.get_quote("xrp_jpy")
+        order = prv.order("xrp_jpy", None, "10", "buy", "market")
+        assert order["status"] == "FULLY_FILLED"
+        assert float(order["average_price"]) == sell
+        assets = {a["asset"]: a for a in prv.get_asset()["assets"]}
+        assert float(assets["xrp"]["onhand_amount"]) == 10.0
+        assert float(assets["jpy"]["onhand_amount"]) == \
+            pytest.approx(1000.0 - 10 * sell)
+
+        # 現在値より高い指値の売りは約定待ちになり、資産はロックされる
+        limit = prv.order("xrp_jpy", str(last + 10), "10", "sell", "limit")
+        assert limit["status"] == "UNFILLED"
+        active = prv.get_active_orders("xrp_jpy")["orders"]
+        assert [o["order_id"] for o in active] == [limit["order_id"]]
+        info = prv.get_orders_info("xrp_jpy", [order["order_id"],
+                                               limit["order_id"]])
+        assert [o["status"] for o in info["orders"]] == \
+            ["FULLY_FILLED", "UNFILLED"]
+        with pytest.raises(BitbankError) as e:
+            prv.order("xrp_jpy", None, "1", "sell", "market")
+        assert e.value.code == ERROR_INSUFFICIENT
+
+        canceled = prv.cancel_order("xrp_jpy", limit["order_id"])
+        assert canceled["status"] == "CANCELED_UNFILLED"
+        with pytest.raises(BitbankError) as e:
+            prv.cancel_order("xrp_jpy", limit["order_id"])
+        assert e.value.code == ERROR_CANNOT_CANCEL
+
+        # 現在値以下の指値の売りはすぐに約定する
+        filled = prv.order("xrp_jpy", str(buy), "10", "sell", "limit")
+        assert prv.get_order("xrp_jpy", filled["order_id"])["status"] == \
+            "FULLY_FILLED"
+        assert server.get_stats()["order"] == 4
+    finally:
+        session.close()
+        server.stop()
+
+
+def test_mock_exchange_errors(store, now):
+    exchange = MockExchange(store, clock=lambda: now[0])
+    server, session, pub, prv = serve(exchange, error_rate=1.0, seed=0)
+    try:
+        with pytest.raises(BitbankError) as e:
+            pub.get_ticker("xrp_jpy")
+        assert e.value.code == ERROR_BUSY
+        assert server.get_stats()["errors"] == 1
+    finally:
+        session.close()
+        server.stop()
+
+
+def test_bitbank_uses_mock_exchange(store, monkeypatch):
+    exchange = MockExchange(store)  # 実際の時刻で再生する
+    server = MockExchangeServer(exchange).start()
+    monkeypatch.setenv("BITBANK_PUBLIC_END_POINT", server.public_end_point)
+    monkeypatch.setenv("BITBANK_PRIVATE_END_POINT", server.private_end_point)
+    try:
+        bitbank = Bitbank()
+        assert bitbank.get_total_assets() == 100000.0
+        last, sell, buy = bitbank.get_ticker_value("xrp_jpy")
+        assert last == exchange.get_last("xrp_jpy")
+
+        df = MyTechnicalAnalysisUtil().get_candlestick_n("1min", 30)
+        assert len(df) == 30
+    finally:
+        server.stop()
@@ -1,6 +1,11 @@
 # -*- coding: utf-8 -*-
 
-from myUtil import Line, MyLogger
+import io
+import json
+import time
+
+from myUtil import Line, MyLogger, LineNotifyQueue, configure_logging, \
+    flush_logs
 
 
 def test_notify_line():
@@ -19,3 +24,113 @@ def test_logger():
     ml.warning("WARNING")
     ml.info("INFO")
     ml.debug("DEBUG")
+
+
+class CountingStr:
+    def __init__(self):
+        self.count = 0
+
+    def __str__(self):
+        self.count = self.count + 1
+        return "x"
+
+
+def test_logger_handler_dedupe_and_lazy_args():
+    stream = io.StringIO()
+    configure_logging(stream, json_lines=False)
+    try:
+        MyLogger("Dedupe")
+        ml = MyLogger("Dedupe")
+        assert len(ml.logger.handlers) == 1
+
+        arg = CountingStr()
+        ml.logger.setLevel("INFO")
+        ml.debug("skip %s", arg)
+        assert arg.count == 0  # 出力しないDEBUGは展開しない
+        ml.info("rsi:%.1f %s", 19.54, arg)
+        flush_logs()
+        lines = stream.getvalue().splitlines()
+        assert len(lines) == 1
+        assert lines[0].endswith(" Dedupe INFO rsi:19.5 x")
+    finally:
+        configure_logging()
+
+
+def test_logger_json_lines():
+    stream = io.StringIO()
+    configure_logging(stream, json_lines=True)
+    try:
+        ml = MyLogger("Json")
+        ml.warning("注文 %s", "buy")
+        try:
+            raise ValueError("bad")
+        except ValueError as e:
+            ml.exception("失敗", e)
+        flush_logs()
+        logs = [json.loads(line) for line in stream.getvalue().splitlines()]
+        assert [(log["name"], log["level"], log["message"])
+                for log in logs] == [("Json", "WARNING", "注文 buy"),
+                                     ("Json", "ERROR", "失敗 bad")]
+        assert "ValueError: bad" in logs[1]["exception"]
+    finally:
+        configure_logging()
+
+
+class FakeLine:
+    def __init__(self):
+        self.sent = []
+
+    def notify_line_stamp(self, message, stickerPackageId, stickerId):
+        time.sleep(0.05)  # 遅いLINE
+        self.sent.append((message, stickerPackageId, stickerId))
+
+
+def test_line_notify_queue():
+    fake = FakeLine()
+    lq = LineNotifyQueue(fake, digest_sec=0.2)
+
+    start = time.time()
+    lq.notify_line("RSI 19.5")
+    lq.notify_line("RSI 19.5")
+    lq.notify_line_stamp(lambda: "総資産 1000円", "1", "10")
+    assert time.time() - start < 0.05  # 送信を待たない
+    lq.flush()
+
+    # ダイジェストにまとめ、同じ通知は件数を付けて１件にする
+    assert fake.sent == [("RSI 19.5（2件）\n総資産 1000円", "1", "10")]
+    stats = lq.get_stats()
+    assert (stats["queued"], stats["sent"], stats["coalesced"]) == (3, 1, 1)
+
+    lq.notify_line("終了")
+    lq.close()
+    assert fake.sent[-1] == ("終了", "", "")
+
+
+def test_line_notify_queue_stickers_and_close():
+    fake = FakeLine()
+    lq = LineNotifyQueue(fake, digest_sec=0.2)
+    lq.notify_line_stamp("利益 100円", "1", "10")
+    lq.notify_line("RSI 19.5")
+    lq.notify_line_stamp("損失 50円", "1", "104")
+    lq.notify_line_stamp("利益 30円", "1", "10")
+    lq.flush()
+    # スタンプが異なる通知は別々に送る
+    assert fake.sent == [("RSI 19.5\n利益 100円\n利益 30円", "1", "10"),
+                         ("損失 50円", "1", "104")]
+
+    lq.close()
+    lq.close()
+    try:
+        lq.notify_line("終了後")
+        assert False
+    except RuntimeError:
+        pass
+    lq.flush()  # 止まらない
+    assert lq.get_stats()["queued"] == 4
+
+
+def test_line_notify_queue_split_message():
+    lq = LineNotifyQueue(FakeLine(), digest_sec=0.0)
+    messages = lq.split_message(["a" * 600, "b" * 600, "c" * 1200])
+    assert messages == ["a" * 600, "b" * 600, "c" * 1000]
+    lq.close()
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+
+from backtest import Backtester
+from optimizer import Optimizer
+from strategyParams import StrategyParams
+
+
+def make_candles(count, seed=0):
+    rs = np.random.RandomState(seed)
+    closes = np.round(60.0 + np.cumsum(rs.randn(count) * 0.05), 2)
+    return np.arange(count) * 60000, closes
+
+
+def test_grid_search(tmp_path):
+    times, closes = make_candles(5000)
+    optimizer = Optimizer(times, closes, workers=2)
+    results = optimizer.grid_search({"benefit": [0.05, 0.097, 0.2],
+                                     "macd_short": [9, 12]})
+
+    assert len(results) == 6
+    assert results["pnl"].is_monotonic_decreasing
+    best = optimizer.get_best_params()
+    assert isinstance(best.macd_short, int)
+
+    # 並列に計算した結果と直接バックテストした結果が一致する
+    expected = Backtester(best).run(times, closes)
+    assert np.isclose(results["pnl"].iloc[0], expected.pnl)
+
+    # 保存したパラメータを読み込める
+    path = str(tmp_path / "params.json")
+    best.save(path)
+    assert StrategyParams.load(path) == best
+
+
+def test_random_search():
+    times, closes = make_candles(3000, seed=1)
+    optimizer = Optimizer(times, closes, workers=2)
+    results = optimizer.random_search({"benefit": (0.05, 0.2),
+                                       "rci_threshold": (80, 95),
+                                       "rsi_n": [9, 14]}, 8, seed=0)
+    assert len(results) == 8
+    assert results["benefit"].between(0.05, 0.2).all()
+    assert results["rci_threshold"].between(80, 95).all()
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+
+import threading
+from concurrent.futures import CancelledError
+
+import pytest
+
+from orderTracker import OrderTracker
+
+
+class FakePrvApi:
+    """ 指定回数の確認後に約定するテスト用のPrivate API """
+
+    def __init__(self, fill_after):
+        self.fill_after = fill_after  # key:注文ID value:約定までの確認回数
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def get_orders_info(self, pair, order_ids):
+        with self.lock:
+            self.calls.append((pair, sorted(order_ids)))
+            orders = []
+            for order_id in order_ids:
+                self.fill_after[order_id] = self.fill_after[order_id] - 1
+                status = "UNFILLED"
+                if self.fill_after[order_id] <= 0:
+                    status = "FULLY_FILLED"
+                orders.append({"order_id": order_id, "pair": pair,
+                               "type": "limit", "price": "100.0",
+                               "executed_amount": "0", "status": status})
+            return {"orders": orders}
+
+
+def test_order_tracker_batches_and_completes():
+    api = FakePrvApi({1: 3, 2: 5, 3: 1})
+    tracker = OrderTracker(api, lambda pair: 50.0, min_interval_sec=0.01,
+                           max_interval_sec=0.05)
+    done = []
+    # 全て追跡を始めるまで確認させない
+    with tracker._cond:
+        f1 = tracker.track({"pair": "xrp_jpy", "order_id": 1})
+        f2 = tracker.track({"pair": "xrp_jpy", "order_id": 2},
+                           lambda order: done.append(order["order_id"]))
+        f3 = tracker.track({"pair": "btc_jpy", "order_id": 3})
+    assert tracker.track({"pair": "xrp_jpy", "order_id": 1}) is f1
+
+    assert f1.result(5)["status"] == "FULLY_FILLED"
+    assert f2.result(5)["order_id"] == 2
+    assert f3.result(5)["pair"] == "btc_jpy"
+    assert done == [2]
+    assert tracker.get_pending_count() == 0
+
+    # 同じペアの注文は１リクエストでまとめて確認する
+    xrp_calls = [ids for pair, ids in api.calls if pair == "xrp_jpy"]
+    assert xrp_calls[0] == [1, 2]
+    assert len(xrp_calls) == 5
+    assert tracker.get_stats()["completed"] == 3
+
+
+def test_order_tracker_backoff():
+    tracker = OrderTracker(FakePrvApi({}), lambda pair: 50.0,
+                           min_interval_sec=0.1, max_interval_sec=1.0)
+    far = [{"order_id": 1, "type": "limit", "price": "100.0",
+            "status": "UNFILLED"}]
+    near = [{"order_id": 1, "type": "limit", "price": "50.05",
+             "status": "UNFILLED"}]
+    market = [{"order_id": 1, "type": "market", "status": "UNFILLED"}]
+    assert not tracker.is_near("xrp_jpy", far)
+    assert tracker.is_near("xrp_jpy", near)
+    assert tracker.is_near("xrp_jpy", market)
+
+    state = {"interval": 0.1, "due": 0.0}
+    for i in range(10):
+        tracker._schedule(state, False)
+    assert state["interval"] == 1.0  # 変化が無い間は延ばす（上限あり）
+    tracker._schedule(state, True)
+    assert state["interval"] == 0.1
+
+
+def test_order_tracker_failures_resolve_futures():
+    api = FakePrvApi({1: 1, 2: 1})
+
+    def on_complete(order):
+        raise RuntimeError("on_complete")
+
+    tracker = OrderTracker(api, min_interval_sec=0.01,
+                           on_complete=on_complete)
+    # on_completeの例外があっても約定した注文は返る
+    assert tracker.wait({"pair": "xrp_jpy", "order_id": 1},
+                        5)["status"] == "FULLY_FILLED"
+
+    # 不正な注文情報は例外で完了させ、追跡スレッドは動き続ける
+    original = api.get_orders_info
+
+    def malformed(pair, order_ids):
+        return {"orders": [{"order_id": order_id} for order_id in order_ids]}
+
+    api.get_orders_info = malformed
+    with pytest.raises(KeyError):
+        tracker.wait({"pair": "xrp_jpy", "order_id": 2}, 5)
+
+    def broken(pair, order_ids):
+        return {"orders": [None]}
+
+    api.get_orders_info = broken
+    with pytest.raises(AttributeError):
+        tracker.wait({"pair": "xrp_jpy", "order_id": 2}, 5)
+
+    api.get_orders_info = original
+    api.fill_after[3] = 2
+    assert tracker.wait({"pair": "xrp_jpy", "order_id": 3},
+                        5)["status"] == "FULLY_FILLED"
+    assert tracker.get_pending_count() == 0
+
+
+def test_order_tracker_untrack():
+    tracker = OrderTracker(FakePrvApi({1: 1000}), min_interval_sec=0.01)
+    future = tracker.track({"pair": "xrp_jpy", "order_id": 1})
+    tracker.untrack({"pair": "xrp_jpy", "order_id": 1})
+    assert tracker.get_pending_count() == 0
+    with pytest.raises(CancelledError):
+        future.result(1)
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from bitbankAutoOrder import AutoTrader, Bitbank, Order, TickerBoard
+from paperTrading import PaperPrivateApi
+
+
+def test_paper_private_api_fill_after_latency():
+    now = [1000.0]
+    quote = {"xrp_jpy": (50.0, 50.1, 49.9)}
+    api = PaperPrivateApi(lambda pair: quote[pair], {"jpy": 1000.0},
+                          slippage=0.01, latency_sec=0.5, clock=lambda: now[0])
+
+    order = api.order("xrp_jpy", None, "10", "buy", "market")
+    assert order["status"] == "UNFILLED"
+    assert api.get_active_orders("xrp_jpy")["orders"][0]["order_id"] == \
+        order["order_id"]
+
+    # 遅延後の売り値にスリッページを加えた価格で約定する
+    now[0] = now[0] + 0.5
+    quote["xrp_jpy"] = (51.0, 51.1, 50.9)
+    filled = api.get_orders_info("xrp_jpy", [order["order_id"]])["orders"][0]
+    assert filled["status"] == "FULLY_FILLED"
+    assert float(filled["average_price"]) == pytest.approx(51.1 * 1.01)
+    assert filled["executed_at"] == 1000500
+    assets = {a["asset"]: a for a in api.get_asset()["assets"]}
+    assert float(assets["xrp"]["onhand_amount"]) == 10.0
+    assert float(assets["jpy"]["onhand_amount"]) == \
+        pytest.approx(1000.0 - 10 * 51.1 * 1.01)
+
+    sell = api.order("xrp_jpy", None, "10", "sell", "market")
+    now[0] = now[0] + 0.5
+    assert api.get_order("xrp_jpy", sell["order_id"])["average_price"] == \
+        str(50.9 * 0.99)
+
+
+def test_auto_trader_paper_trading(monkeypatch):
+    class FakePubApi:
+        def get_ticker(self, pair):
+            return {"last": "50.0", "sell": "50.1", "buy": "49.9"}
+
+    class FakeLine:
+        def __init__(self):
+            self.messages = []
+
+        def notify_line(self, message):
+            self.messages.append(message)
+
+        def notify_line_stamp(self, message, package_id, sticker_id):
+            self.messages.append(message() if callable(message) else message)
+
+    monkeypatch.setenv("PAPER_LATENCY_SEC", "0.05")
+    monkeypatch.setenv("PAPER_JITTER_SEC", "0")
+    monkeypatch.delenv("BITBANK_API_KEY", raising=False)
+    bitbank = Bitbank(paper=True)  # APIキーは不要
+    bitbank.ticker_board = TickerBoard(FakePubApi())
+    monkeypatch.setattr(AutoTrader, "get_market_snapshot", lambda self: None)
+    monkeypatch.setattr(AutoTrader, "is_fully_filled",
+                        lambda self, result, snapshot:
+                        result["status"] == "FULLY_FILLED")
+    monkeypatch.setattr(AutoTrader, "is_buy_order",
+                        lambda self, snapshot: True)
+    monkeypatch.setattr(AutoTrader, "is_waittig_sell_order",
+                        lambda self, order, snapshot: False)
+
+    order = Order()
+    trader = AutoTrader(order, bitbank=bitbank, mtau=object())
+    trader.POLLING_SEC_BUY = trader.POLLING_SEC_SELL = 0.0
+    trader.line = FakeLine()
+    trader.buy_order()
+    trader.sell_order()
+
+    assert order.buy_result["status"] == "FULLY_FILLED"
+    assert float(order.buy_result["average_price"]) == 50.1
+    assert float(order.sell_result["average_price"]) == 49.9
+    assert order.buy_fill_latency >= 0.05
+    assert order.sell_fill_latency >= 0.05
+    assert bitbank.get_total_assets() == pytest.approx(100000.0 - 0.2)
+    assert len(trader.line.messages) == 2
+    assert all(m.startswith("【ペーパー】") for m in trader.line.messages)
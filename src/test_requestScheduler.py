@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+
+import time
+import threading
+
+from requestScheduler import (RequestScheduler, TokenBucket, PRIORITY_HIGH,
+                              PRIORITY_LOW)
+
+
+def test_token_bucket():
+    now = [0.0]
+    bucket = TokenBucket(2.0, 2, clock=lambda: now[0])
+    for i in range(2):
+        assert bucket.get_wait() == 0.0
+        bucket.consume()
+    assert bucket.get_wait() == 0.5
+
+    now[0] = 0.25
+    assert bucket.get_wait() == 0.25
+    now[0] = 10.0
+    bucket.refill()
+    assert bucket.tokens == 2.0  # バースト数を超えて貯まらない
+
+
+def wait_queue_depth(scheduler, endpoint, depth):
+    for i in range(200):
+        if scheduler.get_stats()[endpoint]["queue_depth"] == depth:
+            return
+        time.sleep(0.005)
+    raise AssertionError("queue_depth != {0}".format(depth))
+
+
+def test_request_scheduler_priority():
+    scheduler = RequestScheduler({"public": (20.0, 1)})
+    scheduler.acquire("public")  # トークンを使い切る
+
+    done = []
+
+    def request(name, priority):
+        scheduler.call("public", priority, done.append, name)
+
+    low = threading.Thread(target=request, args=("candle", PRIORITY_LOW))
+    low.start()
+    wait_queue_depth(scheduler, "public", 1)
+    high = threading.Thread(target=request, args=("ticker", PRIORITY_HIGH))
+    high.start()
+    low.join(5)
+    high.join(5)
+
+    # 後から来ても優先度の高いリクエストが先に処理される
+    assert done == ["ticker", "candle"]
+    stats = scheduler.get_stats()["public"]
+    assert stats["requests"] == 3
+    assert stats["max_queue_depth"] == 2
+    assert stats["queue_depth"] == 0
+    assert stats["wait_max"] > 0.0
+
+
+class FakeApi:
+    def __init__(self):
+        self.end_point = "https://public.bitbank.cc"
+
+    def get_candlestick(self, pair, candle_type, yyyymmdd):
+        return [pair, candle_type, yyyymmdd]
+
+
+def test_scheduled_api():
+    scheduler = RequestScheduler()
+    api = scheduler.wrap_public(FakeApi())
+    assert api.end_point == "https://public.bitbank.cc"
+    assert api.get_candlestick("xrp_jpy", "1min", "20180601") == \
+        ["xrp_jpy", "1min", "20180601"]
+    assert scheduler.get_stats()["public"]["requests"] == 1
+    assert scheduler.get_stats()["private_query"]["requests"] == 0
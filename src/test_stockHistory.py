@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+
+import time
+
+import numpy as np
+import pandas as pd
+
+from stockHistory import HistoryFetcher, LocalCsvSource
+
+
+class RecordingSource:
+    """ 取得した期間を記録するデータソース """
+
+    def __init__(self, source, rate_per_sec=None, capacity=1):
+        self.name = "recording"
+        self.source = source
+        self.rate_per_sec = rate_per_sec
+        self.capacity = capacity
+        self.calls = []
+
+    def fetch(self, symbol, start, end):
+        self.calls.append((symbol, start.strftime("%Y-%m-%d"),
+                           end.strftime("%Y-%m-%d")))
+        return self.source.fetch(symbol, start, end)
+
+
+def write_symbols(directory, symbols, days=60):
+    index = pd.bdate_range("2018-01-01", periods=days, name="Date")
+    for i, symbol in enumerate(symbols):
+        closes = 100.0 + i + np.arange(days)
+        pd.DataFrame({"Close": closes}, index=index).to_csv(
+            str(directory.join("{0}.csv".format(symbol))))
+
+
+def test_fetch_all_reports_errors(tmpdir):
+    write_symbols(tmpdir, ["AAPL", "KO"])
+    fetcher = HistoryFetcher(LocalCsvSource(str(tmpdir)), max_workers=4)
+    results, errors = fetcher.fetch_all({"AAPL", "KO", "NONE"},
+                                        "2018-01-01", "2018-01-31")
+    assert sorted(results) == ["AAPL", "KO"]
+    assert list(errors) == ["NONE"]
+    assert len(results["KO"]) == 23  # 1月の平日
+    assert results["KO"]["Close"].iloc[0] == 101.0
+    assert fetcher.get_stats()["errors"] == 1
+
+
+def test_cache_fetches_trailing_days(tmpdir):
+    source_dir = tmpdir.mkdir("source")
+    write_symbols(source_dir, ["AAPL"])
+    source = RecordingSource(LocalCsvSource(str(source_dir)))
+    cache_dir = str(tmpdir.join("cache"))
+
+    first = HistoryFetcher(source, cache_dir).fetch(
+        "AAPL", "2018-01-01", "2018-01-31")
+    # 次の実行は保存済みの翌日からだけ取得する
+    fetcher = HistoryFetcher(source, cache_dir)
+    second = fetcher.fetch("AAPL", "2018-01-01", "2018-02-15")
+    assert source.calls == [("AAPL", "2018-01-01", "2018-01-31"),
+                            ("AAPL", "2018-02-01", "2018-02-15")]
+    assert len(second) == len(first) + 11
+    assert second.index.is_monotonic_increasing
+
+    # 保存済みの期間内はデータソースに問い合わせない
+    third = fetcher.fetch("AAPL", "2018-01-10", "2018-02-01")
+    assert len(source.calls) == 2
+    assert third.index[0] == pd.Timestamp("2018-01-10")
+    assert fetcher.get_stats() == {"requests": 1, "cache_hits": 1,
+                                   "errors": 0}
+
+    # 保存済みより前が必要な場合は取得し直す
+    fetcher.fetch("AAPL", "2017-12-01", "2018-02-15")
+    assert source.calls[-1] == ("AAPL", "2017-12-01", "2018-02-15")
+
+
+def test_cache_refetches_days_not_yet_available(tmpdir):
+    # データソースにまだ終了日の日足が無い（取引時間前・配信の遅れ）
+    source_dir = tmpdir.mkdir("source")
+    write_symbols(source_dir, ["AAPL"], days=20)  # 2018-01-26まで
+    source = RecordingSource(LocalCsvSource(str(source_dir)))
+    cache_dir = str(tmpdir.join("cache"))
+    HistoryFetcher(source, cache_dir).fetch("AAPL", "2018-01-01",
+                                            "2018-01-31")
+
+    write_symbols(source_dir, ["AAPL"], days=23)  # 2018-01-31まで
+    df = HistoryFetcher(source, cache_dir).fetch("AAPL", "2018-01-01",
+                                                 "2018-01-31")
+    assert source.calls[-1] == ("AAPL", "2018-01-27", "2018-01-31")
+    assert df.index[-1] == pd.Timestamp("2018-01-31")
+    assert len(df) == 23
+
+
+def test_rate_limit(tmpdir):
+    symbols = ["S{0}".format(i) for i in range(6)]
+    write_symbols(tmpdir, symbols, days=5)
+    source = RecordingSource(LocalCsvSource(str(tmpdir)), rate_per_sec=20.0)
+    fetcher = HistoryFetcher(source, max_workers=6)
+    start = time.time()
+    results, errors = fetcher.fetch_all(symbols, "2018-01-01", "2018-01-05")
+    # バースト1件、以降は20件/秒
+    assert time.time() - start >= 0.2
+    assert len(results) == 6 and errors == {}
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pandas as pd
+
+from indicatorSeries import rolling_rsi, rolling_rci
+from stockScreener import PanelScreener, align_closes
+from notifyDeals import Rakuten
+
+
+class FakeLine:
+    def __init__(self):
+        self.sent = []
+
+    def notify_line(self, message):
+        self.sent.append(message)
+
+
+def make_candles(days=40):
+    index = pd.bdate_range("2018-01-01", periods=days)
+    steps = np.tile([1.0, -0.2], days // 2)
+    return {"UP": pd.DataFrame({"Close": 100 + np.cumsum(steps)},
+                               index=index),
+            "DOWN": pd.DataFrame({"Close": 100 - np.cumsum(steps)},
+                                 index=index),
+            # 最新日が無い銘柄
+            "OLD": pd.DataFrame({"Close": 100 - np.cumsum(steps[:-1])},
+                                index=index[:-1]),
+            # 途中の日が無い銘柄
+            "GAP": pd.DataFrame({"Close": 100 - np.cumsum(steps)},
+                                index=index).drop(index[-5]),
+            # 日足が足りない銘柄
+            "NEW": pd.DataFrame({"Close": 100 - np.cumsum(steps[:5])},
+                                index=index[-5:])}
+
+
+def test_align_closes():
+    symbols, dates, closes = align_closes(make_candles())
+    assert symbols == ["DOWN", "GAP", "NEW", "OLD", "UP"]
+    assert closes.shape == (5, 40)
+    assert len(dates) == 40
+    assert closes[1, -5] == closes[1, -6]  # 途中の欠けは前日の終値
+    assert np.isnan(closes[2, :-5]).all()  # 最初の日足より前はNaN
+    assert np.isnan(closes[3, -1])  # 最後の日足より後はNaN
+
+
+def test_evaluate_matches_single_series():
+    rs = np.random.RandomState(0)
+    closes = 100 + np.cumsum(rs.randn(50, 120), axis=1)
+    symbols = ["S{0}".format(i) for i in range(50)]
+    result = PanelScreener().evaluate(symbols, closes)
+    for i in (0, 17, 49):
+        assert np.isclose(result["rsi"].iloc[i],
+                          rolling_rsi(closes[i], 14)[-1])
+        assert np.isclose(result["rci"].iloc[i],
+                          rolling_rci(closes[i], 9)[-1])
+
+
+def test_screen_and_notify():
+    candles = make_candles()
+    screener = PanelScreener(rsi_threshold=20.0)
+    result = screener.screen(candles)
+    # 最新日・途中の日が無い銘柄も最後の日足で判定する
+    assert sorted(result.index) == ["DOWN", "GAP", "OLD"]
+    assert (result["rsi"] < 20).all()
+    assert result["rci_under"].all()
+    assert result.loc["OLD", "date"] == pd.Timestamp("2018-02-22")
+    assert result.loc["DOWN", "date"] == pd.Timestamp("2018-02-23")
+    assert screener.excluded == ["NEW"]
+
+    line = FakeLine()
+    notified = Rakuten(line).notify_rsi_under_20(candles)
+    assert sorted(notified.index) == ["DOWN", "GAP", "OLD"]
+    assert len(line.sent) == 3
+    assert Rakuten(line).notify_rsi_under_20({}).empty
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+
+import math
+
+import numpy as np
+import pandas as pd
+
+from streamingIndicator import IndicatorEngine, StreamingRsi
+from technicalAnalysis import MyTechnicalAnalysisUtil
+
+
+def make_ohlcv(count, seed=0):
+    """ テスト用のohlcv（同値の終値が出るよう小数2桁に丸める） """
+    rs = np.random.RandomState(seed)
+    closes = np.round(60.0 + np.cumsum(rs.randn(count) * 0.05), 2)
+    start = 1528329600000  # 2018/06/07 00:00 UTC
+    return [[str(c), str(c), str(c), str(c), "1000.0", start + i * 60000]
+            for i, c in enumerate(closes)]
+
+
+def make_mtau(monkeypatch, ohlcv):
+    """ get_candlestick系をohlcvに差し替えたMyTechnicalAnalysisUtil """
+    df = pd.DataFrame(ohlcv, columns=["open", "hight", "low",
+                                      "close", "amount", "time"])
+    df["close"] = df["close"].astype(float)
+    mtau = MyTechnicalAnalysisUtil()
+    monkeypatch.setattr(mtau, "get_candlestick",
+                        lambda candle_type: df.copy())
+    monkeypatch.setattr(mtau, "get_candlestick_n",
+                        lambda candle_type, n, pair="xrp_jpy":
+                        df.tail(n).copy())
+    return mtau
+
+
+def assert_engine_matches(mtau, engine):
+    df_macd = mtau.get_macd("1min")
+    assert math.isclose(engine.macd, df_macd["macd"].values[-1],
+                        abs_tol=1e-9)
+    assert math.isclose(engine.signal, df_macd["signal"].values[-1],
+                        abs_tol=1e-9)
+    diff = (df_macd["macd"] - df_macd["signal"]).values
+    assert np.allclose(engine.macd_diffs, diff[-2:], atol=1e-9)
+
+    df_ema = mtau.get_ema("1min", 9, 26)
+    ema_diff = df_ema["ema_short"] - df_ema["ema_long"]
+    ema_abs_sum = ema_diff.tail(9).abs().sum()
+    assert math.isclose(engine.ema_diff_abs_sum, ema_abs_sum, abs_tol=1e-9)
+
+    assert math.isclose(engine.rsi, mtau.get_rsi("1min"), abs_tol=1e-9)
+    assert math.isclose(engine.rci, mtau.get_rci("1min"), abs_tol=1e-9)
+
+
+def test_indicator_engine_append(monkeypatch):
+    ohlcv = make_ohlcv(300)
+    engine = IndicatorEngine()
+    for i in (100, 101, 250, 300):
+        engine.update_ohlcv(ohlcv[:i])
+        assert_engine_matches(make_mtau(monkeypatch, ohlcv[:i]), engine)
+
+
+def test_indicator_engine_revise(monkeypatch):
+    ohlcv = make_ohlcv(200, seed=1)
+    engine = IndicatorEngine()
+    engine.update_ohlcv(ohlcv)
+
+    # 未確定のロウソク（最新）の終値が更新された場合
+    for close in ("59.5", "61.25", ohlcv[-2][3]):
+        ohlcv[-1] = ohlcv[-1][:3] + [close] + ohlcv[-1][4:]
+        assert engine.update(ohlcv[-1][5], ohlcv[-1][3]) == "revise"
+        assert_engine_matches(make_mtau(monkeypatch, ohlcv), engine)
+
+    assert engine.update(ohlcv[0][5], ohlcv[0][3]) is None
+
+
+def test_streaming_rsi_wilder():
+    closes = np.round(60.0 + np.cumsum(np.random.RandomState(2).randn(100)), 2)
+    diff = pd.Series(closes).diff()[1:]
+    up = diff.clip(lower=0).ewm(alpha=1 / 14, min_periods=14,
+                                adjust=False).mean()
+    down = (-diff).clip(lower=0).ewm(alpha=1 / 14, min_periods=14,
+                                     adjust=False).mean()
+    expected = (100.0 - 100.0 / (1.0 + up / down)).values
+
+    rsi = StreamingRsi(14, "wilder")
+    values = [rsi.append(c) for c in closes][1:]
+    assert np.allclose(values, expected, equal_nan=True)
@@ -1,7 +1,15 @@
 # -*- coding: utf-8 -*-
 
-from technicalAnalysis import MacdCross, MyTechnicalAnalysisUtil
+import calendar
+from datetime import datetime
+
+import pandas as pd
+
+import technicalAnalysis
+from technicalAnalysis import MacdCross, MyTechnicalAnalysisUtil, CandleCache
+from indicatorSeries import rolling_rsi
 from bitbankAutoOrder import Bitbank
+from candleStore import CandleStore
 
 
 def test_get_macd_cross_status():
@@ -71,3 +79,162 @@ def test_get_rci():
     rci = mtau.get_rci("1min")
     print(rci)
     assert abs(rci) <= 100
+
+
+def test_candle_cache():
+    """ 確定済みの日は再取得せず、今日の分は期間の切替かTTL経過で再取得する """
+    calls = []
+    now = [1528416030.0]  # 2018/06/08 00:00:30 UTC
+
+    def fetcher(pair, candle_type, yyyymmdd):
+        calls.append(yyyymmdd)
+        return [["1", "1", "1", "1", "1", 0]]
+
+    cache = CandleCache(fetcher, ttl_sec=10.0, clock=lambda: now[0])
+    for i in range(5):
+        cache.get_ohlcv("xrp_jpy", "1min", "20180607")
+        cache.get_ohlcv("xrp_jpy", "1min", "20180608")
+    assert calls == ["20180607", "20180608"]
+
+    now[0] = now[0] + 15.0  # TTL経過
+    cache.get_ohlcv("xrp_jpy", "1min", "20180608")
+    now[0] = now[0] + 20.0  # 1minの期間が切り替わる
+    cache.get_ohlcv("xrp_jpy", "1min", "20180607")
+    cache.get_ohlcv("xrp_jpy", "1min", "20180608")
+    assert calls == ["20180607", "20180608", "20180608", "20180608"]
+
+    stats = cache.get_stats()
+    assert stats["misses"] == 4
+    assert stats["hits"] == 9
+
+
+def test_candle_cache_crossing_midnight():
+    """ 日が終わる前に取得した分は、日が終わった後に１度だけ再取得する """
+    calls = []
+    now = [1528415990.0]  # 2018/06/07 23:59:50 UTC
+
+    def fetcher(pair, candle_type, yyyymmdd):
+        calls.append((yyyymmdd, now[0]))
+        return [["1", "1", "1", "1", "1", 0]]
+
+    cache = CandleCache(fetcher, ttl_sec=10.0, clock=lambda: now[0])
+    cache.get_ohlcv("xrp_jpy", "1min", "20180607")
+    now[0] = 1528416030.0  # 2018/06/08 00:00:30 UTC
+    cache.get_ohlcv("xrp_jpy", "1min", "20180607")
+    now[0] = now[0] + 5 * 3600  # 5時間後
+    cache.get_ohlcv("xrp_jpy", "1min", "20180607")
+    assert calls == [("20180607", 1528415990.0), ("20180607", 1528416030.0)]
+
+    assert CandleCache.get_closed_at("20180607") == 1528416000
+    assert CandleCache.get_closed_at("2018") == 1546300800
+
+
+def test_fetch_ohlcv_list_uses_pool_only_for_misses():
+    calls = []
+
+    def fetcher(pair, candle_type, yyyymmdd):
+        calls.append(yyyymmdd)
+        return [[yyyymmdd]]
+
+    mtau = MyTechnicalAnalysisUtil(CandleCache(fetcher))
+    keys = ["20180606", "20180607"]
+    assert mtau.fetch_ohlcv_list("xrp_jpy", "1min", keys) == \
+        [[["20180606"]], [["20180607"]]]
+    assert mtau._backfill_executor is not None
+    executor = mtau._backfill_executor
+
+    # 全てキャッシュヒットの場合はスレッドプールを使わない
+    mtau._backfill_executor = None
+    assert mtau.fetch_ohlcv_list("xrp_jpy", "1min", keys) == \
+        [[["20180606"]], [["20180607"]]]
+    assert mtau._backfill_executor is None
+    assert sorted(calls) == keys
+    executor.shutdown()
+
+
+def test_get_backfill_keys():
+    mtau = MyTechnicalAnalysisUtil()
+    now = 1528416030.0  # 2018/06/08 00:00:30 UTC（今日のロウソクは1本のみ）
+    assert mtau.get_backfill_keys("1min", 1, now) == ["20180608"]
+    assert mtau.get_backfill_keys("1min", 2, now) == ["20180607", "20180608"]
+    assert mtau.get_backfill_keys("1min", 1441, now) == \
+        ["20180607", "20180608"]
+    assert mtau.get_backfill_keys("1min", 1442, now) == \
+        ["20180606", "20180607", "20180608"]
+    assert mtau.get_backfill_keys("1hour", 25, now) == ["20180607", "20180608"]
+    assert mtau.get_backfill_keys("1day", 200, now) == ["2017", "2018"]
+
+
+def test_get_candlestick_range_offline(tmp_path):
+    calls = []
+
+    def fetcher(pair, candle_type, yyyymmdd):
+        calls.append(yyyymmdd)
+        day = datetime.strptime(yyyymmdd, '%Y%m%d')
+        start = calendar.timegm(day.timetuple()) * 1000
+        if yyyymmdd == "20180602":
+            return []  # 取得できなかった日
+        # 日をまたいだ重複ロウソクが含まれる場合も想定
+        return [["1", "2", "0.5", "1.5", "10", start + i * 3600000]
+                for i in range(25)]
+
+    store = CandleStore(str(tmp_path))
+    mtau = MyTechnicalAnalysisUtil(CandleCache(fetcher), store)
+    df = mtau.get_candlestick_range("1hour", "20180601", "20180614")
+    assert len(df) == 13 * 24 + 1
+    assert df["time"].is_monotonic_increasing
+    assert df["time"].is_unique
+    assert len(calls) == 14
+    assert "20180602" not in store.get_keys("xrp_jpy", "1hour")
+
+    # 保存済みの日はAPIから取得しない（別インスタンスでも同じ）
+    mtau = MyTechnicalAnalysisUtil(CandleCache(fetcher),
+                                   CandleStore(str(tmp_path)))
+    df_local = mtau.get_candlestick_range("1hour", "20180603", "20180616")
+    assert sorted(calls[14:]) == ["20180615", "20180616"]
+    assert len(df_local) == 14 * 24
+    assert df_local["close"].values.tolist() == [1.5] * (14 * 24)
+
+
+def test_get_rci_series(monkeypatch):
+    closes = [3.0, 1.0, 2.0, 2.0, 5.0, 4.0, 6.0, 8.0, 7.0, 9.0, 9.0, 1.0]
+    df = pd.DataFrame({"close": closes, "time": range(len(closes))})
+    mtau = MyTechnicalAnalysisUtil()
+    monkeypatch.setattr(mtau, "get_candlestick_n",
+                        lambda candle_type, n, pair: df)
+
+    series = mtau.get_rci_series("1min", len(closes), (9, 3))
+    assert list(series.columns) == ["rci_9", "rci_3"]
+    assert series["rci_9"].isnull().sum() == 8
+
+    # 最新の値はget_rciと同じ
+    monkeypatch.setattr(mtau, "get_candlestick_n",
+                        lambda candle_type, n, pair: df.tail(n))
+    assert series["rci_9"].iloc[-1] == mtau.get_rci("1min")
+
+
+def test_get_rsi_series_memoized(monkeypatch):
+    closes = [60.0 + (i % 7) * 0.1 - (i % 3) * 0.15 for i in range(40)]
+    df = pd.DataFrame({"close": closes, "time": range(len(closes))})
+    mtau = MyTechnicalAnalysisUtil()
+    monkeypatch.setattr(mtau, "get_candlestick_n",
+                        lambda candle_type, n, pair: df.tail(n))
+    calls = []
+
+    def counting_rsi(*args):
+        calls.append(args[1:])
+        return rolling_rsi(*args)
+
+    monkeypatch.setattr(technicalAnalysis, "rolling_rsi", counting_rsi)
+
+    sma = mtau.get_rsi_series("1min", 40)
+    assert mtau.get_rsi_series("1min", 40) is sma
+    wilder = mtau.get_rsi_series("1min", 40, 14, "wilder")
+    assert calls == [(14, "sma"), (14, "wilder")]
+    assert sma.isnull().sum() == 14 and wilder.isnull().sum() == 14
+    assert mtau.get_rsi("1min") == rolling_rsi(closes[-24:])[-1]
+
+    # 最新の終値が変わった場合は計算し直す
+    df.loc[39, "close"] = 70.0
+    assert mtau.get_rsi_series("1min", 40).iloc[-1] > sma.iloc[-1]
+    assert len(calls) == 4